@@ -3,15 +3,20 @@ import os
 import time
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QVBoxLayout, QWidget,
-    QHBoxLayout, QListWidget, QMessageBox, QListWidgetItem, QPushButton, QSizePolicy, QSpacerItem
+    QHBoxLayout, QListWidget, QListWidgetItem, QPushButton, QSizePolicy, QSpacerItem
 )
 from PyQt5.QtCore import Qt, pyqtSignal, QUrl
 from PyQt5.QtGui import QFont, QColor, QBrush, QIcon, QDesktopServices
 from pynput import keyboard
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-import statistics
 from matplotlib import rcParams
+from charts import ChartTemplate, LIGHT_THEME
+from detector import QuickStopDetector, RecordStore, format_feedback, get_timing_label
+from keymap import compile_key_mappings
+from panels import TextPanel
+from ringbuffer import SpscRingBuffer, EVENT_PRESS, EVENT_RELEASE
+from stats import diff_array, diff_colors, summarize_diffs
 
 rcParams['font.sans-serif'] = ['Microsoft YaHei']
 rcParams['axes.unicode_minus'] = False
@@ -25,9 +30,11 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 class MainWindow(QMainWindow):
+    """ 经典 AD 视图：只负责界面，检测与记录存储使用与 main.py 相同的共享检测器 """
     feedback_signal = pyqtSignal(str, QColor)
-    history_signal = pyqtSignal(float, float, dict, QColor)
+    history_signal = pyqtSignal('qint64', 'qint64', dict, QColor) # 事件时间 (ns), 时间差 (us)
     key_state_signal = pyqtSignal(str, bool)
+    input_ready_signal = pyqtSignal()
 
     def __init__(self):
         super().__init__()
@@ -163,6 +170,13 @@ class MainWindow(QMainWindow):
         self.canvas_box = FigureCanvas(self.figure_box)
         right_layout.addWidget(self.canvas_box)
 
+        # 图表样式只在这里设置一次，每条记录只替换数据图元
+        self.line_chart = ChartTemplate(self.figure_line.add_subplot(111), LIGHT_THEME, title='提前或滞后时间差（最近25次）',
+                                        xlabel='操作次数', ylabel='时间差（ms）', title_size=14, label_size=12)
+        self.box_chart = ChartTemplate(self.figure_box.add_subplot(111), LIGHT_THEME, title='时间差箱线图（最近50次）',
+                                       xlabel='时间差（ms）', title_size=14, label_size=12)
+        self.plots_dirty = False
+
         main_layout.addLayout(left_layout, 1)
         main_layout.addLayout(right_layout, 2)
 
@@ -178,132 +192,66 @@ class MainWindow(QMainWindow):
             }
         """)
 
-        self.listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
-        self.listener.start()
-
-        self.key_state = {'A': {'pressed': False, 'time': None}, 'D': {'pressed': False, 'time': None}}
-        self.waiting_for_opposite_key = None
-        self.data = []
-        self.last_record_time = 0
-        self.min_time_between_records = 0.05
+        self.record_store = RecordStore(maxlen=50, axes=('AD',))
+        self.detector = QuickStopDetector(
+            axes=('AD',),
+            store=self.record_store,
+            on_record=self.on_quick_stop_record,
+            on_key_state=self.key_state_signal.emit,
+        )
+        self.key_dispatch = compile_key_mappings(self.detector.key_mappings)
+        self.input_ring = SpscRingBuffer(4096)
+        self.detector_reader = self.input_ring.reader('detector')
+        self.input_wake_pending = False
+
+        self.detail_panel = TextPanel("详细信息", 'detail_panel', self)
+        self.recommendation_panel = TextPanel("急停建议", 'recommendation_panel', self)
+        for panel in (self.detail_panel, self.recommendation_panel):
+            self.addDockWidget(Qt.RightDockWidgetArea, panel)
+            panel.hide()
 
         self.feedback_signal.connect(self.update_feedback)
         self.history_signal.connect(self.update_history)
         self.key_state_signal.connect(self.update_key_state_display)
+        self.input_ready_signal.connect(self.drain_input_ring)
+
+        self.listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
+        self.listener.start()
+
+    @property
+    def filter_threshold(self):
+        return self.detector.filter_threshold
 
     def on_press(self, key):
-        try:
-            key_char = key.char.upper()
-            if key_char in ['A', 'D']:
-                if not self.key_state[key_char]['pressed']:
-                    self.key_state[key_char]['pressed'] = True
-                    self.key_state[key_char]['time'] = time.perf_counter()
-                    self.key_state_signal.emit(key_char, True)
-
-                    if self.waiting_for_opposite_key and self.waiting_for_opposite_key['key'] == key_char:
-                        current_time = time.perf_counter()
-                        if current_time - self.last_record_time < self.min_time_between_records:
-                            return
-
-                        press_time = self.key_state[key_char]['time']
-                        release_time = self.waiting_for_opposite_key['release_time']
-                        time_diff = press_time - release_time
-                        if abs(time_diff) > 0.2:
-                            self.waiting_for_opposite_key = None
-                            return
-
-                        time_diff_ms = round(time_diff * 1000, 1)
-
-                        color = self.get_color(time_diff_ms)
-
-                        if abs(time_diff_ms) <= 2:
-                            timing = '完美急停'
-                        elif time_diff_ms < 0:
-                            timing = '按早了'
-                        else:
-                            timing = '按晚了'
-
-                        feedback = f"{timing}：松开{self.waiting_for_opposite_key['key_released']}后{abs(time_diff_ms):.1f}ms按下了{key_char}"
-
-                        detail_info = {
-                            'events': self.waiting_for_opposite_key['events'] + [
-                                {'key': key_char, 'event': '按下', 'time': press_time, 'time_str': self.format_time(press_time)}
-                            ]
-                        }
-
-                        self.feedback_signal.emit(feedback, color)
-                        self.history_signal.emit(press_time, time_diff, detail_info, color)
-
-                        self.data.append({'time': press_time, 'time_diff': time_diff})
-                        if len(self.data) > 50:
-                            self.data.pop(0)
-
-                        self.last_record_time = current_time
-                        self.waiting_for_opposite_key = None
-        except AttributeError:
-            pass
+        # 与主程序相同的按键分发表：未映射的按键直接返回
+        key_name = self.key_dispatch.lookup(key)
+        if key_name is not None:
+            self.enqueue_key_event(EVENT_PRESS, key_name, time.perf_counter_ns())
 
     def on_release(self, key):
-        try:
-            key_char = key.char.upper()
-            if key_char in ['A', 'D']:
-                if self.key_state[key_char]['pressed']:
-                    release_time = time.perf_counter()
-                    self.key_state[key_char]['pressed'] = False
-                    self.key_state_signal.emit(key_char, False)
-                    self.process_key_event(key_char, release_time)
-        except AttributeError:
-            pass
-
-    def process_key_event(self, key_released, release_time):
-        opposite_key = 'D' if key_released == 'A' else 'A'
-        key_state = self.key_state[opposite_key]
-
-        if key_state['pressed']:
-            time_diff = key_state['time'] - release_time
-            if abs(time_diff) > 0.2:
-                return
-            time_diff_ms = round(time_diff * 1000, 1)
-
-            current_time = time.perf_counter()
-            if current_time - self.last_record_time < self.min_time_between_records:
-                return
-
-            color = self.get_color(time_diff_ms)
-
-            if abs(time_diff_ms) <= 2:
-                timing = '完美急停'
-            elif time_diff_ms < 0:
-                timing = '按早了'
+        key_name = self.key_dispatch.lookup(key)
+        if key_name is not None:
+            self.enqueue_key_event(EVENT_RELEASE, key_name, time.perf_counter_ns())
+
+    def enqueue_key_event(self, kind, key_char, timestamp):
+        """ 监听线程只写入环形缓冲区，检测在 GUI 线程进行 """
+        self.input_ring.push(kind, key_char, timestamp)
+        if not self.input_wake_pending:
+            self.input_wake_pending = True
+            self.input_ready_signal.emit()
+
+    def drain_input_ring(self):
+        self.input_wake_pending = False
+        for kind, key_char, timestamp in self.detector_reader.drain():
+            if kind == EVENT_PRESS:
+                self.detector.press(key_char, timestamp)
             else:
-                timing = '按晚了'
-
-            feedback = f"{timing}：未松开{key_released}就按下了{opposite_key}，{abs(time_diff_ms):.1f}ms"
-
-            detail_info = {
-                'events': [
-                    {'key': key_released, 'event': '松开', 'time': release_time, 'time_str': self.format_time(release_time)},
-                    {'key': opposite_key, 'event': '按下', 'time': key_state['time'], 'time_str': self.format_time(key_state['time'])}
-                ]
-            }
+                self.detector.release(key_char, timestamp)
 
-            self.feedback_signal.emit(feedback, color)
-            self.history_signal.emit(key_state['time'], time_diff, detail_info, color)
-
-            self.data.append({'time': key_state['time'], 'time_diff': time_diff})
-            if len(self.data) > 50:
-                self.data.pop(0)
-
-            self.last_record_time = current_time
-        else:
-            self.waiting_for_opposite_key = {
-                'key': opposite_key,
-                'release_time': release_time,
-                'key_released': key_released,
-                'events': [
-                    {'key': key_released, 'event': '松开', 'time': release_time, 'time_str': self.format_time(release_time)}
-                ]
-            }
+    def on_quick_stop_record(self, record):
+        color = self.get_color(record['time_diff_us'])
+        self.feedback_signal.emit(format_feedback(record, show_axis=False), color)
+        self.history_signal.emit(record['event_time'], record['time_diff_us'], {'events': record['events']}, color)
 
     def update_feedback(self, feedback, color):
         self.feedback_label.setText(feedback)
@@ -316,10 +264,10 @@ class MainWindow(QMainWindow):
             }}
         """)
 
-    def update_history(self, press_time, time_diff, detail_info, color):
-        time_diff_ms = round(time_diff * 1000, 1)
+    def update_history(self, press_time, time_diff_us, detail_info, color):
+        time_diff_ms = time_diff_us / 1000
         time_str = self.format_time(press_time)
-        item_text = f"{time_str} - 时间差：{time_diff_ms:.1f}ms"
+        item_text = f"{time_str} - {get_timing_label(time_diff_us, self.detector.perfect_threshold_us)} 时间差：{time_diff_ms:.1f}ms"
         item = QListWidgetItem(item_text)
         item.setData(Qt.UserRole, detail_info)
         item.setBackground(QBrush(color))
@@ -333,50 +281,50 @@ class MainWindow(QMainWindow):
         if self.history_list.count() > 25:
             self.history_list.takeItem(0)
 
-        if len(self.data) >= 20:
+        if self.record_store.count('AD') >= 20:
             if not self.info_button.isVisible():
                 self.info_button.show()
             if not self.question_button.isVisible():
                 self.question_button.show()
 
+        if self.recommendation_panel.isVisible():
+            self.update_recommendations()
+        self.update_plots()
+
+    def update_plots(self):
+        """ 窗口不可见 (最小化或隐藏) 时跳过重绘，再次显示时补画 """
+        if not self.isVisible() or self.isMinimized():
+            self.plots_dirty = True
+            return
+        self.plots_dirty = False
         self.update_plot()
         self.update_boxplot()
 
     def update_plot(self):
-        self.figure_line.clear()
-        ax = self.figure_line.add_subplot(111)
+        ax = self.line_chart.begin()
 
-        time_diffs = [round(d['time_diff'] * 1000, 1) for d in self.data[-25:]]
-        jump_numbers = range(len(self.data) - len(time_diffs) + 1, len(self.data) + 1)
+        data = self.record_store.series['AD']
+        diffs_us = diff_array(self.record_store.recent('AD', 25))
+        jump_numbers = range(len(data) - len(diffs_us) + 1, len(data) + 1)
 
-        colors = [self.get_color(diff) for diff in time_diffs]
+        colors = diff_colors(diffs_us, self.filter_threshold * 1000, self.detector.perfect_threshold_us)
 
-        scatter = ax.scatter(jump_numbers, time_diffs, c=[color.name() for color in colors], s=100, edgecolors='black')
+        ax.scatter(jump_numbers, diffs_us / 1000, c=colors, s=100, edgecolors='black')
 
-        if time_diffs:
-            mean_value = statistics.mean(time_diffs)
+        if len(diffs_us):
+            mean_value = float(diffs_us.mean()) / 1000
             ax.axhline(mean_value, color='blue', linestyle='--', linewidth=2, label=f'平均值：{mean_value:.1f}ms')
 
             ax.axhline(0, color='black', linewidth=1, linestyle='-')
+            self.line_chart.legend(size=10)
 
         ax.set_xticks(jump_numbers)
-        ax.set_xlabel('操作次数', fontproperties="Microsoft YaHei", fontsize=12)
-        ax.set_ylabel('时间差（ms）', fontproperties="Microsoft YaHei", fontsize=12)
-        ax.set_title('提前或滞后时间差（最近25次）', fontproperties="Microsoft YaHei", fontsize=14)
-        ax.legend(prop={'family': 'Microsoft YaHei', 'size': 10})
-
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.grid(True, linestyle='--', alpha=0.6)
-
         self.canvas_line.draw()
 
     def update_boxplot(self):
-        if len(self.data) >= 20:
-            time_diffs = [round(d['time_diff'] * 1000, 1) for d in self.data[-50:]]
-
-            self.figure_box.clear()
-            ax = self.figure_box.add_subplot(111)
+        ax = self.box_chart.begin()
+        if self.record_store.count('AD') >= 20:
+            time_diffs = diff_array(self.record_store.recent('AD', 50)) / 1000
 
             bp = ax.boxplot(time_diffs, vert=False, patch_artist=True, showfliers=False)
 
@@ -392,19 +340,19 @@ class MainWindow(QMainWindow):
 
             for median in bp['medians']:
                 median.set(color='#b2df8a', linewidth=2)
+        else:
+            self.box_chart.show_empty('至少 20 次急停后显示')
+        self.canvas_box.draw()
 
-            ax.set_xlabel('时间差（ms）', fontproperties="Microsoft YaHei", fontsize=12)
-            ax.set_title('时间差箱线图（最近50次）', fontproperties="Microsoft YaHei", fontsize=14)
-
-            ax.grid(True, linestyle='--', alpha=0.6)
-
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.plots_dirty:
+            self.update_plots()
 
-            self.canvas_box.draw()
-        else:
-            self.figure_box.clear()
-            self.canvas_box.draw()
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == event.WindowStateChange and self.plots_dirty:
+            self.update_plots()
 
     def show_detail_info(self, item):
         detail_info = item.data(Qt.UserRole)
@@ -413,10 +361,11 @@ class MainWindow(QMainWindow):
             message = ""
             for event in events:
                 message += f"{event['time_str']} - {event['key']}键 {event['event']}\n"
-            QMessageBox.information(self, "详细信息", message)
+            self.detail_panel.set_text(message)
+            self.detail_panel.present()
 
     def format_time(self, timestamp):
-        return f"{timestamp:.3f}秒"
+        return f"{timestamp / 1e9:.3f}秒"
 
     def update_key_state_display(self, key_char, is_pressed):
         if key_char == 'A':
@@ -458,24 +407,10 @@ class MainWindow(QMainWindow):
                     }
                 """)
 
-    def get_color(self, time_diff_ms):
-        max_time_diff = 200
-        normalized_diff = min(abs(time_diff_ms), max_time_diff) / max_time_diff
-
-        if time_diff_ms < 0:
-            start_color = QColor(173, 216, 230)
-            end_color = QColor(0, 0, 139)
-        elif time_diff_ms > 0:
-            start_color = QColor(255, 182, 193)
-            end_color = QColor(139, 0, 0)
-        else:
-            return QColor(144, 238, 144)
-
-        r = start_color.red() + (end_color.red() - start_color.red()) * normalized_diff
-        g = start_color.green() + (end_color.green() - start_color.green()) * normalized_diff
-        b = start_color.blue() + (end_color.blue() - start_color.blue()) * normalized_diff
-
-        return QColor(int(round(r)), int(round(g)), int(round(b)))
+    def get_color(self, time_diff_us):
+        """ 与主程序、图表相同的颜色：完美阈值内为绿色，渐变范围为过滤阈值 """
+        r, g, b = diff_colors([time_diff_us], self.filter_threshold * 1000, self.detector.perfect_threshold_us)[0]
+        return QColor.fromRgbF(r, g, b)
 
     def is_light_color(self, color):
         brightness = (color.red() * 299 + color.green() * 587 + color.blue() * 114) / 1000
@@ -485,16 +420,23 @@ class MainWindow(QMainWindow):
         QDesktopServices.openUrl(QUrl("https://space.bilibili.com/13723713"))
 
     def show_recommendations(self):
-        if not self.data:
-            QMessageBox.information(self, "急停建议", "暂无数据可供分析。")
+        """ 打开 (非模态) 建议面板，之后随新的急停刷新 """
+        self.update_recommendations()
+        self.recommendation_panel.present()
+
+    def update_recommendations(self):
+        data = self.record_store.series['AD']
+        if not data:
+            self.recommendation_panel.set_text("暂无数据可供分析。")
             return
 
-        avg_time_diff = statistics.mean([d['time_diff'] for d in self.data])
-        avg_time_diff_ms = round(avg_time_diff * 1000, 2)
+        diff_stats = summarize_diffs(diff_array(data), self.filter_threshold, self.detector.perfect_threshold_us)
+        avg_time_diff_ms = diff_stats['mean']
+        counts = f"完美/偏早/偏晚: {diff_stats['perfect']}/{diff_stats['early']}/{diff_stats['late']} 次\n\n"
 
         if avg_time_diff_ms < -5:
             recommendation = (
-                f"您的平均时间差为 {avg_time_diff_ms:.2f}ms，偏早。\n\n"
+                f"您的平均时间差为 {avg_time_diff_ms:.2f}ms，偏早。\n" + counts +
                 "建议：\n"
                 "- 使用更短的反应时间 (RT)。\n"
                 "- 使用更长的死区（触发键程）。\n"
@@ -502,18 +444,18 @@ class MainWindow(QMainWindow):
             )
         elif avg_time_diff_ms > 5:
             recommendation = (
-                f"您的平均时间差为 {avg_time_diff_ms:.2f}ms，偏晚。\n\n"
+                f"您的平均时间差为 {avg_time_diff_ms:.2f}ms，偏晚。\n" + counts +
                 "建议：\n"
                 "- 使用更长的反应时间 (RT)。\n"
                 "- 使用更短的死区（触发键程）。"
             )
         else:
             recommendation = (
-                f"您的平均时间差为 {avg_time_diff_ms:.2f}ms。\n\n"
+                f"您的平均时间差为 {avg_time_diff_ms:.2f}ms。\n" + counts +
                 "您表现出色！继续保持您的急停技巧！"
             )
 
-        QMessageBox.information(self, "急停建议", recommendation)
+        self.recommendation_panel.set_text(recommendation)
 
 def main():
     if hasattr(Qt, 'AA_EnableHighDpiScaling'):
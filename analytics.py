@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 按键时序分析与练习趋势检测
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import math
+from collections import deque
+
+from detector import AXIS_KEYS, KEY_AXIS, OPPOSITE_KEY
+from tracing import HdrHistogram
+
+
+class KeyTimingAnalytics:
+    """
+    按逻辑按键统计硬件调校相关的时间分布，每个事件的更新都是 O(1)：
+      - 按住时长 (dwell)：按下 → 松开
+      - 重叠时长 (overlap)：同一轴两个键同时按住的时间
+      - 切换间隔 (gap)：同一轴上一次松开 → 下一次按下，按 (松开键, 按下键) 分开
+      - 事件频率：最近 rate_window_ns 内的事件数与峰值
+    时间戳为 perf_counter_ns 整数纳秒，直方图单位为微秒。
+    """
+    def __init__(self, axes=('AD', 'WS'), rate_window_ns=1_000_000_000, max_gap_ns=1_000_000_000):
+        self.axes = tuple(axes)
+        self.keys = [key for axis in self.axes for key in AXIS_KEYS[axis]]
+        self.rate_window_ns = rate_window_ns
+        self.max_gap_ns = max_gap_ns # 超过该间隔视为停顿，不计入切换间隔
+        self.reset()
+
+    def reset(self):
+        self.pressed_at = {key: None for key in self.keys}
+        self.event_counts = {key: 0 for key in self.keys}
+        self.dwell = {key: HdrHistogram(max_value_us=10_000_000) for key in self.keys}
+        self.overlap = {axis: HdrHistogram(max_value_us=10_000_000) for axis in self.axes}
+        self.overlap_started = {axis: None for axis in self.axes}
+        self.gaps = {(a, b): HdrHistogram(max_value_us=self.max_gap_ns // 1000)
+                     for axis in self.axes for a in AXIS_KEYS[axis] for b in AXIS_KEYS[axis]}
+        self.last_release = {axis: None for axis in self.axes}
+        self.recent_events = deque()
+        self.peak_rate = 0
+        self.total_events = 0
+
+    def _count_event(self, key, timestamp):
+        self.event_counts[key] += 1
+        self.total_events += 1
+        window = self.recent_events
+        window.append(timestamp)
+        while timestamp - window[0] > self.rate_window_ns:
+            window.popleft()
+        if len(window) > self.peak_rate:
+            self.peak_rate = len(window)
+
+    def press(self, key, timestamp):
+        if key not in self.pressed_at or self.pressed_at[key] is not None:
+            return
+        axis = KEY_AXIS[key]
+        last_release = self.last_release[axis]
+        if last_release is not None:
+            released_key, release_time = last_release
+            if timestamp - release_time <= self.max_gap_ns:
+                self.gaps[(released_key, key)].record((timestamp - release_time) // 1000)
+            self.last_release[axis] = None
+        self.pressed_at[key] = timestamp
+        if self.pressed_at[OPPOSITE_KEY[key]] is not None:
+            self.overlap_started[axis] = timestamp
+        self._count_event(key, timestamp)
+
+    def release(self, key, timestamp):
+        press_time = self.pressed_at.get(key)
+        if press_time is None:
+            return
+        axis = KEY_AXIS[key]
+        self.dwell[key].record((timestamp - press_time) // 1000)
+        self.pressed_at[key] = None
+        if self.overlap_started[axis] is not None:
+            self.overlap[axis].record((timestamp - self.overlap_started[axis]) // 1000)
+            self.overlap_started[axis] = None
+        self.last_release[axis] = (key, timestamp)
+        self._count_event(key, timestamp)
+
+    def current_rate(self):
+        """ 最近一个窗口内的事件频率 (次/秒) """
+        return len(self.recent_events) * 1_000_000_000 / self.rate_window_ns
+
+    def summaries(self):
+        """ {'dwell': {键: 摘要}, 'overlap': {轴: 摘要}, 'gap': {'A→D': 摘要}, 'rate': {...}} """
+        return {
+            'dwell': {key: hist.summary() for key, hist in self.dwell.items()},
+            'overlap': {axis: hist.summary() for axis, hist in self.overlap.items()},
+            'gap': {f"{a}→{b}": hist.summary() for (a, b), hist in self.gaps.items()},
+            'rate': {
+                'current': self.current_rate(),
+                'peak': self.peak_rate * 1_000_000_000 / self.rate_window_ns,
+                'total': self.total_events,
+                'per_key': dict(self.event_counts),
+            },
+        }
+
+
+# 变点类型：均值偏晚/偏早、波动变大/变小
+CHANGE_LATE = 'late'
+CHANGE_EARLY = 'early'
+CHANGE_UNSTABLE = 'unstable'
+CHANGE_STABLE = 'stable'
+CHANGE_NAMES = {
+    CHANGE_LATE: '整体变晚',
+    CHANGE_EARLY: '整体变早',
+    CHANGE_UNSTABLE: '波动变大',
+    CHANGE_STABLE: '波动变小',
+}
+
+
+class _RunStats:
+    """ 整数微秒序列的计数、和与平方和，可 O(1) 追加并求均值/标准差 """
+    __slots__ = ('count', 'total', 'total_sq')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.total = 0
+        self.total_sq = 0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+
+    def copy_from(self, other):
+        self.count, self.total, self.total_sq = other.count, other.total, other.total_sq
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def std(self):
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(max(0.0, (self.total_sq - self.total * self.total / self.count) / (self.count - 1)))
+
+
+class ChangePointDetector:
+    """
+    单个序列的在线变点检测 (CUSUM，对数似然比形式，以参考段标准差归一化)。
+    同时监测四种变化：均值上移/下移 1σ，标准差变为 2 倍/一半 (按此顺序优先)；任一累计量超过 h 即报告变点，
+    变点位置取该累计量最近一次从 0 开始增长的位置，之后以变点后的数据作为新的参考段。
+    每个新值的代价为 O(1)。
+    """
+    def __init__(self, warmup=15, h=8.0, min_sigma_us=1000, max_z=3.0):
+        self.warmup = warmup
+        self.h = h
+        self.min_sigma_us = min_sigma_us
+        self.max_z = max_z # 截断单个离群值的影响，单个值不足以触发变点
+        self.reset()
+
+    def reset(self):
+        self.seq = 0
+        self.reference = _RunStats()
+        self.scores = {kind: 0.0 for kind in CHANGE_NAMES}
+        self.run_start = {kind: None for kind in CHANGE_NAMES}
+        self.run_start_time = {kind: None for kind in CHANGE_NAMES}
+        self.runs = {kind: _RunStats() for kind in CHANGE_NAMES}
+
+    def _increment(self, kind, z):
+        if kind == CHANGE_LATE:
+            return z - 0.5
+        if kind == CHANGE_EARLY:
+            return -z - 0.5
+        if kind == CHANGE_UNSTABLE:
+            return 0.375 * z * z - math.log(2)
+        return math.log(2) - 1.5 * z * z
+
+    def update(self, value_us, timestamp=None):
+        """ 加入一个新值 (可附带事件时间)，检测到变点时返回描述该变点的字典，否则返回 None """
+        self.seq += 1
+        reference = self.reference
+        if reference.count < self.warmup:
+            reference.add(value_us)
+            return None
+
+        mean = reference.mean()
+        sigma = max(reference.std(), self.min_sigma_us)
+        z = max(-self.max_z, min(self.max_z, (value_us - mean) / sigma))
+        triggered = None
+        for kind in self.scores:
+            score = self.scores[kind] + self._increment(kind, z)
+            if score <= 0:
+                self.scores[kind] = 0.0
+                self.run_start[kind] = None
+                self.runs[kind].clear()
+                continue
+            if self.run_start[kind] is None:
+                self.run_start[kind] = self.seq
+                self.run_start_time[kind] = timestamp
+            self.scores[kind] = score
+            self.runs[kind].add(value_us)
+            if score > self.h and triggered is None:
+                triggered = kind # 均值变化优先于波动变化 (均值突变也会放大波动)
+        if triggered is None:
+            return None
+
+        run = self.runs[triggered]
+        change = {
+            'kind': triggered,
+            'seq': self.run_start[triggered],
+            'start_time': self.run_start_time[triggered],
+            'detected_seq': self.seq,
+            'before_mean_us': mean,
+            'before_std_us': reference.std(),
+            'after_mean_us': run.mean(),
+            'after_std_us': run.std(),
+        }
+        # 变点之后的数据作为新的参考段，不足 warmup 时继续积累
+        reference.copy_from(run)
+        for kind in self.scores:
+            self.scores[kind] = 0.0
+            self.run_start[kind] = None
+            self.runs[kind].clear()
+        return change
+
+
+class SessionTrendAnalyzer:
+    """
+    按轴对整场练习的急停时间差做在线变点检测，用于发现热身、漂移与疲劳。
+    seq 为该轴本场的第几次急停 (从 1 开始)，与 RecordStore 的截断无关。
+    """
+    def __init__(self, axes=('AD', 'WS'), warmup=15, max_changes=100):
+        self.axes = tuple(axes)
+        self.detectors = {axis: ChangePointDetector(warmup=warmup) for axis in self.axes}
+        self.changes = {axis: deque(maxlen=max_changes) for axis in self.axes}
+
+    def reset(self):
+        for axis in self.axes:
+            self.detectors[axis].reset()
+            self.changes[axis].clear()
+
+    def count(self, axis):
+        return self.detectors[axis].seq
+
+    def add(self, axis, diff_us, event_time=None):
+        change = self.detectors[axis].update(diff_us, event_time)
+        if change is not None:
+            change['axis'] = axis
+            change['time'] = event_time
+            self.changes[axis].append(change)
+        return change
+
+    @staticmethod
+    def is_improvement(change):
+        """ 均值更接近 0 或波动变小视为状态提升 (热身)，反之视为状态下降 (漂移/疲劳) """
+        if change['kind'] in (CHANGE_STABLE, CHANGE_UNSTABLE):
+            return change['kind'] == CHANGE_STABLE
+        return abs(change['after_mean_us']) < abs(change['before_mean_us'])
+
+    @staticmethod
+    def describe(change):
+        verdict = '状态提升' if SessionTrendAnalyzer.is_improvement(change) else '状态下降'
+        return (f"第 {change['seq']} 次起{CHANGE_NAMES[change['kind']]} ({verdict})："
+                f"平均 {change['before_mean_us'] / 1000:.1f} → {change['after_mean_us'] / 1000:.1f}ms，"
+                f"标准差 {change['before_std_us'] / 1000:.1f} → {change['after_std_us'] / 1000:.1f}ms")
+
+    def summarize(self, axis):
+        """ 返回该轴的趋势小结 (多行文本)，没有变点时返回空字符串 """
+        changes = list(self.changes[axis])
+        if not changes:
+            return ""
+        lines = [f"本场共检测到 {len(changes)} 个变点 (共 {self.count(axis)} 次急停)："]
+        lines.extend(f"  {self.describe(change)}" for change in changes[-5:])
+        first, last = changes[0], changes[-1]
+        if self.is_improvement(first) and first['seq'] <= self.count(axis) // 3:
+            lines.append("热身: 练习开始后一段时间状态明显改善，正式对局前建议先热身。")
+        if not self.is_improvement(last) and last['seq'] > self.count(axis) // 2:
+            lines.append("疲劳提示: 后段状态下降，可以休息片刻再继续练习。")
+        return "\n".join(lines)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 预先设置好样式的图表模板
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+from functools import lru_cache
+
+from matplotlib.font_manager import FontProperties
+from matplotlib.transforms import Bbox
+
+FONT_FAMILIES = ['Microsoft YaHei', 'SimHei', 'Noto Sans CJK SC', 'WenQuanYi Micro Hei', 'DejaVu Sans'] # 依次尝试，非 Windows 系统上也能显示中文
+
+# 主界面图表画在半透明背景上 (白色文字)，报告为白底黑字
+DARK_THEME = {'facecolor': 'none', 'foreground': 'white', 'legend_facecolor': (0, 0, 0, 0.5), 'grid': 'gray'}
+LIGHT_THEME = {'facecolor': 'white', 'foreground': 'black', 'legend_facecolor': 'white', 'grid': 'gray'}
+
+
+@lru_cache(maxsize=None)
+def chart_font(size):
+    """ 按字号缓存的 FontProperties (查找字体文件只在第一次发生) """
+    return FontProperties(family=FONT_FAMILIES, size=size)
+
+
+class ChartTemplate:
+    """
+    一个只设置一次样式的 Axes：背景、坐标轴与刻度颜色、网格、标题与坐标轴标签 (字体缓存) 以及空数据提示。
+    每次更新先调用 begin() 移除上一次的数据图元 (折线、散点、箱线、图例等) 并重置数据范围，
+    然后直接在 ax 上绘制新数据；标题等文本对象只修改文字，不重新创建。
+    主界面、离线报告与新增的图表类型共用这一套模板。
+    """
+    def __init__(self, ax, theme=DARK_THEME, title='', xlabel='', ylabel='', title_size=12, label_size=10,
+                 grid_axis='both', show_yticks=True):
+        self.ax = ax
+        self.theme = theme
+        foreground = theme['foreground']
+        ax.set_facecolor(theme['facecolor'])
+        ax.set_title(title, fontproperties=chart_font(title_size), color=foreground)
+        ax.set_xlabel(xlabel, fontproperties=chart_font(label_size), color=foreground)
+        ax.set_ylabel(ylabel, fontproperties=chart_font(label_size), color=foreground)
+        if grid_axis:
+            ax.grid(True, linestyle='--', alpha=0.3, color=theme['grid'], axis=grid_axis)
+        ax.tick_params(axis='x', colors=foreground)
+        if show_yticks:
+            ax.tick_params(axis='y', colors=foreground)
+        else:
+            ax.tick_params(axis='y', colors='none', length=0)
+            ax.set_yticks([])
+            ax.spines['left'].set_visible(False)
+        for spine_pos in ['top', 'right']: ax.spines[spine_pos].set_visible(False)
+        for spine_pos in ['bottom', 'left']: ax.spines[spine_pos].set_color(foreground)
+        self.placeholder = ax.text(0.5, 0.5, '', ha='center', va='center', transform=ax.transAxes,
+                                   color=foreground, fontproperties=chart_font(label_size + 2), visible=False)
+        self.fixed_artists = set(ax.get_children())
+
+    def begin(self):
+        """ 移除上一次的数据图元并重置自动缩放范围，返回 Axes 供绘制新数据 """
+        ax = self.ax
+        legend = ax.get_legend()
+        if legend is not None:
+            legend.remove()
+        for artist in ax.lines[:] + ax.collections[:] + ax.patches[:] + ax.texts[:] + ax.images[:]:
+            if artist not in self.fixed_artists:
+                artist.remove()
+        ax.dataLim.set(Bbox.null())
+        ax.ignore_existing_data_limits = True
+        ax.set_autoscale_on(True)
+        self.placeholder.set_visible(False)
+        ax.set_axis_on()
+        return ax
+
+    def set_title(self, text):
+        """ 只替换文字 (Axes.set_title 会把字号等重置为默认值) """
+        if self.ax.title.get_text() != text:
+            self.ax.title.set_text(text)
+
+    def show_empty(self, text):
+        """ 没有可绘制的数据：隐藏坐标轴，只显示标题与提示文字 """
+        self.placeholder.set_text(text)
+        self.placeholder.set_visible(True)
+        self.ax.set_axis_off()
+
+    def legend(self, size=9, **kwargs):
+        return self.ax.legend(prop=chart_font(size), facecolor=self.theme['legend_facecolor'],
+                              labelcolor=self.theme['foreground'], **kwargs)
+
+    def text(self, *args, size=8, **kwargs):
+        """ 随数据更新的文字标注 (下次 begin() 时移除) """
+        return self.ax.text(*args, fontproperties=chart_font(size), **kwargs)
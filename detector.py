@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 共享急停检测器与记录存储
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import heapq
+import time
+from bisect import bisect_right, insort
+from collections import deque
+from itertools import islice
+
+AXIS_KEYS = {'AD': ('A', 'D'), 'WS': ('W', 'S')}
+OPPOSITE_KEY = {'A': 'D', 'D': 'A', 'W': 'S', 'S': 'W'}
+KEY_AXIS = {'A': 'AD', 'D': 'AD', 'W': 'WS', 'S': 'WS'}
+
+DEFAULT_FILTER_THRESHOLD = 120  # ms
+MAX_FILTER_THRESHOLD = 200  # ms，超过阈值但在此范围内的急停仍作为候选保留
+PERFECT_THRESHOLD_US = 2000  # 微秒，磁轴用户可调到亚毫秒
+DEFAULT_MIN_RECORD_INTERVAL_NS = 50_000_000
+
+# 时间戳统一为 time.perf_counter_ns() 的整数纳秒，时间差以整数微秒存储，只在显示时换算
+PERF_TO_WALL_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+# 急停的两种形态
+PATTERN_RELEASE_THEN_PRESS = 'release_then_press'  # 松开后再按反向键
+PATTERN_OVERLAP_RELEASE = 'overlap_release'  # 按住反向键时松开
+
+
+# 被抑制或过滤的事件按原因计数 (检测器的诊断统计)
+SUPPRESSION_REASONS = {
+    'recorded': '计入统计的急停',
+    'over_threshold': '超过过滤阈值 (保留为候选)',
+    'out_of_range': '超过候选保留范围 (丢弃)',
+    'too_frequent': '冷却时间内 (操作过于频繁)',
+    'wait_expired': '松开后等待反向键超时',
+    'wait_cancelled': '按下另一轴时取消等待',
+    'wait_replaced': '等待中再次松开 (覆盖旧等待)',
+    'bounce': '去抖时间内的按键抖动',
+    'repeat': '重复按下/松开 (系统按键重复等)',
+}
+
+
+def _per_axis(value, axes, default):
+    """ 整数表示各轴相同，字典中缺少的轴使用 default """
+    if isinstance(value, dict):
+        return {axis: value.get(axis, default) for axis in axes}
+    return dict.fromkeys(axes, value)
+
+
+def ns_to_us(ns):
+    """ 纳秒转微秒，四舍五入且对正负对称，不经过浮点 """
+    us = (abs(ns) + 500) // 1000
+    return us if ns >= 0 else -us
+
+
+def format_time(timestamp_ns):
+    return f"{timestamp_ns / 1e9:.3f}s"
+
+
+def format_clock_time(timestamp_ns):
+    """ 把 perf_counter_ns 时间戳换算为本地时钟时间 HH:MM:SS.mmm """
+    wall_ns = timestamp_ns + PERF_TO_WALL_OFFSET_NS
+    return time.strftime("%H:%M:%S", time.localtime(wall_ns // 1_000_000_000)) + f".{wall_ns // 1_000_000 % 1000:03d}"
+
+
+def get_timing_label(time_diff_us, perfect_threshold_us=PERFECT_THRESHOLD_US):
+    return '完美急停' if abs(time_diff_us) <= perfect_threshold_us else ('按早了' if time_diff_us < 0 else '按晚了')
+
+
+def format_feedback(record, show_axis=True):
+    """ 生成急停反馈文本 """
+    prefix = f"[{record['key_type']}] " if show_axis else ""
+    diff_ms = record['time_diff_us'] / 1000
+    if record['pattern'] == PATTERN_RELEASE_THEN_PRESS:
+        return f"{prefix}{record['timing']}：松开{record['released_key']}后 {diff_ms:.1f}ms 按下了{record['pressed_key']}"
+    return f"{prefix}{record['timing']}：按下{record['pressed_key']}后 {-diff_ms:.1f}ms 松开了{record['released_key']}"
+
+
+class RecordStore:
+    """
+    按轴保存本场全部候选急停，并维护按 |时间差| 排序的索引。
+    series[axis] 是当前过滤阈值下最近 view_size 条有效记录的视图 (定长 deque)，
+    修改阈值或视图大小时用二分查找在索引上重新筛选，无需重放按键输入。
+    每条为 {'time': 事件时间 (ns), 'diff_us': 时间差 (整数微秒)}。
+    aggregate 可选，需提供 add(axis, time_ns, diff_us)、rebuild({轴: (时间, 时间差)}) 与 clear()，每条候选写入时同步更新；
+    on_append(axis, entry) 可选，用于把新候选写入持久化存储 (load() 载入的历史不会触发)。
+    """
+    def __init__(self, maxlen=200, axes=('AD', 'WS'), filter_threshold=DEFAULT_FILTER_THRESHOLD, max_candidates=100_000,
+                 aggregate=None, on_append=None):
+        self.maxlen = maxlen
+        self.axes = tuple(axes)
+        self.filter_threshold_us = filter_threshold * 1000
+        self.max_candidates = max_candidates
+        self.aggregate = aggregate
+        self.on_append = on_append
+        self.candidates = {axis: deque() for axis in self.axes}
+        self.first_seq = {axis: 0 for axis in self.axes} # candidates[axis][0] 的序号
+        self.abs_index = {axis: [] for axis in self.axes} # 按 (|diff_us|, 序号) 排序
+        self.series = {axis: deque(maxlen=maxlen) for axis in self.axes}
+
+    def append(self, record):
+        """ 保存一条候选急停，时间差在当前阈值内时同时加入视图 """
+        axis = record['key_type']
+        entry = {'time': record['event_time'], 'diff_us': record['time_diff_us']}
+        candidates = self.candidates[axis]
+        seq = self.first_seq[axis] + len(candidates)
+        candidates.append(entry)
+        insort(self.abs_index[axis], (abs(entry['diff_us']), seq))
+        if len(candidates) > self.max_candidates:
+            oldest = candidates.popleft()
+            index = self.abs_index[axis]
+            del index[bisect_right(index, (abs(oldest['diff_us']), self.first_seq[axis])) - 1]
+            self.first_seq[axis] += 1
+        if self.aggregate is not None:
+            self.aggregate.add(axis, entry['time'], entry['diff_us'])
+        if self.on_append is not None:
+            self.on_append(axis, entry)
+        if abs(entry['diff_us']) <= self.filter_threshold_us:
+            self.series[axis].append(entry)
+
+    def load(self, history):
+        """
+        批量载入历史记录 {轴: [(时间 ns, 时间差 us), ...]}，与已有候选按时间合并后重建索引、聚合与视图。
+        """
+        for axis in self.axes:
+            loaded = [{'time': t, 'diff_us': d} for t, d in history.get(axis, ())]
+            if not loaded:
+                continue
+            merged = sorted(loaded + list(self.candidates[axis]), key=lambda e: e['time'])[-self.max_candidates:]
+            self.candidates[axis] = deque(merged)
+            self.first_seq[axis] = 0
+            self.abs_index[axis] = sorted((abs(e['diff_us']), seq) for seq, e in enumerate(merged))
+        if self.aggregate is not None:
+            self.aggregate.rebuild({axis: ([e['time'] for e in self.candidates[axis]], [e['diff_us'] for e in self.candidates[axis]])
+                                    for axis in self.axes})
+        return self.refilter()
+
+    def count(self, axis):
+        return len(self.series[axis])
+
+    def candidate_count(self, axis):
+        return len(self.candidates[axis])
+
+    def accepted_count(self, axis, filter_threshold_us=None):
+        """ 阈值内的候选总数，二分查找 O(log n) """
+        threshold = self.filter_threshold_us if filter_threshold_us is None else filter_threshold_us
+        return bisect_right(self.abs_index[axis], (threshold, float('inf')))
+
+    def recent(self, axis, n):
+        """ 返回某轴最近 n 条记录 (列表) """
+        data = self.series[axis]
+        return list(islice(data, max(0, len(data) - n), None))
+
+    def refilter(self, filter_threshold=None, maxlen=None):
+        """ 按新的阈值 (ms) 和/或视图大小重建各轴视图，返回 {轴: 阈值内的候选数} """
+        if filter_threshold is not None:
+            self.filter_threshold_us = filter_threshold * 1000
+        if maxlen is not None:
+            self.maxlen = maxlen
+        accepted = {}
+        for axis in self.axes:
+            cut = self.accepted_count(axis)
+            # 阈值内的候选是索引的前 cut 项，从中取序号最大的 maxlen 条并按时间顺序放回视图
+            newest = heapq.nlargest(self.maxlen, (seq for _, seq in islice(self.abs_index[axis], cut)))
+            candidates = self.candidates[axis]
+            first_seq = self.first_seq[axis]
+            self.series[axis] = deque((candidates[seq - first_seq] for seq in reversed(newest)), maxlen=self.maxlen)
+            accepted[axis] = cut
+        return accepted
+
+    def clear(self):
+        for axis in self.axes:
+            self.candidates[axis].clear()
+            self.abs_index[axis].clear()
+            self.series[axis].clear()
+            self.first_seq[axis] = 0
+        if self.aggregate is not None:
+            self.aggregate.clear()
+
+
+class QuickStopDetector:
+    """
+    与界面无关的急停检测器，主程序和经典 AD 视图共用同一套规则：
+    filter_threshold 过滤、按轴的记录间最小间隔 (冷却) 与按键去抖、按下另一轴时取消等待。
+    超过 filter_threshold 但不超过 capture_threshold 的急停只写入 store 作为候选，不触发 on_record。
+    冷却、去抖与等待超时都只按事件时间戳判断，与事件何时被处理无关 (GUI 卡顿或回放时结果相同)；
+    每个被抑制或过滤的事件都按轴、按原因计数，见 suppression_stats()。
+
+    press()/release() 接收 perf_counter_ns 整数时间戳；所有回调都在调用线程中同步执行：
+    on_record(record)、on_key_state(key, pressed)、on_log(message)、
+    on_wait_start(key_type, interval_ms)、on_wait_stop(key_type)。
+    min_record_interval_ns 与 debounce_ns 可以是整数 (各轴相同) 或 {轴: 纳秒}。
+    """
+    def __init__(self, axes=('AD', 'WS'), key_mappings=None, store=None,
+                 filter_threshold=DEFAULT_FILTER_THRESHOLD, capture_threshold=MAX_FILTER_THRESHOLD,
+                 perfect_threshold_us=PERFECT_THRESHOLD_US,
+                 min_record_interval_ns=DEFAULT_MIN_RECORD_INTERVAL_NS, debounce_ns=0, timer_buffer=20,
+                 on_record=None, on_key_state=None, on_log=None, on_wait_start=None, on_wait_stop=None):
+        self.axes = tuple(axes)
+        self.keys = [key for axis in self.axes for key in AXIS_KEYS[axis]]
+        self.store = store
+        self.filter_threshold = filter_threshold
+        self.capture_threshold = capture_threshold
+        self.perfect_threshold_us = perfect_threshold_us
+        self.set_rate_limits(min_record_interval_ns, debounce_ns)
+        self.timer_buffer = timer_buffer
+        self.on_record = on_record or (lambda record: None)
+        self.on_key_state = on_key_state or (lambda key, pressed: None)
+        self.on_log = on_log or (lambda message: None)
+        self.on_wait_start = on_wait_start or (lambda key_type, interval: None)
+        self.on_wait_stop = on_wait_stop or (lambda key_type: None)
+        self.set_key_mappings(key_mappings or {key: key for key in self.keys})
+        self.reset()
+
+    def set_key_mappings(self, key_mappings):
+        self.key_mappings = {key: key_mappings.get(key, key) for key in self.keys}
+        self.reverse_key_mappings = {v: k for k, v in self.key_mappings.items()}
+
+    def set_rate_limits(self, min_record_interval_ns=None, debounce_ns=None):
+        """ 设置按轴的记录间最小间隔与按键去抖时间 (整数或 {轴: 纳秒}，None 表示不修改) """
+        if min_record_interval_ns is not None:
+            self.min_record_interval_ns = _per_axis(min_record_interval_ns, self.axes, DEFAULT_MIN_RECORD_INTERVAL_NS)
+        if debounce_ns is not None:
+            self.debounce_ns = _per_axis(debounce_ns, self.axes, 0)
+
+    def reset(self):
+        self.key_state = {key: {'pressed': False, 'time': None} for key in self.keys}
+        self.last_transition = {key: None for key in self.keys}
+        self.waiting_for_opposite_key = {}
+        # 回放较早的录制时事件时间换算为本进程的 perf_counter_ns 可能为负数，不能以 0 表示尚无记录
+        self.last_record_time = {axis: None for axis in self.axes}
+        self.counters = {axis: dict.fromkeys(SUPPRESSION_REASONS, 0) for axis in self.axes}
+
+    def is_mapped(self, original_key_char):
+        return original_key_char in self.reverse_key_mappings
+
+    def suppression_stats(self):
+        """ {轴: {原因: 次数}}，原因见 SUPPRESSION_REASONS ('recorded' 为计入统计的急停) """
+        return {axis: dict(counts) for axis, counts in self.counters.items()}
+
+    def _count(self, key_type, reason):
+        self.counters[key_type][reason] += 1
+
+    def _cancel_wait(self, key_type):
+        if key_type in self.waiting_for_opposite_key:
+            del self.waiting_for_opposite_key[key_type]
+            self.on_wait_stop(key_type)
+
+    def _emit_record(self, record):
+        if self.store is not None:
+            self.store.append(record)
+        self.on_record(record)
+        self.last_record_time[record['key_type']] = record['event_time']
+        self._count(record['key_type'], 'recorded')
+
+    def _too_frequent(self, key_type, event_time):
+        last = self.last_record_time[key_type]
+        return last is not None and event_time - last < self.min_record_interval_ns[key_type]
+
+    def _bounced(self, key_char, timestamp):
+        """ 距该键上一次状态变化不足去抖时间的事件视为机械抖动 """
+        last = self.last_transition[key_char]
+        return last is not None and timestamp - last < self.debounce_ns[KEY_AXIS[key_char]]
+
+    def wait_interval(self):
+        """ 松开后等待反向键的时长 (ms)，需覆盖候选保留范围 """
+        return max(self.filter_threshold, self.capture_threshold) + self.timer_buffer
+
+    def wait_deadline(self, key_type):
+        """ 该轴当前等待状态的超时时刻 (事件时间 ns)，没有等待时返回 None """
+        waiting = self.waiting_for_opposite_key.get(key_type)
+        return None if waiting is None else waiting['release_time'] + self.wait_interval() * 1_000_000
+
+    def _keep_candidate(self, record):
+        """ 超过过滤阈值的急停：在保留范围内时只写入 store，之后调高阈值可重新纳入 """
+        if abs(record['time_diff_us']) > self.capture_threshold * 1000:
+            self._count(record['key_type'], 'out_of_range')
+            return
+        self._count(record['key_type'], 'over_threshold')
+        if self.store is not None:
+            self.store.append(record)
+
+    def _make_record(self, key_type, pattern, event_time, time_diff_us, released_key, pressed_key, events):
+        return {
+            'key_type': key_type,
+            'pattern': pattern,
+            'event_time': event_time,
+            'time_diff_us': time_diff_us,
+            'timing': get_timing_label(time_diff_us, self.perfect_threshold_us),
+            'released_key': released_key,
+            'pressed_key': pressed_key,
+            'events': events,
+        }
+
+    def press(self, original_key_char, press_time):
+        """ 处理一次按下事件，产生急停记录时返回该记录 """
+        key_char = self.reverse_key_mappings.get(original_key_char)
+        if not key_char:
+            return None
+        key_type = KEY_AXIS[key_char]
+        if self.key_state[key_char]['pressed']:
+            self._count(key_type, 'repeat')
+            return None
+        if self._bounced(key_char, press_time):
+            self._count(key_type, 'bounce')
+            return None
+        record = None
+        self.key_state[key_char]['pressed'] = True
+        self.key_state[key_char]['time'] = press_time
+        self.last_transition[key_char] = press_time
+        self.on_key_state(key_char, True)
+        self.on_log(f"按下: {original_key_char} (映射为 {key_char}) at {press_time / 1e9:.4f}")
+
+        waiting = self.waiting_for_opposite_key.get(key_type)
+        if waiting and key_char == waiting['key'] and press_time > self.wait_deadline(key_type):
+            self.expire_wait(key_type) # 等待计时器还没来得及触发 (GUI 卡顿)，按事件时间已经超时
+            waiting = None
+        if waiting and key_char == waiting['key']:
+            if self._too_frequent(key_type, press_time):
+                self.on_log(f"操作过于频繁，忽略此次 {key_type} 急停 (松开后按)。")
+                self._count(key_type, 'too_frequent')
+                self._cancel_wait(key_type)
+                return None
+
+            time_diff_us = ns_to_us(press_time - waiting['release_time'])
+            self.on_log(f"检测到 {key_type} 急停 (松开后按): {waiting['key_released_orig']} ({waiting['key_released_mapped']}) -> {original_key_char} ({key_char}), 时间差: {time_diff_us / 1000:.1f}ms")
+
+            events = waiting['events'] + [
+                {'key': original_key_char, 'event': '按下', 'time': press_time, 'time_str': format_time(press_time)}
+            ]
+            candidate = self._make_record(key_type, PATTERN_RELEASE_THEN_PRESS, press_time, time_diff_us,
+                                          waiting['key_released_orig'], original_key_char, events)
+            if abs(time_diff_us) > self.filter_threshold * 1000:
+                self.on_log(f"时间差 {time_diff_us / 1000:.1f}ms 超过阈值 {self.filter_threshold}ms，不计入统计 (保留为候选)。")
+                self._keep_candidate(candidate)
+            else:
+                record = candidate
+                self._emit_record(record)
+                self.on_log(f"记录 {key_type} 急停 (松开后按): 时间差 {time_diff_us / 1000:.1f}ms")
+            self._cancel_wait(key_type)
+
+        for other_key_type in self.axes:
+            if other_key_type == key_type or other_key_type not in self.waiting_for_opposite_key:
+                continue
+            other = self.waiting_for_opposite_key[other_key_type]
+            expected_key_orig = self.key_mappings[other['key']]
+            self.on_log(f"按下 {original_key_char} ({key_char}) 时取消了等待 {expected_key_orig} (原松开 {other['key_released_orig']}) 的 {other_key_type} 状态。")
+            self._count(other_key_type, 'wait_cancelled')
+            self._cancel_wait(other_key_type)
+        return record
+
+    def release(self, original_key_char, release_time):
+        """ 处理一次松开事件，产生急停记录时返回该记录 """
+        key_char = self.reverse_key_mappings.get(original_key_char)
+        if not key_char:
+            return None
+        if not self.key_state[key_char]['pressed']:
+            self._count(KEY_AXIS[key_char], 'repeat')
+            return None
+        if self._bounced(key_char, release_time):
+            self._count(KEY_AXIS[key_char], 'bounce')
+            return None
+        self.key_state[key_char]['pressed'] = False
+        self.last_transition[key_char] = release_time
+        self.on_key_state(key_char, False)
+        self.on_log(f"松开: {original_key_char} (映射为 {key_char}) at {release_time / 1e9:.4f}")
+        return self._process_release(original_key_char, key_char, release_time)
+
+    def _process_release(self, key_released_orig, key_released_mapped, release_time):
+        key_type = KEY_AXIS[key_released_mapped]
+        opposite_key_mapped = OPPOSITE_KEY[key_released_mapped]
+        opposite_key_orig = self.key_mappings[opposite_key_mapped]
+        opposite_key_state = self.key_state[opposite_key_mapped]
+
+        if opposite_key_state['pressed']:
+            if self._too_frequent(key_type, release_time):
+                self.on_log(f"操作过于频繁，忽略此次 {key_type} 急停 (按住反向键松开)。")
+                self._count(key_type, 'too_frequent')
+            else:
+                opposite_key_press_time = opposite_key_state['time']
+                time_diff_us = ns_to_us(opposite_key_press_time - release_time)
+                self.on_log(f"检测到 {key_type} 急停 (按住反向键松开): {key_released_orig} ({key_released_mapped}) -> {opposite_key_orig} ({opposite_key_mapped}), 时间差: {time_diff_us / 1000:.1f}ms")
+
+                events = [
+                    {'key': opposite_key_orig, 'event': '按下', 'time': opposite_key_press_time, 'time_str': format_time(opposite_key_press_time)},
+                    {'key': key_released_orig, 'event': '松开', 'time': release_time, 'time_str': format_time(release_time)}
+                ]
+                candidate = self._make_record(key_type, PATTERN_OVERLAP_RELEASE, release_time, time_diff_us,
+                                              key_released_orig, opposite_key_orig, events)
+                if abs(time_diff_us) > self.filter_threshold * 1000:
+                    self.on_log(f"时间差 {time_diff_us / 1000:.1f}ms 超过阈值 {self.filter_threshold}ms，不计入统计 (保留为候选)。")
+                    self._keep_candidate(candidate)
+                else:
+                    record = candidate
+                    self._emit_record(record)
+                    self.on_log(f"记录 {key_type} 急停 (按住反向键松开): 时间差 {time_diff_us / 1000:.1f}ms")
+                    self._cancel_wait(key_type)
+                    return record
+
+        if key_type in self.waiting_for_opposite_key:
+            self.on_log(f"覆盖旧的 {key_type} 等待状态。")
+            self._count(key_type, 'wait_replaced')
+            self.on_wait_stop(key_type)
+
+        self.waiting_for_opposite_key[key_type] = {
+            'key': opposite_key_mapped,
+            'release_time': release_time,
+            'key_released_orig': key_released_orig,
+            'key_released_mapped': key_released_mapped,
+            'events': [
+                {'key': key_released_orig, 'event': '松开', 'time': release_time, 'time_str': format_time(release_time)}
+            ]
+        }
+        self.on_log(f"开始等待按下 {opposite_key_orig} (映射为 {opposite_key_mapped}) 以完成 {key_type} 急停。")
+        self.on_wait_start(key_type, self.wait_interval())
+        return None
+
+    def expire_overdue(self, timestamp):
+        """ 按事件时间取消已超过等待时长的等待状态 (回放、离线分析与 GUI 计时器触发时调用) """
+        for key_type in list(self.waiting_for_opposite_key):
+            if timestamp > self.wait_deadline(key_type):
+                self.expire_wait(key_type)
+
+    def expire_wait(self, key_type, timer_interval=None):
+        """ 等待超时：取消该轴的等待状态 """
+        waiting = self.waiting_for_opposite_key.pop(key_type, None)
+        if waiting is None:
+            return
+        self._count(key_type, 'wait_expired')
+        interval = timer_interval if timer_interval is not None else self.wait_interval()
+        expected_key_orig = self.key_mappings[waiting['key']]
+        self.on_log(f"超时 ({interval}ms): 松开 {waiting['key_released_orig']} 后未及时按下 {expected_key_orig} (映射为 {waiting['key']})。取消 {key_type} 等待状态。")
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - GUI 事件循环健康监测与看门狗
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from tracing import HdrHistogram
+
+
+class EventLoopWatchdog:
+    """
+    GUI 事件循环健康监测。
+
+    GUI 线程用计时器每隔 heartbeat_interval_ms 调用一次 beat()，实际间隔超出计划的部分即事件循环延迟，
+    记录在 HDR 直方图中；后台线程在心跳停顿超过 stall_threshold_ms 时认为 GUI 线程卡顿，
+    期间记录待处理输入事件数的最大值，capture_stacks 为 True 时抓取一次 GUI 线程的调用栈。
+    心跳恢复时由 beat() 结束这次卡顿并返回卡顿记录 (没有卡顿时返回 None)，由调用方决定如何提示。
+    看门狗线程只读取时间戳与计数器，不调用任何 Qt 接口。
+    """
+    def __init__(self, heartbeat_interval_ms=50, stall_threshold_ms=200, pending_provider=None,
+                 capture_stacks=False, max_depth=48, keep_episodes=50):
+        self.heartbeat_interval_ns = heartbeat_interval_ms * 1_000_000
+        self.stall_threshold_ns = stall_threshold_ms * 1_000_000
+        self.pending_provider = pending_provider or (lambda: 0)
+        self.capture_stacks = capture_stacks
+        self.max_depth = max_depth
+        self.lag_histogram = HdrHistogram()
+        self.episodes = deque(maxlen=keep_episodes)
+        self.stall_count = 0
+        self.target_ident = None
+        self.last_beat_ns = None
+        self._lock = threading.Lock()
+        self._current = None # 看门狗线程观察到的进行中的卡顿
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, target_ident=None):
+        """ 在 GUI 线程调用；target_ident 默认为调用线程 """
+        if self.is_running():
+            return
+        self.target_ident = target_ident or threading.get_ident()
+        self.last_beat_ns = time.perf_counter_ns()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="EventLoopWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.is_running():
+            return
+        self._stop_event.set()
+        self._thread.join(1.0)
+        self._thread = None
+
+    def beat(self, now_ns=None):
+        """ GUI 线程的心跳：记录事件循环延迟，心跳间隔达到卡顿阈值时返回这次卡顿的记录 """
+        now_ns = time.perf_counter_ns() if now_ns is None else now_ns
+        last = self.last_beat_ns
+        self.last_beat_ns = now_ns
+        if last is None:
+            return None
+        lag_ns = max(0, now_ns - last - self.heartbeat_interval_ns)
+        self.lag_histogram.record(lag_ns // 1000)
+        with self._lock:
+            observed, self._current = self._current, None
+        if lag_ns < self.stall_threshold_ns:
+            return None
+        # 看门狗线程可能来不及观察到较短的卡顿，以心跳间隔为准
+        pending = self.pending_provider()
+        episode = {
+            'start': last,
+            'duration_ms': (now_ns - last) / 1e6,
+            'lag_ms': lag_ns / 1e6,
+            'pending': pending,
+            'max_pending': max(pending, observed['max_pending']) if observed else pending,
+            'stack': observed['stack'] if observed else None,
+        }
+        with self._lock:
+            self.episodes.append(episode)
+            self.stall_count += 1
+        return episode
+
+    def _run(self):
+        poll = self.heartbeat_interval_ns / 2e9
+        while not self._stop_event.wait(poll):
+            last = self.last_beat_ns
+            if last is None or time.perf_counter_ns() - last < self.heartbeat_interval_ns + self.stall_threshold_ns:
+                continue
+            pending = self.pending_provider()
+            with self._lock:
+                current = self._current
+                if current is None or current['start'] != last:
+                    stack = self._capture_stack() if self.capture_stacks else None
+                    self._current = {'start': last, 'max_pending': pending, 'stack': stack}
+                else:
+                    current['max_pending'] = max(current['max_pending'], pending)
+
+    def _capture_stack(self):
+        """ GUI 线程当前的调用栈 (外层在前)，每项为 '函数 (文件:行号)' """
+        frame = sys._current_frames().get(self.target_ident)
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        del frame
+        stack.reverse()
+        return stack
+
+    def recent_episodes(self):
+        with self._lock:
+            return list(self.episodes)
+
+    def summary(self):
+        lag = self.lag_histogram.summary()
+        return {
+            'lag_p50_ms': lag['p50'] / 1000,
+            'lag_p99_ms': lag['p99'] / 1000,
+            'lag_max_ms': lag['max'] / 1000,
+            'stalls': self.stall_count,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.lag_histogram.reset()
+            self.episodes.clear()
+            self.stall_count = 0
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 急停数据推送服务
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+from collections import deque
+
+try:
+    import msgpack  # 可选依赖，仅在选择 msgpack 编码时需要
+except ImportError:
+    msgpack = None
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC11B85"
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+MAX_CLIENT_PAYLOAD = 125  # 客户端只会发送 ping/close 等控制帧，载荷不超过 125 字节
+CLOSE_TOO_BIG = 1009
+
+
+def encode_ws_frame(payload, opcode=OP_TEXT):
+    """ 编码一个服务端 -> 客户端的 WebSocket 帧 (不加掩码) """
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def read_ws_frame(reader):
+    """ 读取一个客户端帧，返回 (opcode, payload)；载荷超过 MAX_CLIENT_PAYLOAD 时抛出 ValueError (不读取载荷) """
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    if length > MAX_CLIENT_PAYLOAD:
+        raise ValueError(f"客户端帧过长: {length} 字节")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask and length:
+        key = (mask * (length // 4 + 1))[:length]
+        payload = (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+    return opcode, payload
+
+
+class FeedSubscriber:
+    """
+    单个订阅者的有界发送队列。
+    队列满时丢弃最旧的一条并计数，慢客户端只会丢自己的数据，不会拖慢检测或其他客户端。
+    """
+    def __init__(self, name, max_queue=64):
+        self.name = name
+        self.queue = deque(maxlen=max_queue)
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, frame):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1  # deque 满时 append 会自动挤掉最旧的一条
+        self.queue.append(frame)
+        self.ready.set()
+
+    async def next_frame(self):
+        while not self.queue:
+            self.ready.clear()
+            await self.ready.wait()
+        return self.queue.popleft()
+
+    async def deliver(self, frame):
+        """ 把一帧交给客户端；基类只计数不发送，子类按连接方式重写 """
+
+    async def run(self):
+        try:
+            while not self.closed:
+                frame = await self.next_frame()
+                await self.deliver(frame)
+                self.sent += 1
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.closed = True
+
+
+class WebSocketSubscriber(FeedSubscriber):
+    """ 通过 WebSocket 连接的订阅者 (OBS 浏览器源、教练面板等) """
+    def __init__(self, name, writer, max_queue=64, send_timeout=2.0):
+        super().__init__(name, max_queue)
+        self.writer = writer
+        self.send_timeout = send_timeout
+
+    async def deliver(self, frame):
+        self.writer.write(frame)
+        # 单个客户端写超时只断开该客户端
+        await asyncio.wait_for(self.writer.drain(), self.send_timeout)
+
+
+class LocalSubscriber(FeedSubscriber):
+    """
+    进程内的替身客户端，走与真实客户端相同的队列和背压逻辑，
+    收到的数据解码后保存在 received 中，便于测试。delay 可模拟慢客户端。
+    """
+    def __init__(self, name, decode, max_queue=64, delay=0.0):
+        super().__init__(name, max_queue)
+        self.decode = decode
+        self.delay = delay
+        self.received = []
+
+    async def deliver(self, frame):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append(self.decode(frame))
+
+
+class QuickStopFeedServer:
+    """
+    在后台线程中运行的 asyncio WebSocket 服务，把每条急停记录推送给本地订阅者。
+    publish() 可在任意线程调用，只做一次线程安全的投递，编码与发送都在服务线程完成。
+    """
+    def __init__(self, host='127.0.0.1', port=8765, encoding='json', max_queue=64, send_timeout=2.0):
+        if encoding not in ('json', 'msgpack'):
+            raise ValueError(f"不支持的编码方式: {encoding}")
+        if encoding == 'msgpack' and msgpack is None:
+            raise ValueError("未安装 msgpack，无法使用 msgpack 编码。")
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.subscribers = set()
+        self.client_tasks = set()
+        self.published = 0
+        self._client_seq = 0
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/"
+
+    def start(self):
+        """ 启动服务线程，端口绑定失败时在调用线程抛出 OSError """
+        started = threading.Event()
+        errors = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.server = self.loop.run_until_complete(
+                    asyncio.start_server(self._handle_client, self.host, self.port))
+                self.port = self.server.sockets[0].getsockname()[1]  # port=0 时取实际端口
+            except OSError as e:
+                errors.append(e)
+                started.set()
+                self.loop.close()
+                return
+            started.set()
+            try:
+                self.loop.run_forever()
+            finally:
+                self.server.close()
+                for sub in list(self.subscribers):
+                    sub.closed = True
+                    sub.ready.set()
+                    if isinstance(sub, WebSocketSubscriber):
+                        sub.writer.transport.abort()
+                if self.client_tasks:  # 连接已关闭，读取循环会自行结束
+                    self.loop.run_until_complete(asyncio.wait(list(self.client_tasks), timeout=1.0))
+                pending = asyncio.all_tasks(self.loop)
+                for task in pending:
+                    task.cancel()
+                self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="QuickStopFeedServer", daemon=True)
+        self.thread.start()
+        started.wait()
+        if errors:
+            self.thread = None
+            raise errors[0]
+
+    def stop(self, timeout=1.0):
+        if self.thread and self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout)
+        self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def publish(self, record):
+        """ 线程安全地投递一条急停记录 (dict)，服务未运行时直接忽略 """
+        if self.loop is None or not self.is_running():
+            return
+        self.loop.call_soon_threadsafe(self._broadcast, record)
+
+    def encode(self, record):
+        if self.encoding == 'msgpack':
+            return encode_ws_frame(msgpack.packb(record, use_bin_type=True), OP_BINARY)
+        payload = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return encode_ws_frame(payload, OP_TEXT)
+
+    def decode(self, frame):
+        """ 解码 encode() 生成的帧，供本地替身客户端使用 """
+        second = frame[1] & 0x7F
+        offset = 2 if second < 126 else (4 if second == 126 else 10)
+        payload = frame[offset:]
+        if self.encoding == 'msgpack':
+            return msgpack.unpackb(payload, raw=False)
+        return json.loads(payload.decode('utf-8'))
+
+    def add_local_subscriber(self, max_queue=None, delay=0.0):
+        """ 注册一个进程内替身客户端 (线程安全)，返回 LocalSubscriber """
+        sub = LocalSubscriber(f"local-{self._next_client_id()}", self.decode,
+                              max_queue or self.max_queue, delay)
+        done = threading.Event()
+
+        def register():
+            self._attach(sub)
+            done.set()
+
+        self.loop.call_soon_threadsafe(register)
+        done.wait()
+        return sub
+
+    def stats(self):
+        """ 返回各订阅者的发送与丢弃计数快照 """
+        return {
+            'published': self.published,
+            'clients': [
+                {'name': sub.name, 'sent': sub.sent, 'dropped': sub.dropped, 'queued': len(sub.queue)}
+                for sub in list(self.subscribers)
+            ],
+        }
+
+    def _next_client_id(self):
+        self._client_seq += 1
+        return self._client_seq
+
+    def _attach(self, sub):
+        self.subscribers.add(sub)
+        task = self.loop.create_task(sub.run())
+        task.add_done_callback(lambda _: self.subscribers.discard(sub))
+        return task
+
+    def _broadcast(self, record):
+        self.published += 1
+        if not self.subscribers:
+            return
+        frame = self.encode(record)  # 每条记录只编码一次，所有客户端共享同一帧
+        for sub in list(self.subscribers):
+            if not sub.closed:
+                sub.offer(frame)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 5)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+
+        headers = {}
+        for line in request.decode('latin-1').split('\r\n')[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        key = headers.get('sec-websocket-key')
+        if not key or headers.get('upgrade', '').lower() != 'websocket':
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            writer.close()
+            return
+
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode('ascii')).digest()).decode('ascii')
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode('ascii'))
+
+        peer = writer.get_extra_info('peername')
+        sub = WebSocketSubscriber(f"ws-{self._next_client_id()}-{peer}", writer, self.max_queue, self.send_timeout)
+        send_task = self._attach(sub)
+        task = asyncio.current_task()
+        self.client_tasks.add(task)
+        # 发送超时或失败时立即断开 (不再等待积压数据写出)，读取循环随之结束，不必等客户端再发来一帧
+        send_task.add_done_callback(lambda _: writer.transport.abort())
+        try:
+            # 读取客户端帧：只处理 ping/close，其余内容忽略
+            while not sub.closed:
+                opcode, payload = await read_ws_frame(reader)
+                if opcode == OP_PING:
+                    writer.write(encode_ws_frame(payload, OP_PONG))
+                elif opcode == OP_CLOSE:
+                    writer.write(encode_ws_frame(b'', OP_CLOSE))
+                    break
+        except ValueError:
+            writer.write(encode_ws_frame(struct.pack('!H', CLOSE_TOO_BIG), OP_CLOSE))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # 客户端断开或发送端已关闭连接
+        finally:
+            self.client_tasks.discard(task)
+            sub.closed = True
+            sub.ready.set()
+            send_task.cancel()
+            writer.close()
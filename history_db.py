@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - SQLite 历史记录后端 (可选)
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from detector import PERF_TO_WALL_OFFSET_NS
+
+DB_FILE = 'history.db'
+
+# 时间均为墙上时间 ns，时间差为 us；外部工具可直接用 sqlite3 查询 (WAL 模式下读取不会阻塞写入)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    profile TEXT NOT NULL,
+    started_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stops (
+    profile TEXT NOT NULL,
+    session INTEGER NOT NULL,
+    axis TEXT NOT NULL,
+    time_ns INTEGER NOT NULL,
+    diff_us INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stops_profile_axis_time ON stops (profile, axis, time_ns);
+CREATE INDEX IF NOT EXISTS stops_profile_axis_absdiff ON stops (profile, axis, ABS(diff_us), time_ns);
+CREATE INDEX IF NOT EXISTS stops_session ON stops (session);
+CREATE INDEX IF NOT EXISTS sessions_profile ON sessions (profile, id);
+"""
+
+INSERT_STOP = "INSERT INTO stops (profile, session, axis, time_ns, diff_us) VALUES (?, ?, ?, ?, ?)"
+
+
+_prepared_paths = set()
+_prepare_lock = threading.Lock()
+
+
+def prepare_database(path):
+    """ 切换到 WAL 模式并建表/建索引，每个进程每个文件只执行一次 (journal_mode 保存在数据库文件中) """
+    with _prepare_lock:
+        if path in _prepared_paths:
+            return
+        with closing(sqlite3.connect(path, timeout=5.0)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        _prepared_paths.add(path)
+
+
+def connect(path, writer=False):
+    """ 打开一个连接；表结构由 prepare_database 预先准备，这里不再重复执行 """
+    conn = sqlite3.connect(path, timeout=5.0)
+    if writer:
+        conn.execute("PRAGMA synchronous=NORMAL") # WAL 模式下每次提交不 fsync，检查点时才落盘
+    return conn
+
+
+class SqliteHistoryWriter:
+    """
+    SQLite 历史记录写入端，接口与 profiles.HistoryWriter 相同。
+    append() 只把一行放入内存队列；后台线程每攒够 batch_size 行或每隔 flush_interval_ms
+    用一次 executemany (单个事务) 写入，检测/GUI 线程不会等待数据库。
+    """
+    def __init__(self, path, profile_id, batch_size=256, flush_interval_ms=200, on_error=None):
+        self.path = path
+        self.profile_id = profile_id
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.on_error = on_error
+        prepare_database(path)
+        with closing(connect(path, writer=True)) as conn, conn:
+            self.session_id = conn.execute("INSERT INTO sessions (profile, started_ns) VALUES (?, ?)",
+                                           (profile_id, time.time_ns())).lastrowid
+        self.pending = []
+        self.condition = threading.Condition()
+        self.closing = False
+        self.error = None
+        self.rows_written = 0
+        self.commits = 0
+        self.thread = threading.Thread(target=self._run, name="SqliteHistoryWriter", daemon=True)
+        self.thread.start()
+
+    def append(self, axis, time_ns, diff_us):
+        """ time_ns 为 perf_counter_ns 时间戳，写入时换算为墙上时间 """
+        row = (self.profile_id, self.session_id, axis, time_ns + PERF_TO_WALL_OFFSET_NS, diff_us)
+        with self.condition:
+            if self.closing or self.error:
+                return
+            self.pending.append(row)
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify()
+
+    def _run(self):
+        try:
+            conn = connect(self.path, writer=True)
+        except sqlite3.Error as e:
+            self._fail(e)
+            return
+        with closing(conn):
+            while True:
+                with self.condition:
+                    if not self.closing and len(self.pending) < self.batch_size:
+                        self.condition.wait(self.flush_interval)
+                    batch, self.pending = self.pending, []
+                    closing_now = self.closing
+                if batch:
+                    try:
+                        with conn:
+                            conn.executemany(INSERT_STOP, batch)
+                    except sqlite3.Error as e:
+                        self._fail(e)
+                        return
+                    self.rows_written += len(batch)
+                    self.commits += 1
+                if closing_now:
+                    return
+
+    def _fail(self, error):
+        with self.condition:
+            self.error = error
+            self.pending.clear()
+        if self.on_error:
+            self.on_error(error)
+
+    def stats(self):
+        return {'records': self.rows_written, 'commits': self.commits}
+
+    def close(self):
+        """ 通知后台线程写完队列中剩余的行后关闭，不等待；需要确认写入完毕时再调用 join() """
+        with self.condition:
+            if self.closing:
+                return
+            self.closing = True
+            self.condition.notify()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+
+class SqliteHistory:
+    """ 只读查询 (每次调用使用独立连接，可在任意线程调用) """
+    def __init__(self, path):
+        self.path = path
+        prepare_database(path)
+
+    def last_session(self, profile_id):
+        """ 该档案最近一场会话的 id，没有时为 0 """
+        with closing(connect(self.path)) as conn:
+            row = conn.execute("SELECT MAX(id) FROM sessions WHERE profile = ?", (profile_id,)).fetchone()
+        return row[0] or 0
+
+    def sessions(self, profile_id, after=0, until=None):
+        """ 返回 id 在 (after, until] 范围内的会话 id 列表 """
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute("SELECT id FROM sessions WHERE profile = ? AND id > ? AND id <= ? ORDER BY id",
+                                (profile_id, after, until if until is not None else 2 ** 62)).fetchall()
+        return [row[0] for row in rows]
+
+    def load(self, profile_id, since_ns, last_session):
+        """ 读取 since_ns 之后、last_session 及之前各场的记录，返回 {轴: [(perf_counter_ns 时间, 时间差 us), ...]} """
+        history = {}
+        with closing(connect(self.path)) as conn:
+            for axis, wall_ns, diff_us in conn.execute(
+                    "SELECT axis, time_ns, diff_us FROM stops WHERE profile = ? AND axis IN ('AD', 'WS') "
+                    "AND time_ns >= ? AND session <= ? ORDER BY axis, time_ns",
+                    (profile_id, since_ns, last_session)):
+                history.setdefault(axis, []).append((wall_ns - PERF_TO_WALL_OFFSET_NS, diff_us))
+        return history
+
+    def session_history(self, profile_id, session_id):
+        """ 一场会话的记录，返回 {轴: [(墙上时间 ns, 时间差 us), ...]} """
+        history = {}
+        with closing(connect(self.path)) as conn:
+            for axis, wall_ns, diff_us in conn.execute(
+                    "SELECT axis, time_ns, diff_us FROM stops WHERE profile = ? AND session = ? ORDER BY time_ns",
+                    (profile_id, session_id)):
+                history.setdefault(axis, []).append((wall_ns, diff_us))
+        return history
+
+    def worst_stops(self, profile_id, axis, since_ns, limit=50, max_abs_us=None):
+        """ since_ns 之后 |时间差| 最大的 limit 次急停 (可限定 |时间差| 不超过 max_abs_us)，返回 [(墙上时间 ns, 时间差 us), ...] """
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(
+                "SELECT time_ns, diff_us FROM stops WHERE profile = ? AND axis = ? AND time_ns >= ? "
+                "AND ABS(diff_us) <= ? ORDER BY ABS(diff_us) DESC LIMIT ?",
+                (profile_id, axis, since_ns, 2 ** 62 if max_abs_us is None else max_abs_us, limit)).fetchall()
+        return rows
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 多台练习机的实时汇总视图 (汇总端)
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+from stations import AXES, DEFAULT_GROUP, DEFAULT_PORT, LoopbackTransport, QuickStopHub, StationPublisher, open_transport
+
+LEADERBOARD_COLUMNS = ('排名', '玩家', '急停次数', 'AD', 'WS', '平均|时间差| (ms)', '平均 (ms)', '标准差 (ms)', '完美率', '最近一次 (ms)', '丢失帧')
+
+
+def leaderboard_row(s):
+    rate = f"{s['perfect_rate'] * 100:.0f}%"
+    return (s['rank'] or '-', s['name'], s['count'], s['AD'], s['WS'], f"{s['mean_abs_ms']:.1f}", f"{s['mean_ms']:+.1f}",
+            f"{s['stdev_ms']:.1f}", rate, f"{s['last_diff_ms']:+.1f}", s['lost_frames'])
+
+
+def format_timeline_entry(entry):
+    wall_ns, name, axis, diff_us = entry
+    clock = time.strftime("%H:%M:%S", time.localtime(wall_ns // 1_000_000_000)) + f".{wall_ns // 1_000_000 % 1000:03d}"
+    return f"{clock}  [{axis}] {name}: {diff_us / 1000:+.1f}ms"
+
+
+class StationSimulator:
+    """ 模拟若干台练习机，每台每秒发送 rate 次随机急停 (用于演示与压力测试) """
+    def __init__(self, stations, rate, make_transport, seed=0):
+        self.rng = random.Random(seed)
+        self.rate = rate
+        self.publishers = [StationPublisher(make_transport(), f"模拟玩家{i + 1}") for i in range(stations)]
+        self.skill = [(self.rng.uniform(-10, 10), self.rng.uniform(3, 20)) for _ in range(stations)] # 每人的平均值与标准差 (ms)
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="StationSimulator", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        tick = 0.01
+        owed = 0.0
+        next_tick = time.perf_counter()
+        while not self.stopping.is_set():
+            owed += self.rate * tick
+            count, owed = int(owed), owed - int(owed)
+            now = time.time_ns()
+            for publisher, (mean, sd) in zip(self.publishers, self.skill):
+                for i in range(count):
+                    diff_us = round(self.rng.gauss(mean, sd) * 1000)
+                    publisher.publish_wall(self.rng.choice(AXES), now - (count - i) * 1000, diff_us)
+            next_tick += tick
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self.stopping.wait(delay)
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+        for publisher in self.publishers:
+            publisher.close()
+        for publisher in self.publishers:
+            publisher.join()
+
+    def sent(self):
+        return sum(publisher.sent for publisher in self.publishers)
+
+
+def run_window(hub, refresh_ms):
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import (QApplication, QHBoxLayout, QHeaderView, QLabel, QListWidget, QMainWindow,
+                                 QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget)
+
+    class HubWindow(QMainWindow):
+        """ 汇总视图：排行榜 + 按时间合并的急停流，每 refresh_ms 从汇总端取一次快照 """
+        def __init__(self):
+            super().__init__()
+            self.setWindowTitle("CS2急停评估工具 - 练习汇总")
+            self.resize(1280, 720)
+            central = QWidget()
+            self.setCentralWidget(central)
+            layout = QVBoxLayout(central)
+            self.status_label = QLabel()
+            layout.addWidget(self.status_label)
+            body = QHBoxLayout()
+            self.table = QTableWidget(0, len(LEADERBOARD_COLUMNS))
+            self.table.setHorizontalHeaderLabels(LEADERBOARD_COLUMNS)
+            self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+            self.table.verticalHeader().setVisible(False)
+            self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+            body.addWidget(self.table, 3)
+            self.timeline = QListWidget()
+            body.addWidget(self.timeline, 2)
+            layout.addLayout(body)
+            self.last_stats = None
+            self.last_time = time.perf_counter()
+            self.timer = QTimer(self)
+            self.timer.timeout.connect(self.refresh)
+            self.timer.start(refresh_ms)
+
+        def refresh(self):
+            board, recent, stats = hub.snapshot()
+            self.table.setRowCount(len(board))
+            for row, s in enumerate(board):
+                for column, value in enumerate(leaderboard_row(s)):
+                    item = self.table.item(row, column)
+                    if item is None:
+                        self.table.setItem(row, column, QTableWidgetItem(str(value)))
+                    elif item.text() != str(value):
+                        item.setText(str(value))
+            self.timeline.clear()
+            self.timeline.addItems([format_timeline_entry(entry) for entry in recent])
+            now = time.perf_counter()
+            rate = (stats['stops'] - self.last_stats['stops']) / (now - self.last_time) if self.last_stats else 0
+            self.last_stats, self.last_time = stats, now
+            self.status_label.setText(
+                f"玩家 {stats['players']}  连接 {stats['connections']}  急停 {stats['stops']} ({rate:.0f}/s)  帧 {stats['frames']}  "
+                f"损坏帧 {stats['bad_frames']}  迟到 {stats['late']}  待合并 {stats['buffered']}")
+
+    app = QApplication(sys.argv)
+    window = HubWindow()
+    window.show()
+    return app.exec_()
+
+
+def run_headless(hub, duration, interval=2.0):
+    start = time.perf_counter()
+    last = 0
+    while duration is None or time.perf_counter() - start < duration:
+        time.sleep(interval)
+        board, _, stats = hub.snapshot()
+        print(f"[{time.perf_counter() - start:6.1f}s] 急停 {stats['stops']} (+{(stats['stops'] - last) / interval:.0f}/s)  "
+              f"帧 {stats['frames']}  迟到 {stats['late']}  损坏帧 {stats['bad_frames']}")
+        last = stats['stops']
+        for s in board[:10]:
+            print("    " + "  ".join(str(value) for value in leaderboard_row(s)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CS2 急停评估工具 - 汇总多台练习机的急停数据")
+    parser.add_argument('--udp', default=f"{DEFAULT_GROUP}:{DEFAULT_PORT}", help="接收 UDP 的组播地址或绑定地址:端口，设为 off 关闭")
+    parser.add_argument('--tcp', default=f"0.0.0.0:{DEFAULT_PORT}", help="接收 TCP 帧流的绑定地址:端口，设为 off 关闭")
+    parser.add_argument('--window', type=int, default=200, help="每名玩家统计最近多少次急停")
+    parser.add_argument('--reorder-ms', type=int, default=250, help="按时间合并前等待迟到数据的时长")
+    parser.add_argument('--refresh-ms', type=int, default=250, help="界面刷新间隔")
+    parser.add_argument('--headless', action='store_true', help="不显示窗口，定期在终端输出排行榜")
+    parser.add_argument('--duration', type=float, default=None, help="无窗口模式的运行时长 (秒)")
+    parser.add_argument('--simulate', type=int, default=0, help="同时模拟的练习机数量 (演示与压力测试)")
+    parser.add_argument('--rate', type=int, default=100, help="每台模拟练习机每秒的急停数")
+    parser.add_argument('--via', choices=('loopback', 'udp', 'tcp'), default='loopback', help="模拟练习机的发送方式")
+    args = parser.parse_args()
+
+    def address(value):
+        if value == 'off':
+            return None
+        host, _, port = value.rpartition(':')
+        return host, int(port)
+
+    hub = QuickStopHub(udp=address(args.udp), tcp=address(args.tcp), window=args.window, reorder_window_ms=args.reorder_ms)
+    hub.start()
+    print(f"汇总端已启动: UDP {hub.udp}  TCP {hub.tcp}")
+
+    simulator = None
+    if args.simulate:
+        if args.via == 'loopback':
+            make_transport = lambda: LoopbackTransport(hub)
+        else:
+            host, port = hub.udp if args.via == 'udp' else hub.tcp
+            host = '127.0.0.1' if host == '0.0.0.0' else host
+            make_transport = lambda: open_transport(f"{args.via}://{host}:{port}")
+        simulator = StationSimulator(args.simulate, args.rate, make_transport)
+        simulator.start()
+
+    try:
+        if args.headless:
+            run_headless(hub, args.duration)
+        else:
+            run_window(hub, args.refresh_ms)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if simulator:
+            simulator.stop()
+            time.sleep(0.3)
+            print(f"模拟练习机共发送 {simulator.sent()} 次急停，汇总端收到 {hub.snapshot()[2]['stops']} 次")
+        hub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 预写日志 (崩溃安全的追加写入)
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import os
+import struct
+import threading
+import time
+import zlib
+
+JOURNAL_MAGIC = b'CS2SRWAL'
+JOURNAL_VERSION = 1
+FILE_HEADER = struct.Struct('<8sI')
+RECORD_HEADER = struct.Struct('<II') # 负载长度, 负载的 CRC32
+MAX_RECORD_SIZE = 1 << 20 # 超过该长度的记录头视为损坏
+
+DEFAULT_SYNC_EVERY = 64 # 累计多少条记录后 fsync 一次
+DEFAULT_SYNC_INTERVAL_MS = 500 # 距离上次 fsync 最多多久 (有未落盘记录时)
+
+
+class JournalError(Exception):
+    """ 日志文件头无效 (不是本程序的日志或版本不兼容) """
+
+
+def encode_record(payload):
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def scan_records(data, offset=FILE_HEADER.size):
+    """
+    从 offset 开始解析记录，返回 (负载列表, 最后一条有效记录的结束位置)。
+    遇到不完整或校验失败的记录即停止，之后的数据视为写入中途崩溃留下的残尾。
+    """
+    payloads = []
+    end = len(data)
+    while offset + RECORD_HEADER.size <= end:
+        length, crc = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        if length > MAX_RECORD_SIZE or start + length > end:
+            break
+        payload = bytes(data[start:start + length])
+        if zlib.crc32(payload) != crc:
+            break
+        payloads.append(payload)
+        offset = start + length
+    return payloads, offset
+
+
+def _check_header(data, path):
+    magic, version = FILE_HEADER.unpack_from(data)
+    if magic != JOURNAL_MAGIC or version != JOURNAL_VERSION:
+        raise JournalError(f"{path} 不是有效的日志文件")
+
+
+def read_journal(path, end_offset=None):
+    """
+    读取日志中的全部有效记录 (只读，不修改文件)，可在写入进程运行时并发调用。
+    只解析到 end_offset (默认为当前文件末尾)，正在写入的半条记录会被忽略。
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read() if end_offset is None else f.read(end_offset)
+    except FileNotFoundError:
+        return []
+    if len(data) < FILE_HEADER.size:
+        return []
+    _check_header(data, path)
+    return scan_records(data)[0]
+
+
+def recover_journal(path):
+    """
+    启动时恢复日志：创建缺失的文件头，截掉末尾不完整或校验失败的部分。
+    返回 (有效数据的结束位置, 截掉的字节数)。
+    """
+    with open(path, 'a+b') as f:
+        f.seek(0)
+        data = f.read()
+        if len(data) < FILE_HEADER.size:
+            f.truncate(0)
+            f.write(FILE_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION))
+            f.flush()
+            os.fsync(f.fileno())
+            return FILE_HEADER.size, len(data)
+        _check_header(data, path)
+        valid_end = scan_records(data)[1]
+        if valid_end < len(data):
+            f.truncate(valid_end)
+            f.flush()
+            os.fsync(f.fileno())
+        return valid_end, len(data) - valid_end
+
+
+class JournalWriter:
+    """
+    预写日志的写入端。append() 只把编码后的记录放入内存队列，立即返回；
+    后台线程把队列中已积累的记录合并为一次 write (组提交)，
+    每累计 sync_every 条或距上次 fsync 超过 sync_interval_ms 时 fsync 一次。
+    检测/GUI 线程不会等待磁盘，崩溃时最多丢失最后一个 fsync 周期内的记录。
+    """
+    def __init__(self, path, sync_every=DEFAULT_SYNC_EVERY, sync_interval_ms=DEFAULT_SYNC_INTERVAL_MS,
+                 on_error=None):
+        self.path = path
+        self.sync_every = max(1, sync_every)
+        self.sync_interval_ns = sync_interval_ms * 1_000_000
+        self.on_error = on_error
+        self.start_offset, self.recovered_bytes = recover_journal(path)
+        self.file = open(path, 'ab')
+        self.pending = []
+        self.condition = threading.Condition()
+        self.closing = False
+        self.error = None
+        self.unsynced = 0
+        self.last_sync = time.perf_counter_ns()
+        self.records_written = 0
+        self.commits = 0
+        self.syncs = 0
+        self.thread = threading.Thread(target=self._run, name="JournalWriter", daemon=True)
+        self.thread.start()
+
+    def append(self, payload):
+        record = encode_record(payload)
+        with self.condition:
+            if self.closing or self.error:
+                return False
+            self.pending.append(record)
+            self.condition.notify()
+        return True
+
+    def _sync_due(self, now):
+        return self.unsynced and (self.unsynced >= self.sync_every
+                                  or now - self.last_sync >= self.sync_interval_ns)
+
+    def _run(self):
+        try:
+            self._write_loop()
+        finally:
+            self.file.close()
+
+    def _write_loop(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closing:
+                    if self.unsynced:
+                        remaining = self.sync_interval_ns - (time.perf_counter_ns() - self.last_sync)
+                        if remaining <= 0:
+                            break
+                        self.condition.wait(remaining / 1e9)
+                    else:
+                        self.condition.wait()
+                batch, self.pending = self.pending, []
+                closing = self.closing
+            try:
+                if batch:
+                    self.file.write(b''.join(batch))
+                    self.file.flush()
+                    self.unsynced += len(batch)
+                    self.records_written += len(batch)
+                    self.commits += 1
+                if self._sync_due(time.perf_counter_ns()) or (closing and self.unsynced):
+                    os.fsync(self.file.fileno())
+                    self.unsynced = 0
+                    self.syncs += 1
+                    self.last_sync = time.perf_counter_ns()
+            except OSError as e:
+                with self.condition:
+                    self.error = e
+                    self.pending.clear()
+                if self.on_error:
+                    self.on_error(e)
+                return
+            if closing:
+                return
+
+    def stats(self):
+        return {
+            'records': self.records_written,
+            'commits': self.commits,
+            'syncs': self.syncs,
+            'recovered_bytes': self.recovered_bytes,
+        }
+
+    def close(self):
+        """
+        通知后台线程写完队列中剩余的记录、fsync 后关闭文件，不等待 (在 GUI 线程调用，磁盘慢时也不会卡住界面)。
+        需要确认文件已写完时再调用 join()。
+        """
+        with self.condition:
+            if self.closing:
+                return
+            self.closing = True
+            self.condition.notify()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 按键映射编译为整数键码分发表
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import sys
+from enum import Enum
+
+VK_COUNT = 256 # Windows 虚拟键码范围
+SCAN_BASE = VK_COUNT # 扫描码放在虚拟键码之后：下标 = SCAN_BASE + 扫描码
+TABLE_SIZE = SCAN_BASE + 256
+NATIVE_VK = sys.platform == 'win32' # 其他平台 pynput 的 vk 不是 Windows 虚拟键码，只能按字符匹配
+
+# 按键名 -> Windows 虚拟键码 (字母与数字键的键码即其 ASCII 码)
+NAMED_KEYS = {
+    'UP': (0x26,), 'DOWN': (0x28,), 'LEFT': (0x25,), 'RIGHT': (0x27,),
+    'SPACE': (0x20,), 'TAB': (0x09,), 'ENTER': (0x0D,), 'BACKSPACE': (0x08,), 'ESC': (0x1B,), 'CAPS_LOCK': (0x14,),
+    'SHIFT': (0xA0, 0x10), 'SHIFT_R': (0xA1,), 'CTRL': (0xA2, 0x11), 'CTRL_R': (0xA3,), 'ALT': (0xA4, 0x12), 'ALT_R': (0xA5,),
+    'INSERT': (0x2D,), 'DELETE': (0x2E,), 'HOME': (0x24,), 'END': (0x23,), 'PAGE_UP': (0x21,), 'PAGE_DOWN': (0x22,),
+    **{f'F{n}': (0x6F + n,) for n in range(1, 13)},
+    **{f'NUM{n}': (0x60 + n,) for n in range(10)},
+    'NUM*': (0x6A,), 'NUM+': (0x6B,), 'NUM-': (0x6D,), 'NUM.': (0x6E,), 'NUM/': (0x6F,),
+}
+KEY_ALIASES = {
+    **{f'NUMPAD{n}': f'NUM{n}' for n in range(10)},
+    'ESCAPE': 'ESC', 'RETURN': 'ENTER', 'CONTROL': 'CTRL', 'CAPSLOCK': 'CAPS_LOCK', 'DEL': 'DELETE',
+    'PGUP': 'PAGE_UP', 'PGDN': 'PAGE_DOWN',
+}
+VK_NAMES = {codes[0]: name for name, codes in NAMED_KEYS.items()}
+KEY_NAME_HINT = "字母或数字，UP/DOWN/LEFT/RIGHT，NUM0-NUM9，SHIFT、CTRL、SPACE、F1 等，或 SC:扫描码 / VK:虚拟键码"
+
+
+def _parse_code(text):
+    try:
+        value = int(text, 0)
+    except ValueError:
+        raise ValueError(f"'{text}' 不是有效的键码") from None
+    if not 0 <= value < 256:
+        raise ValueError(f"键码 {value} 超出范围 (0-255)")
+    return value
+
+
+def normalize_key_name(text):
+    """ 把用户输入的按键名转换为规范写法 (大写、别名展开、键码用十进制)，无法识别时抛出 ValueError """
+    name = text.strip().upper().replace(' ', '')
+    name = KEY_ALIASES.get(name, name)
+    if len(name) == 1 and name.isascii() and name.isalnum():
+        return name
+    if name in NAMED_KEYS:
+        return name
+    if name.startswith('SC:'):
+        return f"SC:{_parse_code(name[3:])}"
+    if name.startswith('VK:'):
+        vk = _parse_code(name[3:])
+        if 0x30 <= vk <= 0x39 or 0x41 <= vk <= 0x5A:
+            return chr(vk)
+        return VK_NAMES.get(vk, f"VK:{vk}")
+    raise ValueError(f"无法识别的按键 '{text}' (可用: {KEY_NAME_HINT})")
+
+
+def key_codes(name):
+    """ 规范按键名 -> 分发表下标 """
+    if len(name) == 1:
+        return (ord(name),)
+    if name.startswith('SC:'):
+        return (SCAN_BASE + int(name[3:]),)
+    if name.startswith('VK:'):
+        return (int(name[3:]),)
+    return NAMED_KEYS[name]
+
+
+class KeyDispatchTable:
+    """
+    编译后的按键映射：以整数键码为下标的定长元组，值为映射的按键名 (检测器与录制文件使用的字符串)。
+    监听线程每个事件只做一次属性读取与元组下标，未映射的按键直接返回 None，不分配任何对象。
+    表在创建后不再修改；更新映射时整体替换 (一次属性赋值)，监听线程读到的总是完整的旧表或新表。
+    """
+    def __init__(self, entries):
+        table = [None] * TABLE_SIZE
+        for code, name in entries.items():
+            table[code] = name
+        self.table = tuple(table)
+        # 非 Windows 平台的后备：按 pynput 给出的字符匹配，只支持字母与数字键
+        self.by_char = {}
+        for name in set(entries.values()):
+            if len(name) == 1:
+                self.by_char[name] = name
+                self.by_char[name.lower()] = name
+
+    def lookup(self, key):
+        """ pynput 按键 -> 映射的按键名，未映射或 key 为 None 时返回 None (在监听线程中调用) """
+        if key is None:
+            return None
+        if isinstance(key, Enum):
+            key = key.value # 方向键、Shift 等特殊键的值是带虚拟键码的 KeyCode
+        if NATIVE_VK:
+            vk = key.vk
+            if vk is not None and 0 <= vk < VK_COUNT:
+                name = self.table[vk]
+                if name is not None:
+                    return name
+            scan = getattr(key, '_scan', None)
+            if scan is not None and 0 <= scan < 256:
+                name = self.table[SCAN_BASE + scan]
+                if name is not None:
+                    return name
+            # 虚拟键码与扫描码都没有命中 (如注入的事件只带字符) 时按字符匹配
+        char = getattr(key, 'char', None)
+        return None if char is None else self.by_char.get(char)
+
+
+def compile_key_mappings(key_mappings):
+    """
+    把 {目标键: 按键名} 编译为 KeyDispatchTable。
+    按键名无法识别或多个目标键落在同一个键码上时抛出 ValueError。
+    """
+    entries = {}
+    names = set()
+    for source in key_mappings.values():
+        name = normalize_key_name(source)
+        if name in names:
+            raise ValueError(f"按键 '{name}' 被多次映射")
+        names.add(name)
+        for code in key_codes(name):
+            if entries.get(code, name) != name:
+                raise ValueError(f"按键 '{name}' 与 '{entries[code]}' 是同一个键")
+            entries[code] = name
+    return KeyDispatchTable(entries)
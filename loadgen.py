@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 合成按键负载生成器
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from detector import AXIS_KEYS
+from ringbuffer import EVENT_PRESS, EVENT_RELEASE
+
+SCENARIOS = ('chatter', 'simultaneous', 'rapid_trigger', 'interleave', 'idle', 'counter_strafe', 'mixed')
+
+
+class LoadGenerator:
+    """
+    按种子确定性地生成按键事件流，并标注应当检测到的急停次数 (ground truth)。
+    事件为 (偏移秒数, 'press'/'release', 逻辑按键)，逻辑按键为 W/A/S/D；投递时换算为整数纳秒时间戳。
+    """
+    def __init__(self, seed=0, threshold_ms=120, axes=('AD', 'WS')):
+        self.rng = random.Random(seed)
+        self.threshold_ms = threshold_ms
+        self.axes = tuple(axes)
+        self.keys = ''.join(key for axis in self.axes for key in AXIS_KEYS[axis])
+        self.events = []
+        self.expected_stops = 0
+        self.cursor = 0.0
+
+    def _add(self, offset, kind, key):
+        self.events.append((self.cursor + offset, kind, key))
+
+    def _advance(self, seconds):
+        self.cursor += seconds
+
+    def counter_strafe(self, axis, diff_ms, hold_ms=150):
+        """ 按住一侧，松开后 diff_ms 再按反向键 (负数表示先按反向键再松开) """
+        first, second = AXIS_KEYS[axis]
+        if self.rng.random() < 0.5:
+            first, second = second, first
+        hold = hold_ms / 1000
+        diff = diff_ms / 1000
+        self._add(0, 'press', first)
+        self._add(hold, 'release', first)
+        self._add(hold + diff, 'press', second)
+        self._add(max(hold, hold + diff) + 0.08, 'release', second)
+        if abs(diff_ms) <= self.threshold_ms:
+            self.expected_stops += 1
+        # 下一组动作与本次松开间隔超过阈值，避免意外构成一次急停
+        self._advance(max(hold, hold + diff) + 0.08 + self.threshold_ms / 1000 + 0.05)
+
+    def chatter(self, rate_hz, duration_s, key='A'):
+        """ 单键以 rate_hz 的事件频率抖动 (按下/松开交替)，不应产生急停 """
+        step = 1.0 / rate_hz
+        count = int(duration_s * rate_hz) // 2 * 2
+        for i in range(count):
+            self._add(i * step, 'press' if i % 2 == 0 else 'release', key)
+        self._advance(count * step + 0.3)
+
+    def simultaneous(self, hold_ms=200):
+        """ A+D 同时按住后几乎同时松开，时间差超出阈值，不应产生急停 """
+        jitter = self.rng.uniform(0, 0.001)
+        hold = max(hold_ms, self.threshold_ms + 20) / 1000
+        self._add(0, 'press', 'A')
+        self._add(jitter, 'press', 'D')
+        self._add(hold + jitter, 'release', 'A')
+        self._add(hold + jitter + self.rng.uniform(0, 0.001), 'release', 'D')
+        self._advance(hold + 0.3)
+
+    def rapid_trigger(self):
+        """ 磁轴快速触发风格：亚毫秒级的松开/按下间隔 """
+        self.counter_strafe(self.rng.choice(self.axes), self.rng.uniform(-0.9, 0.9), hold_ms=self.rng.uniform(60, 160))
+
+    def interleave(self):
+        """
+        松开 A 后先按 W 再按 D，走“按下另一轴时取消等待”分支，不应产生急停；
+        只检测 AD 的视图会忽略 W，此时计为一次急停。
+        """
+        self._add(0, 'press', 'A')
+        self._add(0.1, 'release', 'A')
+        self._add(0.1 + self.rng.uniform(0.001, 0.005), 'press', 'W')
+        self._add(0.1 + self.rng.uniform(0.006, 0.02), 'press', 'D')
+        self._add(0.25, 'release', 'D')
+        self._add(0.26, 'release', 'W')
+        if 'WS' not in self.axes:
+            self.expected_stops += 1
+        self._advance(0.6)
+
+    def idle(self, seconds):
+        self._advance(seconds)
+
+    def build(self, scenario, duration_s=10.0, rate_hz=1000):
+        """ 生成指定场景直到事件流覆盖 duration_s 秒，返回按时间排序的事件列表 """
+        while self.cursor < duration_s:
+            kind = scenario if scenario != 'mixed' else self.rng.choice(
+                ('counter_strafe', 'counter_strafe', 'rapid_trigger', 'interleave', 'simultaneous', 'chatter', 'idle'))
+            if kind == 'chatter':
+                self.chatter(rate_hz, min(0.5, duration_s), self.rng.choice(self.keys))
+            elif kind == 'simultaneous':
+                self.simultaneous()
+            elif kind == 'rapid_trigger':
+                self.rapid_trigger()
+            elif kind == 'interleave':
+                self.interleave()
+            elif kind == 'idle':
+                self.idle(self.rng.uniform(1.0, 3.0))
+            else:
+                self.counter_strafe(self.rng.choice(self.axes), self.rng.uniform(-60, 60))
+        self.events.sort(key=lambda e: e[0])
+        return self.events
+
+
+class LoadRunner:
+    """
+    把事件流从后台线程经 enqueue_key_event 写入 MainWindow 的输入环形缓冲区，
+    与真实监听线程走完全相同的缓冲与检测路径，并统计吞吐、检测次数与最大排队深度。
+    """
+    def __init__(self, window, events, max_speed=False):
+        self.window = window
+        self.events = events
+        self.max_speed = max_speed
+        self.emitted = 0
+        self.detected = 0
+        self.max_queue_depth = 0
+        self.done = threading.Event()
+
+    def processed(self):
+        """ 检测器已读过 (含因溢出跳过) 的事件数 """
+        return self.window.detector_reader.read_seq - self.start_seq
+
+    def _count_detected(self, *args):
+        self.detected += 1
+
+    def _produce(self):
+        mappings = self.window.detector.key_mappings
+        physical = {k: mappings.get(k, k) for k in 'WASD'}
+        base = time.perf_counter_ns() + 50_000_000
+        for offset, kind, key in self.events:
+            timestamp = base + round(offset * 1e9)
+            if not self.max_speed:
+                delay = timestamp - time.perf_counter_ns()
+                if delay > 2_000_000:
+                    time.sleep((delay - 1_000_000) / 1e9)
+                while time.perf_counter_ns() < timestamp:
+                    pass
+            self.window.enqueue_key_event(EVENT_PRESS if kind == 'press' else EVENT_RELEASE, physical[key], timestamp)
+            self.emitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.window.detector_reader.pending())
+        self.done.set()
+
+    def run(self, app):
+        self.start_seq = self.window.detector_reader.read_seq
+        self.window.history_signal.connect(self._count_detected)
+        producer = threading.Thread(target=self._produce, name="LoadGenerator", daemon=True)
+        start = time.perf_counter()
+        producer.start()
+        while not self.done.is_set() or self.processed() < self.emitted:
+            app.processEvents()
+        elapsed = time.perf_counter() - start
+        self.window.history_signal.disconnect(self._count_detected)
+        return {
+            'events': self.emitted,
+            'elapsed_s': elapsed,
+            'events_per_sec': self.emitted / elapsed if elapsed > 0 else 0.0,
+            'detected': self.detected,
+            'max_queue_depth': self.max_queue_depth,
+            'dropped': self.window.detector_reader.dropped,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CS2 急停评估工具 - 检测路径压力测试")
+    parser.add_argument('--scenario', choices=SCENARIOS, default='mixed')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--duration', type=float, default=10.0, help="事件流覆盖的时长 (秒)")
+    parser.add_argument('--rate', type=int, default=1000, help="抖动场景的事件频率 (Hz)")
+    parser.add_argument('--max-speed', action='store_true', help="不按时间表节流，尽快投递所有事件")
+    parser.add_argument('--show', action='store_true', help="显示主窗口 (包含图表绘制开销)")
+    parser.add_argument('--classic', action='store_true', help="压测经典 AD 视图 (CS2StopReflex.py) 以便与主程序对比")
+    args = parser.parse_args()
+
+    # 压测使用临时的用户数据目录，合成的急停不会写入真实玩家档案
+    os.environ['APPDATA'] = tempfile.mkdtemp(prefix='cs2stopreflex_loadgen_')
+
+    from PyQt5.QtWidgets import QApplication
+    if args.classic:
+        from CS2StopReflex import MainWindow
+    else:
+        from main import MainWindow
+
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    if args.show:
+        window.show()
+
+    generator = LoadGenerator(args.seed, window.filter_threshold, window.detector.axes)
+    events = generator.build(args.scenario, args.duration, args.rate)
+    result = LoadRunner(window, events, args.max_speed).run(app)
+
+    print(f"场景: {args.scenario}  种子: {args.seed}  事件数: {result['events']}")
+    print(f"耗时: {result['elapsed_s']:.2f}s  吞吐: {result['events_per_sec']:.0f} 事件/秒")
+    print(f"检测到急停: {result['detected']}  期望: {generator.expected_stops}")
+    print(f"最大排队深度: {result['max_queue_depth']}  缓冲区丢弃: {result['dropped']}")
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
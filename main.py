@@ -10,27 +10,62 @@
 
 import sys
 import os
+import html
+import sqlite3
 import time
+import threading
+from bisect import bisect_left
 from collections import deque
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QVBoxLayout, QWidget,
     QHBoxLayout, QListWidget, QMessageBox, QListWidgetItem, QPushButton,
     QSizePolicy, QSpacerItem, QGridLayout, QGroupBox, QDialog,
-    QRadioButton, QButtonGroup, QShortcut, QLineEdit, QFormLayout, QTextBrowser
+    QRadioButton, QButtonGroup, QShortcut, QLineEdit, QFormLayout, QTextBrowser, QMenu,
+    QFileDialog, QInputDialog, QSlider, QCompleter, QCheckBox
 )
-from PyQt5.QtCore import Qt, pyqtSignal, QUrl, QSize, QTimer, pyqtSlot
-from PyQt5.QtGui import QFont, QColor, QBrush, QIcon, QDesktopServices, QPixmap, QPainter, QKeySequence
+from PyQt5.QtCore import Qt, pyqtSignal, QUrl, QSize, QTimer, pyqtSlot, QPointF, QRectF
+from PyQt5.QtGui import QFont, QColor, QBrush, QIcon, QDesktopServices, QPixmap, QPainter, QKeySequence, QPen, QPolygonF
 from pynput import keyboard
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-import statistics
 from matplotlib import rcParams
 import matplotlib.colors as mcolors # Import colors module
+from matplotlib.cm import ScalarMappable
+from feed_server import QuickStopFeedServer
+from tracing import LatencyTracer
+from profiler import SamplingProfiler
+from eventloop import EventLoopWatchdog
+from ringbuffer import SpscRingBuffer, EVENT_PRESS, EVENT_RELEASE
+from analytics import KeyTimingAnalytics, SessionTrendAnalyzer, CHANGE_NAMES
+from stats import EARLY_RGB, LATE_RGB, PERFECT_RGB, DiffBinAggregate, diff_array, diff_colors, summarize_diffs
+from profiles import ProfileManager, rate_limits_ns
+from journal import JournalError
+from replay import SessionReplayer, SPEED_MAX, read_event_log
+from charts import ChartTemplate, LIGHT_THEME
+from panels import TextPanel
+from keymap import KEY_NAME_HINT, NAMED_KEYS, compile_key_mappings, normalize_key_name
+from detector import SUPPRESSION_REASONS, QuickStopDetector, RecordStore, format_clock_time, format_feedback, get_timing_label
 
 # 设置 matplotlib 字体以支持中文
 rcParams['font.sans-serif'] = ['Microsoft YaHei']
 rcParams['axes.unicode_minus'] = False
 
+FEED_HOST = '127.0.0.1'  # 仅本机订阅 (OBS 浏览器源 / 教练面板)
+FEED_PORT = 8765
+RENDER_FPS_CAP = 30  # 迷你悬浮窗等轻量视图的最高刷新帧率
+HISTORY_SYNC_EVERY = 64  # 历史记录每累计多少条 fsync 一次
+HISTORY_SYNC_INTERVAL_MS = 500  # 有未落盘的历史记录时最长多久 fsync 一次
+WRITER_CLOSE_TIMEOUT_S = 2.0  # 退出时最多等待写入线程落盘的时间
+REPLAY_FRAME_BUDGET_NS = 800_000_000 // RENDER_FPS_CAP  # 回放时每帧用于处理事件的时间，其余留给绘制
+HISTORY_LIST_SIZE = 50  # 历史列表保留的条数
+LOG_LIST_SIZE = 150  # 日志列表保留的条数
+HEARTBEAT_INTERVAL_MS = 50  # GUI 事件循环心跳间隔
+STALL_THRESHOLD_MS = 200  # 心跳延迟超过该值记为一次卡顿
+FEEDBACK_BUDGET_MS = 100  # 按键到急停反馈显示的延迟预算，超出时在状态栏提示
+RECOMMENDATION_REFRESH_MS = 300  # 建议面板打开时，新的急停最多每隔多久触发一次后台重算
+LONG_TERM_CACHE_S = 60  # 长期统计 (汇总与数据库查询) 的缓存时间，不必每次急停都重新查询
+BOX_COLORS = {'AD': ('#7570b3', '#1b9e77', '#b2df8a'), 'WS': ('#D95F02', '#FF7F0E', '#ffff99')}  # 箱线图边框, 填充, 中位线
+
 def resource_path(relative_path):
     """ 获取资源的绝对路径，支持打包后的应用 """
     if getattr(sys, 'frozen', False):  # 如果是打包后的可执行文件
@@ -39,6 +74,12 @@ def resource_path(relative_path):
         current_dir = os.path.dirname(os.path.abspath(__file__))
     return os.path.join(current_dir, relative_path)
 
+def user_data_path(relative_path=""):
+    """ 获取用户数据目录 (诊断文件、会话记录等) 下的路径，目录不存在时自动创建 """
+    base_dir = os.path.join(os.environ.get('APPDATA') or os.path.expanduser('~'), 'CS2StopReflex')
+    os.makedirs(base_dir, exist_ok=True)
+    return os.path.join(base_dir, relative_path)
+
 class BackgroundLabel(QLabel):
     """ 带透明度和背景模糊效果的背景标签 """
     def __init__(self, image_path, parent=None):
@@ -147,16 +188,20 @@ class KeyMappingDialog(QDialog):
         self.setMinimumWidth(300)
 
         self.map_inputs = {}
+        key_name_completer = QCompleter(sorted(NAMED_KEYS), self)
+        key_name_completer.setCaseSensitivity(Qt.CaseInsensitive)
         for target_key in ['W', 'A', 'S', 'D']:
             source_key = self.current_mappings.get(target_key, target_key)
             line_edit = QLineEdit(source_key)
-            line_edit.setMaxLength(1) 
             line_edit.setFont(QFont("Arial", 12))
+            line_edit.setToolTip(KEY_NAME_HINT)
+            line_edit.setCompleter(key_name_completer)
             self.map_inputs[target_key] = line_edit
             layout.addRow(f"映射到 {target_key}:", line_edit)
 
         self.validation_label = QLabel("")
         self.validation_label.setStyleSheet("color: red;")
+        self.validation_label.setWordWrap(True)
         layout.addWidget(self.validation_label)
 
         button_layout = QHBoxLayout()
@@ -182,13 +227,15 @@ class KeyMappingDialog(QDialog):
         pressed_keys = set()
         valid = True
         for target_key, line_edit in self.map_inputs.items():
-            val = line_edit.text().upper()
-            if not val: 
+            val = line_edit.text()
+            if not val.strip(): 
                 self.validation_label.setText(f"错误: {target_key} 的映射不能为空。")
                 valid = False
                 break
-            if not val.isalnum(): 
-                self.validation_label.setText(f"错误: {target_key} 的映射 '{val}' 无效 (仅限字母或数字)。")
+            try:
+                val = normalize_key_name(val)
+            except ValueError as e:
+                self.validation_label.setText(f"错误: {target_key} 的映射无效: {e}")
                 valid = False
                 break
             if val in pressed_keys:
@@ -198,6 +245,13 @@ class KeyMappingDialog(QDialog):
             pressed_keys.add(val)
             temp_mappings[target_key] = val
 
+        if valid:
+            try:
+                compile_key_mappings(temp_mappings) # 不同的写法可能是同一个物理键 (如 SHIFT 与 VK:16)
+            except ValueError as e:
+                self.validation_label.setText(f"错误: {e}")
+                valid = False
+
         if valid:
             self.new_mappings = temp_mappings
             self.accept()
@@ -263,6 +317,10 @@ class InstructionsDialog(QDialog):
         - <b>F6 / 建议按钮</b>: 根据当前数据提供急停建议 (数据充足时显示)。
         - <b>F7 / 使用说明按钮</b>: 显示此帮助信息。
         - <b>F8 / 按键映射按钮</b>: 设置用其他按键 (如IJKL) 模拟WASD。
+        - <b>F9 / 迷你模式按钮</b>: 切换到置顶迷你悬浮窗，双击悬浮窗或按 Esc 返回完整窗口。
+        - <b>F10</b>: 打开延迟诊断窗口，查看按键到画面各阶段的耗时，可导出 Chrome Trace。
+        - <b>F11</b>: 开始/停止性能采样，停止后在用户数据目录生成火焰图文件 (.folded)，卡顿时可发送给作者。
+        - <b>F12</b>: 打开按键分析窗口，查看各键按住时长、重叠时长与松开→按下间隔的分布。
 
         <b>其他设置:</b>
         - 记录次数: 设置图表中显示的最近记录数量。
@@ -299,16 +357,480 @@ class InstructionsDialog(QDialog):
         self.setLayout(layout)
 
 
+class DiagnosticsDialog(QDialog):
+    """
+    延迟诊断窗口：展示各阶段延迟直方图的分位数与 GUI 事件循环的卡顿记录，可导出 Chrome trace-event JSON。
+    """
+    def __init__(self, tracer, stats_provider=None, watchdog=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("延迟诊断")
+        self.setMinimumSize(640, 420)
+        self.tracer = tracer
+        self.stats_provider = stats_provider
+        self.watchdog = watchdog
+
+        layout = QVBoxLayout(self)
+        self.summary_browser = QTextBrowser(self)
+        layout.addWidget(self.summary_browser)
+        if watchdog is not None:
+            self.stack_checkbox = QCheckBox("卡顿时抓取 GUI 线程调用栈")
+            self.stack_checkbox.setChecked(watchdog.capture_stacks)
+            self.stack_checkbox.toggled.connect(self.set_capture_stacks)
+            layout.addWidget(self.stack_checkbox)
+
+        button_layout = QHBoxLayout()
+        self.export_button = QPushButton("导出 Chrome Trace")
+        self.export_button.clicked.connect(self.export_trace)
+        button_layout.addWidget(self.export_button)
+        self.reset_button = QPushButton("清空")
+        self.reset_button.clicked.connect(self.reset)
+        button_layout.addWidget(self.reset_button)
+        button_layout.addStretch()
+        self.close_button = QPushButton("关闭")
+        self.close_button.clicked.connect(self.close)
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+        # 窗口打开时每秒刷新一次，隐藏后停止
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def refresh(self):
+        rows = []
+        for name, s in self.tracer.summaries().items():
+            rows.append(
+                f"<tr><td>{name}</td><td align='right'>{s['count']}</td>"
+                f"<td align='right'>{s['mean'] / 1000:.3f}</td><td align='right'>{s['p50'] / 1000:.3f}</td>"
+                f"<td align='right'>{s['p90'] / 1000:.3f}</td><td align='right'>{s['p99'] / 1000:.3f}</td>"
+                f"<td align='right'>{s['p999'] / 1000:.3f}</td><td align='right'>{s['max'] / 1000:.3f}</td></tr>"
+            )
+        self.summary_browser.setHtml(
+            "<p><b>按键事件各阶段延迟 (ms)</b>：capture=监听线程捕获，dequeue=GUI 线程取出，"
+            "detect=检测完成，emit=记录发出，model=历史更新，paint=图表绘制完成。</p>"
+            "<table border='1' cellspacing='0' cellpadding='3'>"
+            "<tr><th>阶段</th><th>次数</th><th>平均</th><th>P50</th><th>P90</th><th>P99</th><th>P99.9</th><th>最大</th></tr>"
+            + "".join(rows) + "</table>" + self.format_stats() + self.format_stalls()
+        )
+
+    def format_stats(self):
+        if not self.stats_provider:
+            return ""
+        rows = "".join(f"<tr><td>{name}</td><td align='right'>{value}</td></tr>" for name, value in self.stats_provider().items())
+        return f"<p><b>运行统计</b></p><table border='1' cellspacing='0' cellpadding='3'>{rows}</table>"
+
+    def format_stalls(self):
+        if self.watchdog is None:
+            return ""
+        s = self.watchdog.summary()
+        header = (f"<p><b>GUI 事件循环</b>：心跳延迟 P50 {s['lag_p50_ms']:.1f}ms / P99 {s['lag_p99_ms']:.1f}ms / "
+                  f"最大 {s['lag_max_ms']:.1f}ms，卡顿 {s['stalls']} 次 (超过 {STALL_THRESHOLD_MS}ms)</p>")
+        episodes = self.watchdog.recent_episodes()[::-1]
+        if not episodes:
+            return header
+        rows = []
+        for episode in episodes[:20]:
+            stack = "<br>".join(html.escape(frame) for frame in episode['stack'][-12:]) if episode['stack'] else ""
+            rows.append(f"<tr><td>{format_clock_time(episode['start'])}</td><td align='right'>{episode['duration_ms']:.0f}</td>"
+                        f"<td align='right'>{episode['max_pending']}</td><td><small>{stack}</small></td></tr>")
+        return (header + "<table border='1' cellspacing='0' cellpadding='3'>"
+                "<tr><th>开始时间</th><th>时长 (ms)</th><th>积压按键事件</th><th>GUI 线程调用栈 (内层在后)</th></tr>"
+                + "".join(rows) + "</table>")
+
+    def set_capture_stacks(self, checked):
+        self.watchdog.capture_stacks = checked
+
+    def export_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出 Chrome Trace", "cs2stopreflex_trace.json", "JSON (*.json)")
+        if not path:
+            return
+        try:
+            self.tracer.dump_chrome_trace(path)
+            QMessageBox.information(self, "导出完成", f"已导出到:\n{path}\n\n可在 chrome://tracing 或 Perfetto 中打开。")
+        except OSError as e:
+            QMessageBox.warning(self, "导出失败", f"无法写入文件: {e}")
+
+    def reset(self):
+        self.tracer.reset()
+        if self.watchdog is not None:
+            self.watchdog.reset()
+        self.refresh()
+
+    def showEvent(self, event):
+        self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+
+class AnalyticsDialog(QDialog):
+    """
+    按键分析窗口：各键按住时长、同轴重叠时长、松开→按下间隔的分布与事件频率，
+    用于调校触发键程与 Rapid Trigger。
+    """
+    def __init__(self, analytics, key_mappings_provider, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("按键分析")
+        self.setMinimumSize(640, 520)
+        self.analytics = analytics
+        self.key_mappings_provider = key_mappings_provider
+
+        layout = QVBoxLayout(self)
+        self.summary_browser = QTextBrowser(self)
+        layout.addWidget(self.summary_browser)
+
+        button_layout = QHBoxLayout()
+        self.reset_button = QPushButton("清空")
+        self.reset_button.clicked.connect(self.reset)
+        button_layout.addWidget(self.reset_button)
+        button_layout.addStretch()
+        self.close_button = QPushButton("关闭")
+        self.close_button.clicked.connect(self.close)
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def format_table(self, title, summaries):
+        rows = []
+        for name, s in summaries.items():
+            if not s['count']:
+                continue
+            rows.append(
+                f"<tr><td>{name}</td><td align='right'>{s['count']}</td>"
+                f"<td align='right'>{s['mean'] / 1000:.2f}</td><td align='right'>{s['min'] / 1000:.2f}</td>"
+                f"<td align='right'>{s['p50'] / 1000:.2f}</td><td align='right'>{s['p90'] / 1000:.2f}</td>"
+                f"<td align='right'>{s['p99'] / 1000:.2f}</td><td align='right'>{s['max'] / 1000:.2f}</td></tr>"
+            )
+        if not rows:
+            return f"<p><b>{title}</b>：暂无数据</p>"
+        return (
+            f"<p><b>{title}</b></p><table border='1' cellspacing='0' cellpadding='3'>"
+            "<tr><th></th><th>次数</th><th>平均</th><th>最小</th><th>P50</th><th>P90</th><th>P99</th><th>最大</th></tr>"
+            + "".join(rows) + "</table>"
+        )
+
+    def refresh(self):
+        summaries = self.analytics.summaries()
+        mappings = self.key_mappings_provider()
+        label = lambda key: key if mappings.get(key, key) == key else f"{key} ({mappings[key]})"
+        dwell = {label(key): s for key, s in summaries['dwell'].items()}
+        gap = {name: s for name, s in summaries['gap'].items()}
+        rate = summaries['rate']
+        per_key = "，".join(f"{label(key)}: {count}" for key, count in rate['per_key'].items())
+        self.summary_browser.setHtml(
+            "<p>时间单位为 ms。按住时长过短可能是触发键程过浅，切换间隔越接近 0 急停越干净。</p>"
+            + self.format_table("按住时长 (按下 → 松开)", dwell)
+            + self.format_table("同轴重叠时长 (两键同时按住)", summaries['overlap'])
+            + self.format_table("切换间隔 (松开 → 按下，同一轴)", gap)
+            + f"<p><b>事件频率</b>：当前 {rate['current']:.0f} 次/秒，峰值 {rate['peak']:.0f} 次/秒，"
+            f"共 {rate['total']} 次 ({per_key})</p>"
+        )
+
+    def reset(self):
+        self.analytics.reset()
+        self.refresh()
+
+    def showEvent(self, event):
+        self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+
+class DistributionDialog(QDialog):
+    """
+    时间差分布窗口：每个轴一张直方图和一张“会话时间 × 时间差”热力图。
+    数据来自定长分箱聚合，重绘代价只与分箱数有关；聚合无变化时不重绘。
+    """
+    def __init__(self, aggregate, threshold_provider, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("时间差分布")
+        self.setMinimumSize(900, 620)
+        self.aggregate = aggregate
+        self.threshold_provider = threshold_provider
+        self.drawn_state = None
+
+        layout = QVBoxLayout(self)
+        self.figure = Figure(figsize=(9, 6))
+        self.canvas = FigureCanvas(self.figure)
+        layout.addWidget(self.canvas)
+        self.charts = {}
+        self.colorbars = {}
+        for axis, (ax_hist, ax_heat) in zip(self.aggregate.axes, self.figure.subplots(len(self.aggregate.axes), 2, squeeze=False)):
+            self.charts[axis] = (
+                ChartTemplate(ax_hist, LIGHT_THEME, xlabel='时间差 (ms)', ylabel='次数', title_size=11, label_size=9),
+                ChartTemplate(ax_heat, LIGHT_THEME, title=f'{axis} 时间差随练习时间的变化', xlabel='练习时间 (分钟)',
+                              ylabel='时间差 (ms)', title_size=11, label_size=9, grid_axis=None),
+            )
+            self.colorbars[axis] = self.figure.colorbar(ScalarMappable(cmap='magma'), ax=ax_heat, label='次数')
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.close_button = QPushButton("关闭")
+        self.close_button.clicked.connect(self.close)
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def refresh(self):
+        threshold = self.threshold_provider()
+        state = (self.aggregate.version, threshold)
+        if state == self.drawn_state:
+            return
+        self.drawn_state = state
+        for axis, (hist_chart, heat_chart) in self.charts.items():
+            ax_hist = hist_chart.begin()
+            edges, counts = self.aggregate.histogram(axis, threshold)
+            ax_hist.stairs(counts, edges, fill=True, color='#1b9e77', alpha=0.8)
+            ax_hist.axvline(0, color='black', linewidth=0.8)
+            hist_chart.set_title(f'{axis} 时间差分布 (共 {int(counts.sum())} 次)')
+
+            ax_heat = heat_chart.begin()
+            matrix, minutes, diff_edges = self.aggregate.heatmap(axis, threshold)
+            self.colorbars[axis].ax.set_visible(matrix.any())
+            if matrix.any():
+                image = ax_heat.imshow(matrix.T, origin='lower', aspect='auto', cmap='magma', interpolation='nearest',
+                                       extent=(0, minutes, diff_edges[0], diff_edges[-1]))
+                self.colorbars[axis].update_normal(image)
+            else:
+                heat_chart.show_empty(f'无 {axis} 数据')
+        self.figure.tight_layout()
+        self.canvas.draw()
+
+    def showEvent(self, event):
+        self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+
+class ReplayDialog(QDialog):
+    """
+    回放控制窗口 (非模态)：播放/暂停、倍速 (1× / 10× / 最快) 与拖动定位。
+    事件的推进与界面刷新都由本窗口按帧率上限的计时器驱动，拖动进度条时每帧最多定位一次。
+    """
+    SPEEDS = (("1×", 1), ("10×", 10), ("最快", SPEED_MAX))
+
+    def __init__(self, replayer, title, on_tick, on_seek, on_close, fps_cap=RENDER_FPS_CAP, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.setMinimumWidth(480)
+        self.replayer = replayer
+        self.on_tick = on_tick
+        self.on_seek = on_seek
+        self.on_close = on_close
+        self.pending_seek = None
+
+        layout = QVBoxLayout(self)
+        self.slider = QSlider(Qt.Horizontal, self)
+        self.slider.setRange(0, max(1, replayer.duration_ns // 1_000_000))
+        self.slider.sliderMoved.connect(self.queue_seek)
+        self.slider.actionTriggered.connect(lambda action: self.queue_seek(self.slider.sliderPosition()))
+        layout.addWidget(self.slider)
+
+        controls = QHBoxLayout()
+        self.play_button = QPushButton("播放")
+        self.play_button.clicked.connect(self.toggle_play)
+        controls.addWidget(self.play_button)
+        self.speed_group = QButtonGroup(self)
+        for index, (label, speed) in enumerate(self.SPEEDS):
+            button = QRadioButton(label)
+            button.setChecked(speed == replayer.speed)
+            self.speed_group.addButton(button, index)
+            controls.addWidget(button)
+        self.speed_group.buttonClicked[int].connect(lambda index: self.replayer.set_speed(self.SPEEDS[index][1]))
+        controls.addStretch()
+        self.position_label = QLabel(self)
+        self.position_label.setStyleSheet("QLabel { color: #000000; }")
+        controls.addWidget(self.position_label)
+        layout.addLayout(controls)
+
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setInterval(max(1, 1000 // fps_cap))
+        self.frame_timer.timeout.connect(self.tick)
+        self.frame_timer.start()
+        self.update_position()
+
+    @staticmethod
+    def format_position(ns):
+        seconds = ns / 1e9
+        return f"{int(seconds // 60):02d}:{seconds % 60:04.1f}"
+
+    def queue_seek(self, position_ms):
+        self.pending_seek = position_ms * 1_000_000
+
+    def toggle_play(self):
+        if self.replayer.playing:
+            self.replayer.pause()
+        else:
+            if self.replayer.at_end():
+                self.on_seek(0)
+            self.replayer.play()
+        self.update_position()
+
+    def tick(self):
+        if self.pending_seek is not None:
+            position, self.pending_seek = self.pending_seek, None
+            self.on_seek(position)
+        self.on_tick()
+        self.update_position()
+
+    def update_position(self):
+        self.play_button.setText("暂停" if self.replayer.playing else "播放")
+        if not self.slider.isSliderDown():
+            self.slider.setValue(self.replayer.position_ns // 1_000_000)
+        self.position_label.setText(f"{self.format_position(self.replayer.position_ns)} / "
+                                    f"{self.format_position(self.replayer.duration_ns)}")
+
+    def closeEvent(self, event):
+        self.frame_timer.stop()
+        self.on_close()
+        super().closeEvent(event)
+
+
+class MiniOverlay(QWidget):
+    """
+    置顶的无边框迷你悬浮窗，只显示最新反馈和最近 N 次时间差的迷你折线。
+    直接用 QPainter 绘制，重绘按 RENDER_FPS_CAP 合并，双击或 Esc 返回完整窗口。
+    """
+    restore_requested = pyqtSignal()
+    quit_requested = pyqtSignal()
+
+    def __init__(self, history_size=30, fps_cap=RENDER_FPS_CAP, parent=None):
+        super().__init__(parent, Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
+        self.setWindowTitle("CS2急停评估工具 - 迷你模式")
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.resize(360, 110)
+
+        self.feedback_text = "请模拟自己PEEK时进行AD和WS急停"
+        self.feedback_color = QColor("#2E2E2E")
+        self.diffs = deque(maxlen=history_size)
+        self.diff_range = 120
+        self.drag_offset = None
+
+        self.text_font = QFont("Microsoft YaHei", 11, QFont.Bold)
+        self.zero_pen = QPen(QColor(255, 255, 255, 120), 1, Qt.DashLine)
+        self.line_pen = QPen(QColor("#FFFFFF"), 1.5)
+
+        # 单次定时器合并重绘请求，保证刷新率不超过 fps_cap
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(max(1, 1000 // fps_cap))
+        self.render_timer.timeout.connect(self.update)
+
+    def schedule_repaint(self):
+        if self.isVisible() and not self.render_timer.isActive():
+            self.render_timer.start()
+
+    def set_feedback(self, text, color):
+        self.feedback_text = text
+        self.feedback_color = QColor(color)
+        self.schedule_repaint()
+
+    def add_diff(self, time_diff_ms, color):
+        self.diffs.append((time_diff_ms, QColor(color)))
+        self.schedule_repaint()
+
+    def set_diff_range(self, diff_range):
+        self.diff_range = max(diff_range, 1)
+        self.schedule_repaint()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        rect = QRectF(self.rect()).adjusted(1, 1, -1, -1)
+
+        background = QColor(self.feedback_color)
+        background.setAlpha(220)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(background)
+        painter.drawRoundedRect(rect, 10, 10)
+
+        light = (background.red() * 299 + background.green() * 587 + background.blue() * 114) / 1000 > 128
+        text_color = QColor("#000000" if light else "#FFFFFF")
+        text_rect = QRectF(rect.left() + 10, rect.top() + 6, rect.width() - 20, rect.height() * 0.5)
+        painter.setFont(self.text_font)
+        painter.setPen(text_color)
+        painter.drawText(text_rect, Qt.AlignCenter | Qt.TextWordWrap, self.feedback_text)
+
+        # 迷你折线：纵轴为 ±diff_range ms，中间虚线为 0
+        spark = QRectF(rect.left() + 10, text_rect.bottom() + 4, rect.width() - 20, rect.bottom() - text_rect.bottom() - 12)
+        mid_y = spark.center().y()
+        painter.setPen(self.zero_pen)
+        painter.drawLine(QPointF(spark.left(), mid_y), QPointF(spark.right(), mid_y))
+        if self.diffs:
+            step = spark.width() / max(self.diffs.maxlen - 1, 1)
+            half_h = spark.height() / 2
+            points = QPolygonF()
+            for i, (diff, _) in enumerate(self.diffs):
+                clipped = max(-self.diff_range, min(self.diff_range, diff))
+                points.append(QPointF(spark.left() + i * step, mid_y - clipped / self.diff_range * half_h))
+            self.line_pen.setColor(text_color)
+            painter.setPen(self.line_pen)
+            painter.drawPolyline(points)
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(self.diffs[-1][1])
+            painter.drawEllipse(points[points.size() - 1], 3.5, 3.5)
+        painter.end()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.drag_offset = event.globalPos() - self.frameGeometry().topLeft()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self.drag_offset is not None and event.buttons() & Qt.LeftButton:
+            self.move(event.globalPos() - self.drag_offset)
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        self.drag_offset = None
+        super().mouseReleaseEvent(event)
+
+    def mouseDoubleClickEvent(self, event):
+        self.restore_requested.emit()
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Escape, Qt.Key_F9):
+            self.restore_requested.emit()
+            return
+        super().keyPressEvent(event)
+
+    def contextMenuEvent(self, event):
+        menu = QMenu(self)
+        restore_action = menu.addAction("打开完整窗口")
+        quit_action = menu.addAction("退出")
+        chosen = menu.exec_(event.globalPos())
+        if chosen == restore_action:
+            self.restore_requested.emit()
+        elif chosen == quit_action:
+            self.quit_requested.emit()
+
+
 class MainWindow(QMainWindow):
     feedback_signal = pyqtSignal(str, QColor)
-    history_signal = pyqtSignal(str, float, float, dict, QColor)
+    history_signal = pyqtSignal(str, 'qint64', 'qint64', dict, QColor) # 轴, 事件时间 (ns), 时间差 (us)
     key_state_signal = pyqtSignal(str, bool) 
     start_timer_signal = pyqtSignal(str, int)
     stop_timer_signal = pyqtSignal(str)
-    key_press_signal = pyqtSignal(str, float) 
-    key_release_signal = pyqtSignal(str, float) 
+    input_ready_signal = pyqtSignal()
     log_signal = pyqtSignal(str)
     update_key_labels_signal = pyqtSignal()
+    history_loaded_signal = pyqtSignal(str, object) # 档案 id, {轴: [(时间, 时间差)]}
+    rollups_loaded_signal = pyqtSignal(str, object) # 档案 id, RollupStore
+    recommendations_ready_signal = pyqtSignal(int, str) # 计算序号, 建议文本
 
 
     def __init__(self):
@@ -354,18 +876,39 @@ class MainWindow(QMainWindow):
         """)
         left_layout.addWidget(self.feedback_label)
 
-        self.key_mappings = {'W': 'W', 'A': 'A', 'S': 'S', 'D': 'D'}
-        self.reverse_key_mappings = {v: k for k, v in self.key_mappings.items()}
+        # 主程序与经典 AD 视图共用的检测器和记录存储
+        self.diff_bins = DiffBinAggregate()
+        self.record_store = RecordStore(maxlen=200, aggregate=self.diff_bins, on_append=self.persist_candidate) # 视图大小随 record_count 调整，见 chart_view_size()
+        self.profiles = ProfileManager(user_data_path('profiles'))
+        self.profile = None
+        self.profile_rollups = None
+        self.history_writer = None
+        self.event_recorder = None
+        self.station_publisher = None
+        self.replay = None # 回放中为 SessionReplayer
+        self.replay_dialog = None
+        self.replay_records = [] # 回放时本帧新产生的 (记录, 颜色)
+        self.detector = QuickStopDetector(
+            store=self.record_store,
+            on_record=self.on_quick_stop_record,
+            on_key_state=self.key_state_signal.emit,
+            on_log=self.log_message,
+            on_wait_start=self.start_timer_signal.emit,
+            on_wait_stop=self.stop_timer_signal.emit,
+        )
+        # 监听线程使用的分发表，只在 apply_key_mappings() 中整体替换
+        self.key_dispatch = compile_key_mappings(self.detector.key_mappings)
+        key_mappings = self.detector.key_mappings
 
 
         key_status_layout = QGridLayout()
-        self.w_key_label = self.create_key_label(f"{self.key_mappings['W']}键 (W): 未按下", font_key)
+        self.w_key_label = self.create_key_label(f"{key_mappings['W']}键 (W): 未按下", font_key)
         key_status_layout.addWidget(self.w_key_label, 0, 1)
-        self.a_key_label = self.create_key_label(f"{self.key_mappings['A']}键 (A): 未按下", font_key)
+        self.a_key_label = self.create_key_label(f"{key_mappings['A']}键 (A): 未按下", font_key)
         key_status_layout.addWidget(self.a_key_label, 1, 0)
-        self.s_key_label = self.create_key_label(f"{self.key_mappings['S']}键 (S): 未按下", font_key)
+        self.s_key_label = self.create_key_label(f"{key_mappings['S']}键 (S): 未按下", font_key)
         key_status_layout.addWidget(self.s_key_label, 1, 1)
-        self.d_key_label = self.create_key_label(f"{self.key_mappings['D']}键 (D): 未按下", font_key)
+        self.d_key_label = self.create_key_label(f"{key_mappings['D']}键 (D): 未按下", font_key)
         key_status_layout.addWidget(self.d_key_label, 1, 2)
         left_layout.addLayout(key_status_layout)
 
@@ -382,6 +925,8 @@ class MainWindow(QMainWindow):
         left_layout.addWidget(self.history_list, stretch=2)
 
         self.output_list = QListWidget()
+        self.pending_logs = [] # (时间, 日志)，由 flush_log 批量显示
+        self.log_flush_pending = False
         self.output_list.setFont(font_small)
         self.output_list.setStyleSheet("""
             QListWidget {
@@ -411,7 +956,19 @@ class MainWindow(QMainWindow):
         self.key_mapping_button = QPushButton("按键映射 (F8)")
         self.setup_styled_button(self.key_mapping_button, "设置自定义按键映射 (F8)", self.show_key_mapping_dialog, fixed_width=140)
         controls_button_layout.addWidget(self.key_mapping_button)
+
+        controls_button_layout.addStretch(1)
+
+        self.mini_mode_button = QPushButton("迷你模式 (F9)")
+        self.setup_styled_button(self.mini_mode_button, "切换到置顶迷你悬浮窗 (F9)", self.toggle_mini_overlay, fixed_width=140)
+        controls_button_layout.addWidget(self.mini_mode_button)
         
+        controls_button_layout.addStretch(1)
+
+        self.profile_button = QPushButton("玩家")
+        self.setup_styled_button(self.profile_button, "切换或新建玩家档案 (按键映射、阈值与历史记录分开保存)", self.show_profile_dialog, fixed_width=140)
+        controls_button_layout.addWidget(self.profile_button)
+
         controls_button_layout.addStretch(1) # ADDED: Stretch after the last button
         
         left_layout.addLayout(controls_button_layout)
@@ -430,6 +987,18 @@ class MainWindow(QMainWindow):
         
         footer_button_layout.addSpacing(10) 
 
+        self.distribution_button = QPushButton("分布图")
+        self.setup_styled_button(self.distribution_button, "查看时间差直方图与练习时间热力图", self.show_distribution_dialog, fixed_width=100)
+        footer_button_layout.addWidget(self.distribution_button)
+
+        footer_button_layout.addSpacing(10)
+
+        self.replay_button = QPushButton("回放")
+        self.setup_styled_button(self.replay_button, "回放录制的按键事件 (可倍速播放与拖动)", self.show_replay_dialog, fixed_width=100)
+        footer_button_layout.addWidget(self.replay_button)
+
+        footer_button_layout.addSpacing(10)
+
         self.recommendations_button = QPushButton("建议 (F6)")
         self.setup_styled_button(self.recommendations_button, "查看急停建议 (F6)", self.show_recommendations, fixed_width=100)
         self.recommendations_button.hide() 
@@ -465,6 +1034,10 @@ class MainWindow(QMainWindow):
         ws_layout.addWidget(self.ws_canvas_box)
         ws_group.setLayout(ws_layout)
         right_layout.addWidget(ws_group)
+        self.ad_line_chart = ChartTemplate(self.ad_figure_line.add_subplot(111), xlabel='操作次数', ylabel='时间差 (ms)')
+        self.ad_box_chart = ChartTemplate(self.ad_figure_box.add_subplot(111), xlabel='时间差 (ms)', grid_axis='x', show_yticks=False)
+        self.ws_line_chart = ChartTemplate(self.ws_figure_line.add_subplot(111), xlabel='操作次数', ylabel='时间差 (ms)')
+        self.ws_box_chart = ChartTemplate(self.ws_figure_box.add_subplot(111), xlabel='时间差 (ms)', grid_axis='x', show_yticks=False)
 
         main_layout.addLayout(left_layout, 1)
         main_layout.addLayout(right_layout, 2)
@@ -485,32 +1058,39 @@ class MainWindow(QMainWindow):
             QListWidget { background-color: rgba(255, 255, 255, 180); }
         """)
 
-        self.key_state = {
-            'A': {'pressed': False, 'time': None}, 'D': {'pressed': False, 'time': None},
-            'W': {'pressed': False, 'time': None}, 'S': {'pressed': False, 'time': None}
-        }
-        self.waiting_for_opposite_key = {}
-        self.ad_data = deque(maxlen=200)
-        self.ws_data = deque(maxlen=200)
-        self.last_record_time = 0
-        self.min_time_between_records = 0.05
-        self.in_quick_stop_cooldown = False
+        self.tracer = LatencyTracer()
+
+        # 监听线程只把事件写入环形缓冲区，GUI 线程的检测器按自己的节奏读取
+        self.input_ring = SpscRingBuffer(4096)
+        self.detector_reader = self.input_ring.reader('detector')
+        self.input_wake_pending = False
+        self.drain_batch_size = 256
+
+        # GUI 线程卡顿 (大量绘图、模态对话框等) 时输入会积压：心跳计时器测量事件循环延迟，看门狗线程记录卡顿
+        self.watchdog = EventLoopWatchdog(HEARTBEAT_INTERVAL_MS, STALL_THRESHOLD_MS, pending_provider=self.detector_reader.pending)
+        self.heartbeat_timer = QTimer(self)
+        self.heartbeat_timer.setTimerType(Qt.PreciseTimer)
+        self.heartbeat_timer.setInterval(HEARTBEAT_INTERVAL_MS)
+        self.heartbeat_timer.timeout.connect(self.on_heartbeat)
+        self.slow_feedback_count = 0
+        self.statusBar().setStyleSheet("QStatusBar { background-color: #2E2E2E; color: #FFB000; }")
+
 
         self.feedback_signal.connect(self.update_feedback)
         self.history_signal.connect(self.update_history)
         self.key_state_signal.connect(self.update_key_state_display)
         self.start_timer_signal.connect(self.start_timer)
         self.stop_timer_signal.connect(self.stop_timer)
-        self.key_press_signal.connect(self.on_key_press_main_thread)
-        self.key_release_signal.connect(self.on_key_release_main_thread)
+        self.input_ready_signal.connect(self.drain_input_ring)
         self.log_signal.connect(self.append_log)
         self.update_key_labels_signal.connect(self.update_all_key_labels_text)
+        self.history_loaded_signal.connect(self.on_profile_history_loaded)
+        self.rollups_loaded_signal.connect(self.on_profile_rollups_loaded)
+        self.recommendations_ready_signal.connect(self.on_recommendations_ready)
 
 
         self.record_count = 20
-        self.filter_threshold = 120
         self.box_plot_multiplier = 2
-        self.timer_buffer = 20
 
         self.timers = {'AD': QTimer(self), 'WS': QTimer(self)}
         self.timers['AD'].setSingleShot(True)
@@ -526,6 +1106,40 @@ class MainWindow(QMainWindow):
         self.f7_shortcut.activated.connect(self.show_instructions_dialog)
         self.f8_shortcut = QShortcut(QKeySequence("F8"), self)
         self.f8_shortcut.activated.connect(self.show_key_mapping_dialog)
+        self.f9_shortcut = QShortcut(QKeySequence("F9"), self)
+        self.f9_shortcut.activated.connect(self.toggle_mini_overlay)
+        self.f10_shortcut = QShortcut(QKeySequence("F10"), self)
+        self.f10_shortcut.activated.connect(self.show_diagnostics_dialog)
+        self.diagnostics_dialog = None
+        self.f11_shortcut = QShortcut(QKeySequence("F11"), self)
+        self.f11_shortcut.activated.connect(self.toggle_profiler)
+        self.profiler = SamplingProfiler()
+        self.f12_shortcut = QShortcut(QKeySequence("F12"), self)
+        self.f12_shortcut.activated.connect(self.show_analytics_dialog)
+        self.key_analytics = KeyTimingAnalytics()
+        self.trend_analyzer = SessionTrendAnalyzer()
+        self.analytics_dialog = None
+        self.distribution_dialog = None
+
+        # 急停详情与建议是可停靠的非模态面板，打开时练习照常进行；建议在后台线程按快照计算
+        self.detail_panel = TextPanel("急停详情", 'detail_panel', self)
+        self.recommendation_panel = TextPanel("急停建议", 'recommendation_panel', self)
+        for panel in (self.detail_panel, self.recommendation_panel):
+            self.addDockWidget(Qt.RightDockWidgetArea, panel)
+            panel.hide()
+        self.recommendation_panel.visibilityChanged.connect(self.on_recommendation_panel_visibility)
+        self.recommendation_timer = QTimer(self)
+        self.recommendation_timer.setSingleShot(True)
+        self.recommendation_timer.setInterval(RECOMMENDATION_REFRESH_MS)
+        self.recommendation_timer.timeout.connect(self.start_recommendation_job)
+        self.recommendation_generation = 0
+        self.recommendation_job_running = False
+        self.recommendation_dirty = False
+        self.long_term_cache = {}
+
+        self.mini_overlay = None # 迷你悬浮窗按需创建
+        self.last_feedback_color = QColor("#2E2E2E")
+        self.plots_dirty = False
 
 
         try:
@@ -538,7 +1152,17 @@ class MainWindow(QMainWindow):
             self.feedback_label.setText("键盘监听启动失败！")
             self.listener = None
 
-        self.update_plot()
+        self.feed_server = QuickStopFeedServer(FEED_HOST, FEED_PORT)
+        try:
+            self.feed_server.start()
+            self.log_message(f"急停数据推送服务已启动: {self.feed_server.url}")
+        except OSError as e:
+            self.log_message(f"急停数据推送服务启动失败: {e}")
+            self.feed_server = None
+
+        self.switch_profile(self.profiles.active_profile())
+        self.watchdog.start()
+        self.heartbeat_timer.start()
 
     def setup_styled_button(self, button, tooltip, on_click_action, fixed_width=100, fixed_height=40, font_size=12):
         button.setFont(QFont("Microsoft YaHei", font_size))
@@ -571,205 +1195,179 @@ class MainWindow(QMainWindow):
 
     @pyqtSlot()
     def update_all_key_labels_text(self):
-        self.w_key_label.setText(f"{self.key_mappings['W']}键 (W): {'按下' if self.key_state['W']['pressed'] else '未按下'}")
-        self.a_key_label.setText(f"{self.key_mappings['A']}键 (A): {'按下' if self.key_state['A']['pressed'] else '未按下'}")
-        self.s_key_label.setText(f"{self.key_mappings['S']}键 (S): {'按下' if self.key_state['S']['pressed'] else '未按下'}")
-        self.d_key_label.setText(f"{self.key_mappings['D']}键 (D): {'按下' if self.key_state['D']['pressed'] else '未按下'}")
+        self.w_key_label.setText(f"{self.detector.key_mappings['W']}键 (W): {'按下' if self.detector.key_state['W']['pressed'] else '未按下'}")
+        self.a_key_label.setText(f"{self.detector.key_mappings['A']}键 (A): {'按下' if self.detector.key_state['A']['pressed'] else '未按下'}")
+        self.s_key_label.setText(f"{self.detector.key_mappings['S']}键 (S): {'按下' if self.detector.key_state['S']['pressed'] else '未按下'}")
+        self.d_key_label.setText(f"{self.detector.key_mappings['D']}键 (D): {'按下' if self.detector.key_state['D']['pressed'] else '未按下'}")
 
 
     @pyqtSlot(str)
     def append_log(self, message):
-        timestamp = time.strftime("%H:%M:%S", time.localtime()) + f".{int((time.time() % 1) * 1000):03d}"
-        self.output_list.addItem(f"{timestamp} - {message}")
-        self.output_list.scrollToBottom()
-        if self.output_list.count() > 150:
+        """ 日志先放入队列，回到事件循环后由 flush_log 一次性加入列表 (每批按键事件只滚动一次) """
+        self.pending_logs.append((time.time(), message))
+        if not self.log_flush_pending:
+            self.log_flush_pending = True
+            QTimer.singleShot(0, self.flush_log)
+
+    def flush_log(self):
+        self.log_flush_pending = False
+        entries, self.pending_logs = self.pending_logs, []
+        for logged_at, message in entries[-LOG_LIST_SIZE:]:
+            timestamp = time.strftime("%H:%M:%S", time.localtime(logged_at)) + f".{int((logged_at % 1) * 1000):03d}"
+            self.output_list.addItem(f"{timestamp} - {message}")
+        for _ in range(self.output_list.count() - LOG_LIST_SIZE):
             self.output_list.takeItem(0)
+        self.output_list.scrollToBottom()
 
     def log_message(self, msg):
         print(msg)
         self.log_signal.emit(msg)
 
     def on_press(self, key):
-        if not hasattr(self, 'listener') or not self.listener or not self.listener.is_alive():
-            return
         try:
-            original_key_char = key.char.upper()
-            self.key_press_signal.emit(original_key_char, time.perf_counter())
-        except AttributeError:
-            pass 
+            # 未映射的按键 (打字等) 在查表后立即返回，不取时间戳、不写缓冲区也不发信号
+            key_name = self.key_dispatch.lookup(key)
+            if key_name is None or not self.listener or not self.listener.is_alive():
+                return
+            self.enqueue_key_event(EVENT_PRESS, key_name, time.perf_counter_ns())
         except Exception as e:
             print(f"Error in on_press: {e}")
 
     def on_release(self, key):
-        if not hasattr(self, 'listener') or not self.listener or not self.listener.is_alive():
-            return
         try:
-            original_key_char = key.char.upper()
-            self.key_release_signal.emit(original_key_char, time.perf_counter())
-        except AttributeError:
-            pass 
+            key_name = self.key_dispatch.lookup(key)
+            if key_name is None or not self.listener or not self.listener.is_alive():
+                return
+            self.enqueue_key_event(EVENT_RELEASE, key_name, time.perf_counter_ns())
         except Exception as e:
             print(f"Error in on_release: {e}")
 
-    @pyqtSlot(str, float)
+    def enqueue_key_event(self, kind, original_key_char, timestamp):
+        """
+        由监听线程调用：写入环形缓冲区，常数时间且从不阻塞。
+        只有在 GUI 线程尚未被唤醒时才发出一次唤醒信号，连续的按键事件合并为一次排队调用。
+        """
+        self.input_ring.push(kind, original_key_char, timestamp)
+        if not self.input_wake_pending:
+            self.input_wake_pending = True
+            self.input_ready_signal.emit()
+
+    @pyqtSlot()
+    def drain_input_ring(self):
+        # 先清除唤醒标记再读取，读取期间写入的新事件会触发下一次唤醒
+        self.input_wake_pending = False
+        dropped_before = self.detector_reader.dropped
+        events = self.detector_reader.drain(self.drain_batch_size)
+        if self.replay is not None:
+            events = () # 回放期间忽略实时输入 (录制器仍会照常录制)
+        for kind, original_key_char, timestamp in events:
+            if kind == EVENT_PRESS:
+                self.on_key_press_main_thread(original_key_char, timestamp)
+            else:
+                self.on_key_release_main_thread(original_key_char, timestamp)
+        if self.detector_reader.dropped != dropped_before:
+            self.log_message(f"输入缓冲区溢出，丢弃了 {self.detector_reader.dropped - dropped_before} 个按键事件。")
+        if self.detector_reader.pending() and not self.input_wake_pending:
+            # 单批次有上限，剩余事件放到下一轮，让绘制等事件有机会执行
+            self.input_wake_pending = True
+            QTimer.singleShot(0, self.drain_input_ring)
+
+    def get_input_stats(self):
+        """ 输入缓冲区统计与检测器按原因的抑制计数，供诊断窗口显示 """
+        return {
+            '输入缓冲区容量': self.input_ring.capacity,
+            '已写入事件': self.input_ring.write_seq,
+            '待处理事件': self.detector_reader.pending(),
+            '检测器丢弃事件': self.detector_reader.dropped,
+            '反馈延迟超出预算': self.slow_feedback_count,
+            **{f"{axis} {SUPPRESSION_REASONS[reason]}": count
+               for axis, counts in self.detector.suppression_stats().items() for reason, count in counts.items()},
+        }
+
     def on_key_press_main_thread(self, original_key_char, press_time):
-        key_char = self.reverse_key_mappings.get(original_key_char)
-        if not key_char: 
+        if not self.detector.is_mapped(original_key_char):
             return
+        self.tracer.begin(press_time, original_key_char)
+        self.key_analytics.press(self.detector.reverse_key_mappings[original_key_char], press_time)
+        self.detector.press(original_key_char, press_time)
+        self.tracer.finish(press_time)
 
-        if not self.key_state[key_char]['pressed']:
-            self.key_state[key_char]['pressed'] = True
-            self.key_state[key_char]['time'] = press_time
-            self.key_state_signal.emit(key_char, True) 
-            self.log_message(f"按下: {original_key_char} (映射为 {key_char}) at {press_time:.4f}")
-
-            key_type = self.get_key_type(key_char)
-
-            if key_type in self.waiting_for_opposite_key and key_char == self.waiting_for_opposite_key[key_type]['key']:
-                current_time = time.perf_counter()
-                if current_time - self.last_record_time < self.min_time_between_records:
-                    self.log_message(f"操作过于频繁，忽略此次 {key_type} 急停 (松开后按)。")
-                    del self.waiting_for_opposite_key[key_type]
-                    self.stop_timer_signal.emit(key_type)
-                    return
-
-                release_time = self.waiting_for_opposite_key[key_type]['release_time']
-                key_released_before_orig = self.waiting_for_opposite_key[key_type]['key_released_orig'] 
-                key_released_before_mapped = self.waiting_for_opposite_key[key_type]['key_released_mapped'] 
-
-                original_events = self.waiting_for_opposite_key[key_type]['events']
-
-                time_diff = press_time - release_time
-                time_diff_ms = round(time_diff * 1000, 1)
-
-                self.log_message(f"检测到 {key_type} 急停 (松开后按): {key_released_before_orig} ({key_released_before_mapped}) -> {original_key_char} ({key_char}), 时间差: {time_diff_ms:.1f}ms")
-
-                if abs(time_diff_ms) > self.filter_threshold:
-                    self.log_message(f"时间差 {time_diff_ms:.1f}ms 超过阈值 {self.filter_threshold}ms，忽略记录。")
-                else:
-                    color = self.get_color(time_diff_ms)
-                    timing = '完美急停' if abs(time_diff_ms) <= 2 else ('按早了' if time_diff_ms < 0 else '按晚了')
-                    
-                    feedback = f"[{key_type}] {timing}：松开{key_released_before_orig}后 {time_diff_ms:.1f}ms 按下了{original_key_char}"
-
-                    detail_info = {
-                        'events': original_events + [
-                            {'key': original_key_char, 'event': '按下', 'time': press_time, 'time_str': self.format_time(press_time)}
-                        ]
-                    }
-                    self.feedback_signal.emit(feedback, color)
-                    self.history_signal.emit(key_type, press_time, time_diff, detail_info, color)
-                    if key_type == 'AD': self.ad_data.append({'time': press_time, 'time_diff': time_diff})
-                    else: self.ws_data.append({'time': press_time, 'time_diff': time_diff})
-                    self.log_message(f"记录 {key_type} 急停 (松开后按): 时间差 {time_diff_ms:.1f}ms")
-                    self.last_record_time = current_time
-                    self.in_quick_stop_cooldown = True
-
-                if key_type in self.waiting_for_opposite_key:
-                    del self.waiting_for_opposite_key[key_type]
-                    self.stop_timer_signal.emit(key_type)
-
-            other_key_type = 'WS' if key_type == 'AD' else 'AD'
-            if other_key_type in self.waiting_for_opposite_key:
-                key_released_in_wait_orig = self.waiting_for_opposite_key[other_key_type]['key_released_orig']
-                expected_key_in_wait_orig = self.key_mappings[self.waiting_for_opposite_key[other_key_type]['key']]
-
-                self.log_message(f"按下 {original_key_char} ({key_char}) 时取消了等待 {expected_key_in_wait_orig} (原松开 {key_released_in_wait_orig}) 的 {other_key_type} 状态。")
-                del self.waiting_for_opposite_key[other_key_type]
-                self.stop_timer_signal.emit(other_key_type)
-
-    @pyqtSlot(str, float)
     def on_key_release_main_thread(self, original_key_char, release_time):
-        key_char = self.reverse_key_mappings.get(original_key_char)
-        if not key_char: 
+        if not self.detector.is_mapped(original_key_char):
             return
+        self.tracer.begin(release_time, original_key_char)
+        self.key_analytics.release(self.detector.reverse_key_mappings[original_key_char], release_time)
+        self.detector.release(original_key_char, release_time)
+        self.tracer.finish(release_time)
+
+    def on_quick_stop_record(self, record):
+        """ 检测器产生急停记录时调用 (记录已写入 record_store) """
+        event_time = record['event_time']
+        self.tracer.stamp(event_time, 'detect')
+        change = self.trend_analyzer.add(record['key_type'], record['time_diff_us'], event_time)
+        if change is not None:
+            self.log_message(f"[{record['key_type']}] 检测到趋势变化: {SessionTrendAnalyzer.describe(change)}")
+        color = self.get_color(record['time_diff_us'])
+        if self.replay is not None:
+            self.replay_records.append((record, color)) # 回放时只缓存，每帧在 render_replay_frame 中一次性显示
+            return
+        detail_info = {'events': record['events']}
+        self.tracer.stamp(event_time, 'emit')
+        self.feedback_signal.emit(format_feedback(record), color)
+        self.history_signal.emit(record['key_type'], event_time, record['time_diff_us'], detail_info, color)
+        self.check_feedback_latency(event_time)
+
+    def check_feedback_latency(self, event_time):
+        """ 按键到反馈显示的延迟超出预算时在状态栏提示 (通常是 GUI 线程刚卡顿过) """
+        latency_ms = (time.perf_counter_ns() - event_time) / 1e6
+        if latency_ms <= FEEDBACK_BUDGET_MS:
+            return
+        self.slow_feedback_count += 1
+        self.statusBar().showMessage(
+            f"反馈延迟 {latency_ms:.0f}ms，超过 {FEEDBACK_BUDGET_MS}ms 预算 (累计 {self.slow_feedback_count} 次)，详见 F10 延迟诊断。", 5000)
 
-        if self.key_state[key_char]['pressed']:
-            self.key_state[key_char]['pressed'] = False
-            self.key_state_signal.emit(key_char, False) 
-            self.log_message(f"松开: {original_key_char} (映射为 {key_char}) at {release_time:.4f}")
-
-            self.process_key_event(original_key_char, key_char, release_time) 
-
-            all_keys_released = not any(state['pressed'] for state in self.key_state.values())
-            if all_keys_released and self.in_quick_stop_cooldown:
-                self.in_quick_stop_cooldown = False
-                self.log_message("所有按键已释放，重置急停冷却状态。")
-
-
-    def process_key_event(self, key_released_orig, key_released_mapped, release_time):
-        key_type = self.get_key_type(key_released_mapped)
-        if key_type is None: return
-
-        if key_type == 'AD':
-            opposite_key_mapped = 'D' if key_released_mapped == 'A' else 'A'
-        else: 
-            opposite_key_mapped = 'S' if key_released_mapped == 'W' else 'W'
-        
-        opposite_key_orig = self.key_mappings[opposite_key_mapped] 
-        opposite_key_state = self.key_state[opposite_key_mapped]
-
-        if opposite_key_state['pressed']:
-            current_time = time.perf_counter()
-            if current_time - self.last_record_time < self.min_time_between_records:
-                self.log_message(f"操作过于频繁，忽略此次 {key_type} 急停 (按住反向键松开)。")
-            else:
-                opposite_key_press_time = opposite_key_state['time']
-                time_diff = opposite_key_press_time - release_time
-                time_diff_ms = round(time_diff * 1000, 1)
-
-                self.log_message(f"检测到 {key_type} 急停 (按住反向键松开): {key_released_orig} ({key_released_mapped}) -> {opposite_key_orig} ({opposite_key_mapped}), 时间差: {time_diff_ms:.1f}ms")
-
-                if abs(time_diff_ms) > self.filter_threshold:
-                    self.log_message(f"时间差 {time_diff_ms:.1f}ms 超过阈值 {self.filter_threshold}ms，忽略记录。")
-                else:
-                    color = self.get_color(time_diff_ms)
-                    timing = '完美急停' if abs(time_diff_ms) <= 2 else ('按早了' if time_diff_ms < 0 else '按晚了')
-                    
-                    feedback = f"[{key_type}] {timing}：按下{opposite_key_orig}后 {-time_diff_ms:.1f}ms 松开了{key_released_orig}"
-                    
-                    detail_info = {
-                        'events': [
-                            {'key': opposite_key_orig, 'event': '按下', 'time': opposite_key_press_time, 'time_str': self.format_time(opposite_key_press_time)},
-                            {'key': key_released_orig, 'event': '松开', 'time': release_time, 'time_str': self.format_time(release_time)}
-                        ]
-                    }
-                    self.feedback_signal.emit(feedback, color)
-                    self.history_signal.emit(key_type, release_time, time_diff, detail_info, color)
-                    if key_type == 'AD': self.ad_data.append({'time': release_time, 'time_diff': time_diff})
-                    else: self.ws_data.append({'time': release_time, 'time_diff': time_diff})
-                    self.log_message(f"记录 {key_type} 急停 (按住反向键松开): 时间差 {time_diff_ms:.1f}ms")
-                    self.last_record_time = current_time
-                    self.in_quick_stop_cooldown = True
-                    if key_type in self.waiting_for_opposite_key:
-                        del self.waiting_for_opposite_key[key_type]
-                        self.stop_timer_signal.emit(key_type)
-                    return 
-
-        if key_type in self.waiting_for_opposite_key:
-            self.log_message(f"覆盖旧的 {key_type} 等待状态。")
-            self.stop_timer_signal.emit(key_type)
-
-        self.waiting_for_opposite_key[key_type] = {
-            'key': opposite_key_mapped, 
-            'release_time': release_time,
-            'key_released_orig': key_released_orig, 
-            'key_released_mapped': key_released_mapped, 
-            'events': [
-                {'key': key_released_orig, 'event': '松开', 'time': release_time, 'time_str': self.format_time(release_time)}
-            ]
-        }
-        self.log_message(f"开始等待按下 {self.key_mappings[opposite_key_mapped]} (映射为 {opposite_key_mapped}) 以完成 {key_type} 急停。")
-        timer_interval = self.filter_threshold + self.timer_buffer
-        self.start_timer_signal.emit(key_type, timer_interval)
-
-
-    def get_key_type(self, key_char_mapped): 
-        if key_char_mapped in ['A', 'D']: return 'AD'
-        elif key_char_mapped in ['W', 'S']: return 'WS'
-        return None
+    @pyqtSlot()
+    def on_heartbeat(self):
+        episode = self.watchdog.beat()
+        if episode is None:
+            return
+        message = f"界面卡顿 {episode['duration_ms']:.0f}ms，期间积压 {episode['max_pending']} 个按键事件。"
+        self.log_message(message)
+        self.statusBar().showMessage(message + " 详见 F10 延迟诊断。", 5000)
+
+    @property
+    def filter_threshold(self):
+        return self.detector.filter_threshold
+
+    @filter_threshold.setter
+    def filter_threshold(self, value):
+        self.detector.filter_threshold = value
+        self.record_store.refilter(filter_threshold=value)
+
+    def chart_view_size(self):
+        """ record_store 视图需要覆盖折线图与箱线图用到的记录数 """
+        return max(200, self.record_count * self.box_plot_multiplier)
+
+    def refresh_after_refilter(self):
+        """ 阈值或记录次数变化后，按重新筛选的视图刷新图表、悬浮窗与建议按钮 """
+        if self.mini_overlay:
+            self.mini_overlay.diffs.clear()
+            self.fill_overlay_history()
+            self.mini_overlay.set_diff_range(self.filter_threshold)
+        if self.record_store.count('AD') >= 10 or self.record_store.count('WS') >= 10:
+            self.recommendations_button.show()
+        else:
+            self.recommendations_button.hide()
+        self.invalidate_recommendations()
+        if self.is_full_view_visible():
+            self.update_plot()
+        else:
+            self.plots_dirty = True
 
     def update_feedback(self, feedback, color):
+        if self.mini_overlay:
+            self.mini_overlay.set_feedback(feedback, color)
+        self.last_feedback_color = color
         self.feedback_label.setText(feedback)
         self.feedback_label.setStyleSheet(f"""
             QLabel {{
@@ -778,174 +1376,127 @@ class MainWindow(QMainWindow):
             }}
         """)
 
-    def update_history(self, key_type, event_time, time_diff, detail_info, color):
-        time_diff_ms = round(time_diff * 1000, 1)
-        time_str = time.strftime("%H:%M:%S", time.localtime(event_time)) + f".{int((event_time % 1) * 1000):03d}"
-        item_text = f"[{key_type}] {time_str} - 时间差: {time_diff_ms:.1f}ms"
-        item = QListWidgetItem(item_text)
+    def publish_record(self, key_type, event_time, time_diff_us, detail_info):
+        """ 把急停记录推送给数据推送服务的订阅者与汇总端 (时间为整数纳秒，时间差为整数微秒) """
+        if self.station_publisher:
+            self.station_publisher.publish(key_type, event_time, time_diff_us)
+        if not self.feed_server:
+            return
+        self.feed_server.publish({
+            'axis': key_type,
+            'time': event_time,
+            'diff_us': time_diff_us,
+            'timing': get_timing_label(time_diff_us, self.detector.perfect_threshold_us),
+            'events': [{'key': e['key'], 'event': e['event'], 'time': e['time']} for e in detail_info.get('events', [])],
+        })
+
+    def add_history_item(self, key_type, event_time, time_diff_us, detail_info, color):
+        item = QListWidgetItem(f"[{key_type}] {format_clock_time(event_time)} - 时间差: {time_diff_us / 1000:.1f}ms")
         item.setData(Qt.UserRole, detail_info)
         item.setBackground(QBrush(color))
         item.setForeground(QBrush(QColor("#000000" if self.is_light_color(color) else "#FFFFFF")))
         self.history_list.addItem(item)
-        if self.history_list.count() > 50: self.history_list.takeItem(0)
-        self.history_list.scrollToBottom()
+        if self.history_list.count() > HISTORY_LIST_SIZE: self.history_list.takeItem(0)
 
-        if len(self.ad_data) >= 10 or len(self.ws_data) >= 10:
+    def update_recommendations_button(self):
+        if self.record_store.count('AD') >= 10 or self.record_store.count('WS') >= 10:
             if not self.recommendations_button.isVisible(): self.recommendations_button.show()
-        self.update_plot()
-
-    def update_plot(self):
-        try:
-            self.ad_figure_line.clear()
-            ax_ad_line = self.ad_figure_line.add_subplot(111)
-            ax_ad_line.set_facecolor('none')
-            ad_data_list = list(self.ad_data)
-            ad_plot_data = ad_data_list[-self.record_count:]
-            ad_time_diffs_line = [round(d['time_diff'] * 1000, 1) for d in ad_plot_data]
-            start_index_ad = max(0, len(ad_data_list) - self.record_count)
-            ad_indices_line = range(start_index_ad + 1, start_index_ad + len(ad_plot_data) + 1)
-            ad_colors_line = [self.get_color(diff) for diff in ad_time_diffs_line]
-
-            if ad_time_diffs_line:
-                ax_ad_line.scatter(ad_indices_line, ad_time_diffs_line, c=[color.name() for color in ad_colors_line], s=80, edgecolors='black', alpha=0.8)
-                mean_value_ad = statistics.mean(ad_time_diffs_line)
-                ax_ad_line.axhline(mean_value_ad, color='cyan', linestyle='--', linewidth=1.5, label=f'平均值: {mean_value_ad:.1f}ms')
-                ax_ad_line.axhline(0, color='white', linewidth=0.8, linestyle='-')
-                ax_ad_line.legend(prop={'family': 'Microsoft YaHei', 'size': 9}, facecolor=(0,0,0,0.5), labelcolor='white')
-                for spine_pos in ['bottom', 'left']: ax_ad_line.spines[spine_pos].set_color('white')
-                for spine_pos in ['top', 'right']: ax_ad_line.spines[spine_pos].set_visible(False)
-                ax_ad_line.tick_params(axis='x', colors='white')
-                ax_ad_line.tick_params(axis='y', colors='white')
-                ax_ad_line.xaxis.label.set_color('white')
-                ax_ad_line.yaxis.label.set_color('white')
-                ax_ad_line.title.set_color('white')
-            else:
-                ax_ad_line.text(0.5, 0.5, '无 AD 数据', ha='center', va='center', transform=ax_ad_line.transAxes, color='white')
-
-            ax_ad_line.set_xlabel('操作次数', fontproperties="Microsoft YaHei", fontsize=10)
-            ax_ad_line.set_ylabel('时间差 (ms)', fontproperties="Microsoft YaHei", fontsize=10)
-            ax_ad_line.set_title(f'AD 急停时间差 (最近 {len(ad_plot_data)} 次)', fontproperties="Microsoft YaHei", fontsize=12)
-            ax_ad_line.grid(True, linestyle='--', alpha=0.3, color='gray')
-            self.ad_canvas_line.draw()
-        except Exception as e: self.log_message(f"Error updating AD line plot: {e}")
-
-        try:
-            self.ad_figure_box.clear()
-            ax_ad_box = self.ad_figure_box.add_subplot(111)
-            ax_ad_box.set_facecolor('none')
-            box_plot_count_ad = min(len(ad_data_list), self.record_count * self.box_plot_multiplier)
-            ad_box_data = ad_data_list[-box_plot_count_ad:]
-            ad_time_diffs_box = [round(d['time_diff'] * 1000, 1) for d in ad_box_data]
-
-            if len(ad_time_diffs_box) >= 5:
-                bp_ad = ax_ad_box.boxplot(ad_time_diffs_box, vert=False, patch_artist=True, showfliers=False, widths=0.6)
-                for box in bp_ad['boxes']: box.set(color='#7570b3', linewidth=1.5, facecolor='#1b9e77', alpha=0.7)
-                for whisker in bp_ad['whiskers']: whisker.set(color='#7570b3', linewidth=1.5, linestyle='--')
-                for cap in bp_ad['caps']: cap.set(color='#7570b3', linewidth=1.5)
-                for median in bp_ad['medians']: median.set(color='#b2df8a', linewidth=2)
-                ax_ad_box.set_xlabel('时间差 (ms)', fontproperties="Microsoft YaHei", fontsize=10)
-                ax_ad_box.set_title(f'AD 时间差分布 (最近 {len(ad_box_data)} 次)', fontproperties="Microsoft YaHei", fontsize=12)
-                ax_ad_box.grid(True, linestyle='--', alpha=0.3, axis='x', color='gray')
-                ax_ad_box.tick_params(axis='x', colors='white')
-                ax_ad_box.tick_params(axis='y', colors='none', length=0)
-                ax_ad_box.set_yticks([])
-                ax_ad_box.xaxis.label.set_color('white')
-                ax_ad_box.title.set_color('white')
-                for spine_pos in ['top', 'right', 'left']: ax_ad_box.spines[spine_pos].set_visible(False)
-                ax_ad_box.spines['bottom'].set_color('white')
-            else:
-                ax_ad_box.text(0.5, 0.5, 'AD 数据不足', ha='center', va='center', transform=ax_ad_box.transAxes, color='white')
-                ax_ad_box.set_yticks([])
-                for spine_pos in ['top', 'right', 'left', 'bottom']: ax_ad_box.spines[spine_pos].set_visible(False)
-            self.ad_canvas_box.draw()
-        except Exception as e: self.log_message(f"Error updating AD box plot: {e}")
+        self.schedule_recommendations()
 
-        try:
-            self.ws_figure_line.clear()
-            ax_ws_line = self.ws_figure_line.add_subplot(111)
-            ax_ws_line.set_facecolor('none')
-            ws_data_list = list(self.ws_data)
-            ws_plot_data = ws_data_list[-self.record_count:]
-            ws_time_diffs_line = [round(d['time_diff'] * 1000, 1) for d in ws_plot_data]
-            start_index_ws = max(0, len(ws_data_list) - self.record_count)
-            ws_indices_line = range(start_index_ws + 1, start_index_ws + len(ws_plot_data) + 1)
-            ws_colors_line = [self.get_color(diff) for diff in ws_time_diffs_line]
-
-            if ws_time_diffs_line:
-                ax_ws_line.scatter(ws_indices_line, ws_time_diffs_line, c=[color.name() for color in ws_colors_line], s=80, edgecolors='black', alpha=0.8)
-                mean_value_ws = statistics.mean(ws_time_diffs_line)
-                ax_ws_line.axhline(mean_value_ws, color='cyan', linestyle='--', linewidth=1.5, label=f'平均值: {mean_value_ws:.1f}ms')
-                ax_ws_line.axhline(0, color='white', linewidth=0.8, linestyle='-')
-                ax_ws_line.legend(prop={'family': 'Microsoft YaHei', 'size': 9}, facecolor=(0,0,0,0.5), labelcolor='white')
-                for spine_pos in ['bottom', 'left']: ax_ws_line.spines[spine_pos].set_color('white')
-                for spine_pos in ['top', 'right']: ax_ws_line.spines[spine_pos].set_visible(False)
-                ax_ws_line.tick_params(axis='x', colors='white')
-                ax_ws_line.tick_params(axis='y', colors='white')
-                ax_ws_line.xaxis.label.set_color('white')
-                ax_ws_line.yaxis.label.set_color('white')
-                ax_ws_line.title.set_color('white')
-            else:
-                ax_ws_line.text(0.5, 0.5, '无 WS 数据', ha='center', va='center', transform=ax_ws_line.transAxes, color='white')
+    def update_history(self, key_type, event_time, time_diff_us, detail_info, color):
+        self.publish_record(key_type, event_time, time_diff_us, detail_info)
+        self.add_history_item(key_type, event_time, time_diff_us, detail_info, color)
+        self.history_list.scrollToBottom()
 
-            ax_ws_line.set_xlabel('操作次数', fontproperties="Microsoft YaHei", fontsize=10)
-            ax_ws_line.set_ylabel('时间差 (ms)', fontproperties="Microsoft YaHei", fontsize=10)
-            ax_ws_line.set_title(f'WS 急停时间差 (最近 {len(ws_plot_data)} 次)', fontproperties="Microsoft YaHei", fontsize=12)
-            ax_ws_line.grid(True, linestyle='--', alpha=0.3, color='gray')
-            self.ws_canvas_line.draw()
-        except Exception as e: self.log_message(f"Error updating WS line plot: {e}")
+        if self.mini_overlay:
+            self.mini_overlay.add_diff(time_diff_us / 1000, color)
 
-        try:
-            self.ws_figure_box.clear()
-            ax_ws_box = self.ws_figure_box.add_subplot(111)
-            ax_ws_box.set_facecolor('none')
-            box_plot_count_ws = min(len(ws_data_list), self.record_count * self.box_plot_multiplier)
-            ws_box_data = ws_data_list[-box_plot_count_ws:]
-            ws_time_diffs_box = [round(d['time_diff'] * 1000, 1) for d in ws_box_data]
-
-            if len(ws_time_diffs_box) >= 5:
-                bp_ws = ax_ws_box.boxplot(ws_time_diffs_box, vert=False, patch_artist=True, showfliers=False, widths=0.6)
-                for box in bp_ws['boxes']: box.set(color='#D95F02', linewidth=1.5, facecolor='#FF7F0E', alpha=0.7)
-                for whisker in bp_ws['whiskers']: whisker.set(color='#D95F02', linewidth=1.5, linestyle='--')
-                for cap in bp_ws['caps']: cap.set(color='#D95F02', linewidth=1.5)
-                for median in bp_ws['medians']: median.set(color='#ffff99', linewidth=2)
-                ax_ws_box.set_xlabel('时间差 (ms)', fontproperties="Microsoft YaHei", fontsize=10)
-                ax_ws_box.set_title(f'WS 时间差分布 (最近 {len(ws_box_data)} 次)', fontproperties="Microsoft YaHei", fontsize=12)
-                ax_ws_box.grid(True, linestyle='--', alpha=0.3, axis='x', color='gray')
-                ax_ws_box.tick_params(axis='x', colors='white')
-                ax_ws_box.tick_params(axis='y', colors='none', length=0)
-                ax_ws_box.set_yticks([])
-                ax_ws_box.xaxis.label.set_color('white')
-                ax_ws_box.title.set_color('white')
-                for spine_pos in ['top', 'right', 'left']: ax_ws_box.spines[spine_pos].set_visible(False)
-                ax_ws_box.spines['bottom'].set_color('white')
-            else:
-                ax_ws_box.text(0.5, 0.5, 'WS 数据不足', ha='center', va='center', transform=ax_ws_box.transAxes, color='white')
-                ax_ws_box.set_yticks([])
-                for spine_pos in ['top', 'right', 'left', 'bottom']: ax_ws_box.spines[spine_pos].set_visible(False)
-            self.ws_canvas_box.draw()
-        except Exception as e: self.log_message(f"Error updating WS box plot: {e}")
+        self.update_recommendations_button()
+        self.tracer.stamp(event_time, 'model')
+        if self.is_full_view_visible():
+            self.update_plot()
+            self.tracer.stamp(event_time, 'paint')
+        else:
+            self.plots_dirty = True # 完整窗口不可见时跳过图表重绘，显示时再补画
 
+    def update_plot(self):
+        """ 更新四个实时图表：模板只在创建时设置一次样式，这里只替换数据图元与标题文字 """
+        for axis, line_chart, line_canvas, box_chart, box_canvas in (
+                ('AD', self.ad_line_chart, self.ad_canvas_line, self.ad_box_chart, self.ad_canvas_box),
+                ('WS', self.ws_line_chart, self.ws_canvas_line, self.ws_box_chart, self.ws_canvas_box)):
+            data_list = list(self.record_store.series[axis])
+            try:
+                self.update_line_chart(line_chart, axis, data_list)
+                line_canvas.draw()
+            except Exception as e: self.log_message(f"Error updating {axis} line plot: {e}")
+            try:
+                self.update_box_chart(box_chart, axis, data_list)
+                box_canvas.draw()
+            except Exception as e: self.log_message(f"Error updating {axis} box plot: {e}")
+
+    def update_line_chart(self, chart, axis, data_list):
+        ax = chart.begin()
+        plot_data = data_list[-self.record_count:]
+        diffs_us = diff_array(plot_data)
+        stats = summarize_diffs(diffs_us, self.filter_threshold, self.detector.perfect_threshold_us)
+        start_index = max(0, len(data_list) - self.record_count)
+        chart.set_title(f'{axis} 急停时间差 (最近 {len(plot_data)} 次)')
+        if not plot_data:
+            chart.show_empty(f'无 {axis} 数据')
+            return
+        indices = range(start_index + 1, start_index + len(plot_data) + 1)
+        colors = diff_colors(diffs_us, self.filter_threshold * 1000, self.detector.perfect_threshold_us)
+        ax.scatter(indices, stats['values_ms'], c=colors, s=80, edgecolors='black', alpha=0.8)
+        ax.axhline(stats['mean'], color='cyan', linestyle='--', linewidth=1.5, label=f"平均值: {stats['mean']:.1f}ms")
+        ax.axhline(0, color='white', linewidth=0.8, linestyle='-')
+        self.draw_change_points(chart, axis, start_index, data_list)
+        chart.legend()
+
+    def update_box_chart(self, chart, axis, data_list):
+        ax = chart.begin()
+        box_plot_count = min(len(data_list), self.record_count * self.box_plot_multiplier)
+        box_data = data_list[-box_plot_count:]
+        stats = summarize_diffs(diff_array(box_data), self.filter_threshold, self.detector.perfect_threshold_us)
+        chart.set_title(f'{axis} 时间差分布 (最近 {len(box_data)} 次)')
+        if stats['count'] < 5:
+            chart.show_empty(f'{axis} 数据不足')
+            return
+        edge, face, median_color = BOX_COLORS[axis]
+        # 箱线图统计已预先算好，bxp 直接绘制，跳过 matplotlib 自身的统计计算；manage_ticks=False 保留模板隐藏的 y 轴
+        bp = ax.bxp([stats['box']], orientation='horizontal', patch_artist=True, showfliers=False, widths=0.6,
+                    manage_ticks=False)
+        for box in bp['boxes']: box.set(color=edge, linewidth=1.5, facecolor=face, alpha=0.7)
+        for whisker in bp['whiskers']: whisker.set(color=edge, linewidth=1.5, linestyle='--')
+        for cap in bp['caps']: cap.set(color=edge, linewidth=1.5)
+        for median in bp['medians']: median.set(color=median_color, linewidth=2)
+
+    def draw_change_points(self, chart, axis, start_index, data_list):
+        """ 在折线图上标出落在当前显示范围内的趋势变点 (按变点起始事件时间定位，视图重新筛选后仍然对齐) """
+        times = [d['time'] for d in data_list]
+        for change in self.trend_analyzer.changes[axis]:
+            if change['start_time'] is None:
+                continue
+            x = bisect_left(times, change['start_time']) + 1
+            if start_index < x <= len(times):
+                color = '#b2df8a' if SessionTrendAnalyzer.is_improvement(change) else 'orange'
+                chart.ax.axvline(x - 0.5, color=color, linestyle=':', linewidth=1.5)
+                chart.text(x - 0.5, 0.98, CHANGE_NAMES[change['kind']], transform=chart.ax.get_xaxis_transform(),
+                           rotation=90, va='top', ha='right', color=color, size=8)
 
     def show_detail_info(self, item):
+        """ 在详情面板中显示这次急停的按键事件序列 (相邻事件的间隔一并列出) """
         detail_info = item.data(Qt.UserRole)
         if detail_info and 'events' in detail_info:
-            events = detail_info['events']
-            message = "按键事件序列:\n" + "-"*20 + "\n"
-            try:
-                sorted_events = sorted(events, key=lambda x: x['time'])
-                for event in sorted_events:
-                    key = event.get('key', '?')
-                    ev_type = event.get('event', '?')
-                    time_str = event.get('time_str', '?')
-                    message += f"{time_str} - {key}键 {ev_type}\n"
-            except Exception as e:
-                message += f"\nError formatting events: {e}"
-            QMessageBox.information(self, "详细信息", message)
+            lines = [item.text(), "", "按键事件序列:", "-" * 20]
+            previous = None
+            for event in sorted(detail_info['events'], key=lambda x: x['time']):
+                gap = f"  (+{(event['time'] - previous) / 1e6:.1f}ms)" if previous is not None else ""
+                lines.append(f"{event.get('time_str', '?')} - {event.get('key', '?')}键 {event.get('event', '?')}{gap}")
+                previous = event['time']
+            self.detail_panel.set_text("\n".join(lines))
         else:
-            QMessageBox.warning(self, "详细信息", "无法加载详细事件信息。")
-
-    def format_time(self, timestamp):
-        return f"{timestamp:.3f}s"
+            self.detail_panel.set_text("无法加载详细事件信息。")
+        self.detail_panel.present()
 
     @pyqtSlot(str, bool) 
     def update_key_state_display(self, key_char_mapped, is_pressed):
@@ -955,7 +1506,7 @@ class MainWindow(QMainWindow):
         }
         if key_char_mapped in label_mapping:
             label = label_mapping[key_char_mapped]
-            physical_key = self.key_mappings.get(key_char_mapped, key_char_mapped) 
+            physical_key = self.detector.key_mappings.get(key_char_mapped, key_char_mapped) 
             
             label.setText(f"{physical_key}键 ({key_char_mapped}): {'按下' if is_pressed else '未按下'}")
             if is_pressed:
@@ -973,15 +1524,15 @@ class MainWindow(QMainWindow):
                     }
                 """)
 
-    def get_color(self, time_diff_ms):
-        max_time_diff = self.filter_threshold
-        normalized_diff = min(abs(time_diff_ms), max_time_diff) / max(max_time_diff, 1e-6)
-        perfect_color = QColor(144, 238, 144)
-        early_start_color = QColor(173, 216, 230); early_end_color = QColor(0, 0, 139)
-        late_start_color = QColor(255, 182, 193); late_end_color = QColor(139, 0, 0)
+    def get_color(self, time_diff_us):
+        max_time_diff = self.filter_threshold * 1000
+        normalized_diff = min(abs(time_diff_us), max_time_diff) / max(max_time_diff, 1)
+        perfect_color = QColor(*PERFECT_RGB)
+        early_start_color, early_end_color = (QColor(*rgb) for rgb in EARLY_RGB)
+        late_start_color, late_end_color = (QColor(*rgb) for rgb in LATE_RGB)
 
-        if abs(time_diff_ms) <= 2: return perfect_color
-        elif time_diff_ms < 0: start_color, end_color = early_start_color, early_end_color
+        if abs(time_diff_us) <= self.detector.perfect_threshold_us: return perfect_color
+        elif time_diff_us < 0: start_color, end_color = early_start_color, early_end_color
         else: start_color, end_color = late_start_color, late_end_color
         
         r = max(0.0, min(1.0, start_color.redF() + (end_color.redF() - start_color.redF()) * normalized_diff))
@@ -993,27 +1544,90 @@ class MainWindow(QMainWindow):
         return (color.red() * 299 + color.green() * 587 + color.blue() * 114) / 1000 > 128
 
     def show_recommendations(self):
-        if not self.ad_data and not self.ws_data:
-            QMessageBox.information(self, "急停建议", "暂无足够数据可供分析。")
+        """ 打开 (非模态) 建议面板，之后随新的急停自动刷新 """
+        self.recommendation_panel.present()
+        self.start_recommendation_job()
+
+    def on_recommendation_panel_visibility(self, visible):
+        if visible:
+            self.schedule_recommendations()
+
+    def schedule_recommendations(self):
+        """ 合并短时间内的多次刷新请求；面板隐藏时不计算 """
+        if self.recommendation_panel.isVisible() and not self.recommendation_timer.isActive():
+            self.recommendation_timer.start()
+
+    def start_recommendation_job(self):
+        """ 在 GUI 线程复制 record_store 与设置的快照，交给后台线程生成建议 """
+        if self.recommendation_job_running:
+            self.recommendation_dirty = True # 当前计算完成后按最新数据再算一次
             return
+        self.recommendation_timer.stop()
+        snapshot = {
+            'diffs': {axis: diff_array(records) for axis, records in self.record_store.series.items()},
+            'trends': {axis: self.trend_analyzer.summarize(axis) for axis in self.record_store.series},
+            'filter_threshold': self.filter_threshold,
+            'perfect_threshold_us': self.detector.perfect_threshold_us,
+            'rollups': self.profile_rollups,
+            'profile': self.profile,
+        }
+        self.recommendation_generation += 1
+        self.recommendation_job_running = True
+        threading.Thread(target=self.compute_recommendations, args=(self.recommendation_generation, snapshot),
+                         name="RecommendationWorker", daemon=True).start()
+
+    def compute_recommendations(self, generation, snapshot):
+        """ 后台线程：只使用快照中的数据，结果通过信号交给 GUI 线程 """
+        try:
+            text = self.format_recommendations(snapshot)
+        except Exception as e:
+            text = f"生成建议失败: {e}"
+        self.recommendations_ready_signal.emit(generation, text)
+
+    @pyqtSlot(int, str)
+    def on_recommendations_ready(self, generation, text):
+        self.recommendation_job_running = False
+        if generation == self.recommendation_generation: # 计算期间点了刷新等操作时丢弃旧结果
+            self.recommendation_panel.set_text(text)
+        if self.recommendation_dirty:
+            self.recommendation_dirty = False
+            self.schedule_recommendations()
+
+    def invalidate_recommendations(self):
+        """ 数据被整体替换 (刷新、切换档案、调整阈值) 时调用：丢弃进行中的计算结果并重算 """
+        self.recommendation_generation += 1
+        if self.recommendation_job_running:
+            self.recommendation_dirty = True
+        else:
+            self.schedule_recommendations()
+
+    def format_recommendations(self, snapshot):
+        diffs = snapshot['diffs']
+        if not any(len(values) for values in diffs.values()):
+            return "暂无足够数据可供分析。"
         recommendations = []
         min_data_points = 5
-        for key_type_label, data_deque in [("AD", self.ad_data), ("WS", self.ws_data)]:
-            if len(data_deque) >= min_data_points:
-                filtered_data = [d['time_diff'] * 1000 for d in data_deque if abs(d['time_diff'] * 1000) <= self.filter_threshold]
-                if len(filtered_data) >= min_data_points:
-                    avg_diff = round(statistics.mean(filtered_data), 1)
-                    stdev = round(statistics.stdev(filtered_data), 1) if len(filtered_data) > 1 else 0
-                    rec = f"--- {key_type_label} 急停分析 (基于 {len(filtered_data)} 次有效记录) ---\n"
-                    rec += f"平均时间差: {avg_diff:.1f}ms\n标准差 (稳定性): {stdev:.1f}ms\n\n"
+        for key_type_label, values in diffs.items():
+            if len(values) >= min_data_points:
+                diff_stats = summarize_diffs(values, snapshot['filter_threshold'], snapshot['perfect_threshold_us'])
+                if diff_stats['count'] >= min_data_points:
+                    avg_diff = round(diff_stats['mean'], 1)
+                    stdev = round(diff_stats['stdev'], 1)
+                    rec = f"--- {key_type_label} 急停分析 (基于 {diff_stats['count']} 次有效记录) ---\n"
+                    rec += f"平均时间差: {avg_diff:.1f}ms\n标准差 (稳定性): {stdev:.1f}ms\n"
+                    rec += f"完美/偏早/偏晚: {diff_stats['perfect']}/{diff_stats['early']}/{diff_stats['late']} 次\n\n"
                     if avg_diff < -5: rec += "趋势: 偏早 (反向键按得太快)\n建议: 尝试略微延迟按反向键的时机，或检查键盘设置 (如 Rapid Trigger 的触发点)。"
                     elif avg_diff > 5: rec += "趋势: 偏晚 (反向键按得太慢)\n建议: 尝试更快地按下反向键，或检查键盘设置 (如缩短触发键程)。"
                     else: rec += "趋势: 良好 (接近同步)\n建议: 继续保持！"
                     if stdev > 15: rec += "\n稳定性提示: 时间差波动较大，尝试更一致地执行急停操作。"
+                    trend = snapshot['trends'][key_type_label]
+                    if trend: rec += "\n\n趋势变化:\n" + trend
+                    long_term = self.long_term_summary(key_type_label, snapshot)
+                    if long_term: rec += "\n\n" + long_term
                     recommendations.append(rec)
-                else: recommendations.append(f"--- {key_type_label} 急停分析 ---\n有效数据不足 ({len(filtered_data)}/{min_data_points})。")
-            else: recommendations.append(f"--- {key_type_label} 急停分析 ---\n数据不足 ({len(data_deque)}/{min_data_points})。")
-        QMessageBox.information(self, "急停建议", "\n\n".join(recommendations))
+                else: recommendations.append(f"--- {key_type_label} 急停分析 ---\n有效数据不足 ({diff_stats['count']}/{min_data_points})。")
+            else: recommendations.append(f"--- {key_type_label} 急停分析 ---\n数据不足 ({len(values)}/{min_data_points})。")
+        return "\n\n".join(recommendations)
 
     def show_instructions_dialog(self):
         """ Displays the custom instructions dialog. """
@@ -1022,7 +1636,7 @@ class MainWindow(QMainWindow):
 
 
     def show_key_mapping_dialog(self):
-        dialog = KeyMappingDialog(self.key_mappings.copy(), self) 
+        dialog = KeyMappingDialog(self.detector.key_mappings.copy(), self) 
         if dialog.exec_() == QDialog.Accepted:
             new_mappings = dialog.get_mappings()
             if len(set(new_mappings.values())) != len(new_mappings.values()):
@@ -1032,15 +1646,21 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "映射错误", "映射的按键不能为空。")
                 return
 
-            self.key_mappings = new_mappings
-            self.reverse_key_mappings = {v: k for k, v in self.key_mappings.items()}
-            self.log_message(f"按键映射已更新: {self.key_mappings}")
+            try:
+                self.apply_key_mappings(new_mappings)
+            except ValueError as e:
+                QMessageBox.warning(self, "映射错误", str(e))
+                return
+            self.save_profile_settings()
+            self.log_message(f"按键映射已更新: {self.detector.key_mappings}")
             self.update_key_labels_signal.emit() 
             QMessageBox.information(self, "按键映射", "按键映射已成功更新！")
 
 
     @pyqtSlot(str, int)
     def start_timer(self, key_type, interval):
+        if self.replay is not None:
+            return # 回放时按事件时间判断超时 (detector.expire_overdue)
         if key_type in self.timers:
             safe_interval = max(1, interval)
             self.timers[key_type].start(safe_interval)
@@ -1052,19 +1672,97 @@ class MainWindow(QMainWindow):
             self.timers[key_type].stop()
 
     def reset_quick_stop(self, key_type):
-        if key_type in self.waiting_for_opposite_key:
-            timer_interval = self.timers[key_type].interval()
-            
-            key_released_orig = self.waiting_for_opposite_key[key_type]['key_released_orig']
-            expected_key_mapped = self.waiting_for_opposite_key[key_type]['key']
-            expected_key_orig = self.key_mappings[expected_key_mapped]
-
-            self.log_message(f"超时 ({timer_interval}ms): 松开 {key_released_orig} 后未及时按下 {expected_key_orig} (映射为 {expected_key_mapped})。取消 {key_type} 等待状态。")
-            del self.waiting_for_opposite_key[key_type]
-            if not any(state['pressed'] for state in self.key_state.values()):
-                if self.in_quick_stop_cooldown:
-                    self.in_quick_stop_cooldown = False
-                    self.log_message("所有按键已释放 (超时后检查)，重置急停冷却状态。")
+        """
+        等待计时器触发：先处理输入缓冲区中已有的事件 (GUI 卡顿时反向键的按下可能已经发生、只是尚未处理)，
+        再按事件时间判断是否超时；还没到超时时刻时重新启动计时器。
+        """
+        self.drain_input_ring()
+        now = time.perf_counter_ns()
+        self.detector.expire_overdue(now)
+        deadline = self.detector.wait_deadline(key_type)
+        if deadline is not None:
+            self.timers[key_type].start(max(1, -(-(deadline - now) // 1_000_000)))
+
+    def show_diagnostics_dialog(self):
+        """ 显示 (非模态) 延迟诊断窗口 """
+        if self.diagnostics_dialog is None:
+            self.diagnostics_dialog = DiagnosticsDialog(self.tracer, self.get_input_stats, self.watchdog, self)
+        self.diagnostics_dialog.refresh()
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
+
+    def show_analytics_dialog(self):
+        """ 显示 (非模态) 按键分析窗口 """
+        if self.analytics_dialog is None:
+            self.analytics_dialog = AnalyticsDialog(self.key_analytics, lambda: self.detector.key_mappings, self)
+        self.analytics_dialog.refresh()
+        self.analytics_dialog.show()
+        self.analytics_dialog.raise_()
+
+    def show_distribution_dialog(self):
+        """ 显示 (非模态) 时间差分布窗口 """
+        if self.distribution_dialog is None:
+            self.distribution_dialog = DistributionDialog(self.diff_bins, lambda: self.filter_threshold, self)
+        self.distribution_dialog.refresh()
+        self.distribution_dialog.show()
+        self.distribution_dialog.raise_()
+
+    def toggle_profiler(self):
+        """ 开始/停止对 GUI 线程和监听线程的采样，停止时写出火焰图文件 """
+        if not self.profiler.is_running():
+            listener_ident = self.listener.ident if self.listener else None
+            self.profiler.start({'GUI线程': threading.main_thread().ident, '监听线程': listener_ident})
+            self.log_message("性能采样已开始，再次按 F11 停止并保存。")
+            return
+        self.profiler.stop()
+        path = user_data_path(time.strftime("profile_%Y%m%d_%H%M%S.folded"))
+        try:
+            self.profiler.write_collapsed(path)
+            self.log_message(f"性能采样已停止: {self.profiler.sample_count} 次采样 / {self.profiler.duration():.1f}s，已保存到 {path}")
+        except OSError as e:
+            self.log_message(f"保存性能采样文件失败: {e}")
+
+    def is_full_view_visible(self):
+        return self.isVisible() and not self.isMinimized()
+
+    def toggle_mini_overlay(self):
+        """ 在完整窗口与置顶迷你悬浮窗之间切换 """
+        if self.mini_overlay and self.mini_overlay.isVisible():
+            self.show_full_window()
+            return
+        if self.mini_overlay is None:
+            self.mini_overlay = MiniOverlay()
+            self.mini_overlay.restore_requested.connect(self.show_full_window)
+            self.mini_overlay.quit_requested.connect(self.close)
+            self.fill_overlay_history()
+        self.mini_overlay.set_feedback(self.feedback_label.text(), self.last_feedback_color)
+        self.mini_overlay.set_diff_range(self.filter_threshold)
+        self.mini_overlay.show()
+        self.hide()
+        self.log_message("已切换到迷你模式。")
+
+    def fill_overlay_history(self):
+        recent = sorted((d for series in self.record_store.series.values() for d in series), key=lambda d: d['time'])
+        for d in recent[-self.mini_overlay.diffs.maxlen:]:
+            self.mini_overlay.add_diff(d['diff_us'] / 1000, self.get_color(d['diff_us']))
+
+    def show_full_window(self):
+        if self.mini_overlay:
+            self.mini_overlay.hide()
+        self.showNormal()
+        self.activateWindow()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.plots_dirty:
+            self.plots_dirty = False
+            self.update_plot()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == event.WindowStateChange and self.plots_dirty and self.is_full_view_visible():
+            self.plots_dirty = False
+            self.update_plot()
 
     def resizeEvent(self, event):
         if hasattr(self, 'background_label') and self.background_label:
@@ -1073,12 +1771,11 @@ class MainWindow(QMainWindow):
 
     def refresh(self):
         self.log_message("刷新操作已触发。")
-        self.ad_data.clear(); self.ws_data.clear()
+        self.record_store.clear()
         self.history_list.clear(); self.output_list.clear()
-        self.key_state = {k: {'pressed': False, 'time': None} for k in self.key_state}
-        self.waiting_for_opposite_key.clear()
-        self.in_quick_stop_cooldown = False
-        self.last_record_time = 0
+        self.detector.reset()
+        self.key_analytics.reset()
+        self.trend_analyzer.reset()
         for timer in self.timers.values(): timer.stop()
         
         self.update_key_labels_signal.emit() 
@@ -1088,10 +1785,330 @@ class MainWindow(QMainWindow):
 
         self.feedback_label.setText("请模拟自己PEEK时进行AD和WS急停")
         self.feedback_label.setStyleSheet("QLabel { color: #FFFFFF; background-color: #2E2E2E; border-radius: 10px; padding: 15px; }")
+        self.last_feedback_color = QColor("#2E2E2E")
+        if self.mini_overlay:
+            self.mini_overlay.diffs.clear()
+            self.mini_overlay.set_feedback(self.feedback_label.text(), self.last_feedback_color)
         self.update_plot()
         self.recommendations_button.hide()
+        self.invalidate_recommendations()
         self.log_message("界面和数据已刷新。")
 
+    def persist_candidate(self, axis, entry):
+        """ record_store 每保存一条候选急停时调用，写入当前玩家的预写日志 (只入队，不等待磁盘) """
+        if self.history_writer and self.replay is None:
+            self.history_writer.append(axis, entry['time'], entry['diff_us'])
+
+    def on_history_write_error(self, error):
+        """ 日志写入线程出错时调用 (在写入线程中)，之后的记录不再落盘 """
+        self.log_signal.emit(f"写入历史记录失败，本次会话之后的急停将不再保存: {error}")
+
+    def on_publish_error(self, error):
+        """ 发送到汇总端失败时调用 (在发送线程中，同样的错误只报告一次)，之后会继续重试 """
+        self.log_signal.emit(f"发送急停数据到汇总端失败: {error}")
+
+    def close_history_writer(self):
+        """
+        通知写入/录制/发送线程收尾后关闭，不等待。返回已关闭的写入端与录制器，
+        读取它们写过的文件或退出前需要对其调用 join()。
+        """
+        closed = [writer for writer in (self.history_writer, self.event_recorder) if writer]
+        for writer in closed:
+            writer.close()
+        self.history_writer = None
+        self.event_recorder = None
+        if self.station_publisher:
+            self.station_publisher.close()
+            self.station_publisher = None
+        return closed
+
+    def apply_key_mappings(self, key_mappings):
+        """
+        编译新的按键映射并替换监听线程的分发表 (一次属性赋值)。映射无效时抛出 ValueError，原映射不变。
+        替换前已写入缓冲区的旧按键在检测器中按新映射处理，未映射的会被忽略。
+        """
+        key_mappings = {key: normalize_key_name(name) for key, name in key_mappings.items()}
+        dispatch = compile_key_mappings({**{key: key for key in self.detector.keys}, **key_mappings})
+        self.detector.set_key_mappings(key_mappings)
+        self.key_dispatch = dispatch
+
+    def switch_profile(self, profile):
+        """
+        切换玩家档案：立即应用设置并清空当前会话，历史记录在后台线程读取后再并入 record_store。
+        键盘监听器与输入缓冲区不受影响。
+        """
+        closed_writers = self.close_history_writer()
+        self.profile = profile
+        self.profiles.set_active(profile)
+        settings = profile.settings
+        try:
+            self.apply_key_mappings(settings['key_mappings'])
+        except ValueError as e:
+            self.log_message(f"玩家 {profile.name} 的按键映射无效 ({e})，使用默认映射。")
+            self.apply_key_mappings({})
+        self.detector.perfect_threshold_us = settings['perfect_threshold_us']
+        self.detector.set_rate_limits(rate_limits_ns(settings['cooldown_ms']), rate_limits_ns(settings['debounce_ms']))
+        self.record_count = settings['record_count']
+        self.record_store.refilter(maxlen=self.chart_view_size())
+        self.filter_threshold = settings['filter_threshold']
+        self.refresh()
+        self.setWindowTitle(f"CS2急停评估工具 - {profile.name}")
+        self.profile_button.setText(f"玩家: {profile.name}")
+
+        # 本次会话写入新的记录文件；之前的文件在后台线程恢复、读取后再压缩，新产生的记录已直接进入 record_store
+        self.profile_rollups = None
+        snapshot = profile.history_snapshot()
+        try:
+            self.history_writer = profile.open_writer(sync_every=HISTORY_SYNC_EVERY,
+                                                      sync_interval_ms=HISTORY_SYNC_INTERVAL_MS,
+                                                      on_error=self.on_history_write_error)
+        except (OSError, JournalError, sqlite3.Error) as e:
+            self.log_message(f"无法打开历史记录文件，本次会话不会保存: {e}")
+        try:
+            self.event_recorder = profile.open_recorder(self.input_ring, key_filter=self.detector.is_mapped,
+                                                        sync_every=HISTORY_SYNC_EVERY,
+                                                        sync_interval_ms=HISTORY_SYNC_INTERVAL_MS,
+                                                        on_error=self.on_history_write_error)
+        except (OSError, JournalError) as e:
+            self.log_message(f"无法打开按键录制文件，本次会话不会录制: {e}")
+        try:
+            self.station_publisher = profile.open_publisher(on_error=self.on_publish_error)
+        except (OSError, ValueError) as e:
+            self.log_message(f"无法连接汇总端，本次会话不会发送急停数据: {e}")
+        if self.station_publisher:
+            self.log_message(f"急停数据将发送到汇总端: {profile.settings['publish_to']}")
+        self.log_message(f"已切换到玩家档案: {profile.name}")
+        threading.Thread(target=self.load_profile_history, args=(profile, snapshot, closed_writers),
+                         name="ProfileHistoryLoader", daemon=True).start()
+
+    def load_profile_history(self, profile, snapshot, closed_writers=()):
+        """
+        后台线程：等上一场会话的写入端写完后读取档案历史并通过信号交给 GUI 线程，
+        之后压缩旧的记录文件并载入长期汇总
+        """
+        for writer in closed_writers:
+            writer.join()
+        try:
+            history, recovered = profile.load_history(snapshot)
+        except (OSError, JournalError, sqlite3.Error) as e:
+            self.log_signal.emit(f"读取 {profile.name} 的历史记录失败: {e}")
+            return
+        if recovered:
+            self.log_signal.emit(f"历史记录上次未正常关闭，已截掉末尾 {recovered} 字节不完整的数据。")
+        self.history_loaded_signal.emit(profile.id, history)
+        try:
+            compacted = profile.compact(snapshot)
+            if compacted:
+                message = f"历史记录已压缩: 新汇总 {compacted['sessions']} 场"
+                if 'files' in compacted:
+                    message += (f"，合并 {compacted['files']} 个文件，保留 {compacted['retained']} 条原始记录，"
+                                f"{compacted['dropped']} 条超出保留期的记录只保留汇总")
+                self.log_signal.emit(message + "。")
+            rollups = profile.load_rollups()
+            pruned = profile.prune_event_logs()
+            if pruned:
+                self.log_signal.emit(f"已删除 {pruned} 个超出保留期的按键录制文件。")
+        except (OSError, ValueError, JournalError, sqlite3.Error) as e:
+            self.log_signal.emit(f"压缩 {profile.name} 的历史记录失败: {e}")
+            return
+        self.rollups_loaded_signal.emit(profile.id, rollups)
+
+    @pyqtSlot(str, object)
+    def on_profile_history_loaded(self, profile_id, history):
+        if self.profile is None or profile_id != self.profile.id:
+            return # 读取期间已切换到其他档案
+        total = sum(len(entries) for entries in history.values())
+        if not total:
+            return
+        self.record_store.load(history)
+        self.log_message(f"已载入 {self.profile.name} 的 {total} 条历史急停。")
+        self.refresh_after_refilter()
+
+    @pyqtSlot(str, object)
+    def on_profile_rollups_loaded(self, profile_id, rollups):
+        if self.profile is not None and profile_id == self.profile.id:
+            self.profile_rollups = rollups
+            self.long_term_cache = {} # 缓存键只含汇总对象的 id，换新对象时清空
+            self.invalidate_recommendations()
+
+    def long_term_summary(self, axis, snapshot):
+        """
+        以往练习 (已压缩汇总的场次) 的长期统计文本，没有汇总时返回空字符串。
+        在建议的后台线程中调用，结果按档案与阈值缓存 LONG_TERM_CACHE_S 秒。
+        """
+        rollups = snapshot['rollups']
+        if rollups is None or not rollups.session_count(axis):
+            return ""
+        limit_us = snapshot['filter_threshold'] * 1000
+        perfect_us = snapshot['perfect_threshold_us']
+        key = (axis, id(rollups), limit_us, perfect_us)
+        cached = self.long_term_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < LONG_TERM_CACHE_S:
+            return cached[1]
+        text = self._long_term_summary(axis, rollups, snapshot['profile'], limit_us, perfect_us)
+        if len(self.long_term_cache) >= 16:
+            self.long_term_cache.clear()
+        self.long_term_cache[key] = (time.monotonic(), text)
+        return text
+
+    def _long_term_summary(self, axis, rollups, profile, limit_us, perfect_us):
+        overall = rollups.summary(axis).within(limit_us, perfect_us)
+        if not overall.count:
+            return ""
+        week = rollups.summary(axis, since_ns=time.time_ns() - 7 * 86_400_000_000_000).within(limit_us, perfect_us)
+        lines = [f"以往练习 ({rollups.session_count(axis)} 场，共 {overall.count} 次): "
+                 f"平均 {overall.mean / 1000:.1f}ms，标准差 {overall.std() / 1000:.1f}ms，"
+                 f"中位数 {overall.quantile(0.5) / 1000:.1f}ms"]
+        if week.count:
+            lines.append(f"近 7 天 ({week.count} 次): 平均 {week.mean / 1000:.1f}ms，标准差 {week.std() / 1000:.1f}ms")
+        recent = [session.within(limit_us, perfect_us) for session in rollups.recent_sessions(axis, 5)]
+        recent = [f"{session.mean / 1000:.1f}±{session.std() / 1000:.1f}" for session in recent if session.count]
+        if recent:
+            lines.append("最近几场 (平均±标准差 ms): " + ", ".join(recent))
+        try:
+            worst = profile.worst_stops(axis, time.time_ns() - 7 * 86_400_000_000_000, limit=5, max_abs_us=limit_us)
+        except sqlite3.Error:
+            worst = None
+        if worst:
+            lines.append("近 7 天偏差最大的几次 (ms): " + ", ".join(f"{diff_us / 1000:+.1f}" for _, diff_us in worst))
+        return "\n".join(lines)
+
+    def show_replay_dialog(self):
+        if self.replay_dialog is not None:
+            self.replay_dialog.raise_()
+            return
+        directory = self.profile.events_dir if self.profile else user_data_path()
+        path, _ = QFileDialog.getOpenFileName(self, "选择要回放的按键录制", directory, "按键录制 (*.wal)")
+        if not path:
+            return
+        try:
+            metadata, events = read_event_log(path)
+        except (OSError, JournalError) as e:
+            QMessageBox.warning(self, "回放", f"读取录制文件失败: {e}")
+            return
+        if not events:
+            QMessageBox.information(self, "回放", "该录制文件中没有按键事件。")
+            return
+        self.start_replay(metadata, events, os.path.basename(path))
+
+    def start_replay(self, metadata, events, title):
+        """
+        进入回放：清空当前视图，使用录制时的按键映射与冷却/去抖设置，把录制的事件按原时间戳交给检测器。
+        回放期间逐事件日志关闭，按键状态与图表只按帧刷新，结果不写入历史记录。
+        """
+        self.replay_saved_mappings = dict(self.detector.key_mappings)
+        if metadata.get('key_mappings'):
+            self.detector.set_key_mappings(metadata['key_mappings'])
+        self.detector.set_rate_limits(rate_limits_ns(metadata.get('cooldown_ms')), rate_limits_ns(metadata.get('debounce_ms')))
+        self.replay = SessionReplayer(events)
+        self.replay_key_states = {}
+        self.replay_records = []
+        self.reset_replay_view()
+        self.detector.on_log = lambda message: None
+        self.detector.on_key_state = self.replay_key_states.__setitem__
+        self.replay_dialog = ReplayDialog(self.replay, f"回放 - {metadata.get('name', '')} {title}",
+                                          self.replay_tick, self.replay_seek, self.stop_replay, parent=self)
+        self.replay_dialog.show()
+        self.log_message(f"开始回放 {title}: {len(events)} 个按键事件，时长 {self.replay.duration_ns / 1e9:.1f}s。")
+
+    def reset_replay_view(self):
+        self.refresh()
+        self.replay_key_states.clear()
+        self.replay_records.clear()
+
+    def replay_event(self, kind, original_key_char, timestamp):
+        self.detector.expire_overdue(timestamp)
+        key_char = self.detector.reverse_key_mappings.get(original_key_char)
+        if key_char is None:
+            return
+        if kind == EVENT_PRESS:
+            self.key_analytics.press(key_char, timestamp)
+            self.detector.press(original_key_char, timestamp)
+        else:
+            self.key_analytics.release(key_char, timestamp)
+            self.detector.release(original_key_char, timestamp)
+
+    def render_replay_frame(self):
+        """ 回放每帧刷新一次：按键状态、本帧新增的急停 (历史列表最多 HISTORY_LIST_SIZE 条、最新一条反馈、悬浮窗散点) 与图表 """
+        for key_char, pressed in self.replay_key_states.items():
+            self.update_key_state_display(key_char, pressed)
+        self.replay_key_states.clear()
+        if self.replay_records:
+            records, self.replay_records = self.replay_records, []
+            record, color = records[-1]
+            self.update_feedback(format_feedback(record), color)
+            for record, color in records[-HISTORY_LIST_SIZE:]:
+                self.add_history_item(record['key_type'], record['event_time'], record['time_diff_us'],
+                                      {'events': record['events']}, color)
+            self.history_list.scrollToBottom()
+            if self.mini_overlay:
+                for record, color in records[-self.mini_overlay.diffs.maxlen:]:
+                    self.mini_overlay.add_diff(record['time_diff_us'] / 1000, color)
+            self.update_recommendations_button()
+            self.plots_dirty = True
+        if self.plots_dirty and self.is_full_view_visible():
+            self.plots_dirty = False
+            self.update_plot()
+
+    def replay_tick(self):
+        if self.replay.tick(self.replay_event, REPLAY_FRAME_BUDGET_NS):
+            self.render_replay_frame()
+
+    def replay_seek(self, position_ns):
+        self.replay.seek(position_ns, self.replay_event, on_rewind=self.reset_replay_view)
+        self.render_replay_frame()
+
+    def stop_replay(self):
+        """ 退出回放：恢复检测器设置并重新载入当前玩家的实时会话与历史 """
+        if self.replay is None:
+            return
+        self.replay = None
+        self.replay_dialog = None
+        self.replay_records = []
+        self.detector.on_log = self.log_message
+        self.detector.on_key_state = self.key_state_signal.emit
+        self.detector.set_key_mappings(self.replay_saved_mappings)
+        self.log_message("回放结束，恢复实时练习。")
+        self.switch_profile(self.profile)
+
+    def save_profile_settings(self):
+        if self.profile is None:
+            return
+        self.profile.settings.update({
+            'key_mappings': dict(self.detector.key_mappings),
+            'filter_threshold': self.filter_threshold,
+            'perfect_threshold_us': self.detector.perfect_threshold_us,
+            'record_count': self.record_count,
+        })
+        try:
+            self.profile.save()
+        except OSError as e:
+            self.log_message(f"保存玩家设置失败: {e}")
+
+    def show_profile_dialog(self):
+        new_option = "新建玩家..."
+        profiles = self.profiles.list_profiles()
+        options = [profile.name for profile in profiles] + [new_option]
+        dialog = OptionDialog("选择玩家档案", options, self)
+        if self.profile:
+            dialog.set_selected_option(self.profile.name)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        selected = dialog.get_selected_option()
+        if selected == new_option:
+            name, ok = QInputDialog.getText(self, "新建玩家", "玩家名称:")
+            name = name.strip()
+            if not ok or not name:
+                return
+            if self.profiles.find(name):
+                QMessageBox.warning(self, "新建玩家", f"玩家 {name} 已存在。")
+                return
+            profile = self.profiles.create(name)
+        else:
+            profile = next((p for p in profiles if p.name == selected), None)
+        if profile is not None and (self.profile is None or profile.id != self.profile.id):
+            self.switch_profile(profile)
+
     def set_record_count(self):
         options = ["10次", "20次", "50次", "100次", "200次"]
         current_option = f"{self.record_count}次"
@@ -1105,8 +2122,10 @@ class MainWindow(QMainWindow):
                     new_count = int(selected.replace("次", ""))
                     if new_count > 0:
                         self.record_count = new_count
+                        self.record_store.refilter(maxlen=self.chart_view_size())
+                        self.save_profile_settings()
                         self.log_message(f"图表记录次数已设置为 {self.record_count} 次。")
-                        self.update_plot()
+                        self.refresh_after_refilter()
                     else: QMessageBox.warning(self, "无效输入", "记录次数必须大于 0。")
                 except ValueError: QMessageBox.warning(self, "无效输入", "无法解析选择的次数。")
 
@@ -1123,7 +2142,11 @@ class MainWindow(QMainWindow):
                     new_threshold = int(selected.replace("ms", ""))
                     if new_threshold >= 0:
                         self.filter_threshold = new_threshold
-                        self.log_message(f"过滤阈值已设置为 {self.filter_threshold}ms。")
+                        self.save_profile_settings()
+                        kept = ", ".join(f"{axis} {self.record_store.accepted_count(axis)}/{self.record_store.candidate_count(axis)}"
+                                         for axis in self.record_store.axes)
+                        self.log_message(f"过滤阈值已设置为 {self.filter_threshold}ms，已重新筛选历史记录 (有效/候选: {kept})。")
+                        self.refresh_after_refilter()
                     else: QMessageBox.warning(self, "无效输入", "过滤阈值必须大于或等于 0。")
                 except ValueError: QMessageBox.warning(self, "无效输入", "无法解析选择的阈值。")
 
@@ -1136,6 +2159,17 @@ class MainWindow(QMainWindow):
                 if self.listener.is_alive(): self.log_message("警告：键盘监听器线程未能及时停止。")
                 else: self.log_message("键盘监听器已停止。")
             except Exception as e: self.log_message(f"停止监听器时出错: {e}")
+        if self.feed_server:
+            self.feed_server.stop()
+        if self.mini_overlay:
+            self.mini_overlay.close()
+        if self.profiler.is_running():
+            self.profiler.stop()
+        self.heartbeat_timer.stop()
+        self.watchdog.stop()
+        deadline = time.monotonic() + WRITER_CLOSE_TIMEOUT_S
+        for writer in self.close_history_writer():
+            writer.join(max(0, deadline - time.monotonic()))
         event.accept()
 
 def main():
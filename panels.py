@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 主界面与经典视图共用的非模态面板
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QDockWidget, QTextBrowser
+
+
+class TextPanel(QDockWidget):
+    """ 可停靠的非模态文本面板 (急停详情、急停建议)，关闭只是隐藏，内容由主窗口更新 """
+    def __init__(self, title, object_name, parent=None):
+        super().__init__(title, parent)
+        self.setObjectName(object_name)
+        self.setFeatures(QDockWidget.DockWidgetClosable | QDockWidget.DockWidgetMovable | QDockWidget.DockWidgetFloatable)
+        self.setMinimumWidth(320)
+        self.browser = QTextBrowser(self)
+        self.browser.setFont(QFont("Microsoft YaHei", 10))
+        self.setWidget(self.browser)
+        self.text = None
+
+    def set_text(self, text):
+        """ 内容变化时才替换，并保留滚动位置 """
+        if text == self.text:
+            return
+        self.text = text
+        scroll_bar = self.browser.verticalScrollBar()
+        position = scroll_bar.value()
+        self.browser.setPlainText(text)
+        scroll_bar.setValue(position)
+
+    def present(self):
+        self.show()
+        self.raise_()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 进程内采样分析器
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    """
+    低开销的统计采样分析器。
+    后台线程按固定间隔通过 sys._current_frames() 抓取目标线程的调用栈，
+    停止后输出 collapsed-stack 格式 (flamegraph.pl / speedscope 可直接读取)。
+    """
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.targets = {}
+        self.stacks = Counter()
+        self.sample_count = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._labels = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, targets):
+        """ targets: {线程名: 线程 ident}，ident 为 None 的线程会被忽略 """
+        if self.is_running():
+            return
+        self.targets = {name: ident for name, ident in targets.items() if ident is not None}
+        self.stacks.clear()
+        self.sample_count = 0
+        self.started_at = time.perf_counter()
+        self.stopped_at = None
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.is_running():
+            return
+        self._stop_event.set()
+        self._thread.join(1.0)
+        self._thread = None
+        self.stopped_at = time.perf_counter()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _run(self):
+        next_sample = time.perf_counter()
+        while not self._stop_event.is_set():
+            frames = sys._current_frames()
+            for name, ident in self.targets.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                depth = 0
+                while frame is not None and depth < self.max_depth:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                    depth += 1
+                stack.append(name)
+                stack.reverse()
+                self.stacks[';'.join(stack)] += 1
+            del frames
+            self.sample_count += 1
+            next_sample += self.interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                self._stop_event.wait(delay)
+            else:
+                next_sample = time.perf_counter()  # 落后时不补采，避免突发占用
+
+    def duration(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.stopped_at or time.perf_counter()) - self.started_at
+
+    def write_collapsed(self, path):
+        """ 写出 collapsed-stack 文件：每行 '线程;外层;...;内层 次数' """
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        return path
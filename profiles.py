@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 玩家档案与持久化历史记录
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import json
+import os
+import struct
+import threading
+import time
+
+from detector import AXIS_KEYS, DEFAULT_FILTER_THRESHOLD, DEFAULT_MIN_RECORD_INTERVAL_NS, PERF_TO_WALL_OFFSET_NS, PERFECT_THRESHOLD_US
+from journal import JournalWriter, encode_record, read_journal, recover_journal, FILE_HEADER, JOURNAL_MAGIC, JOURNAL_VERSION
+from rollups import RollupStore
+from history_db import DB_FILE, SqliteHistory, SqliteHistoryWriter
+from replay import EventRecorder
+from stations import StationPublisher, open_transport
+
+PROFILE_FILE = 'profile.json'
+SESSIONS_DIR = 'sessions'
+EVENTS_DIR = 'events'
+ROLLUP_FILE = 'rollups.npz'
+SESSION_PREFIX = 's' # 一次会话 (一次打开写入端) 的原始记录
+MERGED_PREFIX = 'm' # 压缩后合并的原始记录，其中的会话都已并入汇总
+SEGMENT_SUFFIX = '.wal'
+BACKEND_JOURNAL = 'journal' # 每场会话一个预写日志文件 (默认)
+BACKEND_SQLITE = 'sqlite' # 所有档案共用档案根目录下的 history.db
+HISTORY_RECORD = struct.Struct('<2sqq') # 轴, 墙上时间 ns, 时间差 us
+ACTIVE_FILE = 'active'
+DEFAULT_PROFILE_NAME = '默认玩家'
+DEFAULT_RETENTION_DAYS = 30 # 原始记录保留天数，更早的只保留按分钟/按场次的汇总
+DAY_NS = 86_400_000_000_000
+
+_history_locks = {}
+_history_locks_guard = threading.Lock()
+
+
+def history_lock(directory):
+    """ 同一档案的恢复/读取/压缩互斥 (快速来回切换档案时可能有多个后台线程) """
+    with _history_locks_guard:
+        return _history_locks.setdefault(directory, threading.Lock())
+
+
+def default_settings(name):
+    return {
+        'name': name,
+        'key_mappings': {key: key for keys in AXIS_KEYS.values() for key in keys},
+        'filter_threshold': DEFAULT_FILTER_THRESHOLD,
+        'perfect_threshold_us': PERFECT_THRESHOLD_US,
+        'cooldown_ms': {axis: DEFAULT_MIN_RECORD_INTERVAL_NS // 1_000_000 for axis in AXIS_KEYS},
+        'debounce_ms': {axis: 0 for axis in AXIS_KEYS},
+        'record_count': 20,
+        'retention_days': DEFAULT_RETENTION_DAYS,
+        'history_backend': BACKEND_JOURNAL,
+        'record_events': True,
+        'publish_to': None, # 发送到汇总端 (hub.py) 的地址，例如 'udp://239.255.42.99:8766' 或 'tcp://汇总机:8766'
+        'created': int(time.time()),
+    }
+
+
+def rate_limits_ns(limits_ms):
+    """ 把档案中按轴的冷却/去抖设置 {轴: 毫秒} 换算为检测器使用的 {轴: 纳秒}，None 原样返回 (表示不修改) """
+    if limits_ms is None:
+        return None
+    return {axis: round(ms * 1_000_000) for axis, ms in limits_ms.items()}
+
+
+def write_json_atomic(path, data):
+    """ 先写临时文件再替换，避免写入中途崩溃留下半个文件 """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class Profile:
+    """
+    一个玩家档案：
+      profile.json  设置
+      sessions/     原始急停记录，每次会话一个预写日志文件 (s*.wal)，压缩后合并为 m*.wal
+      rollups.npz   全部历史的按分钟/按场次汇总 (RollupStore)
+      events/       原始按键事件录制 (e*.wal，用于回放)，超过保留期后删除
+    设置 history_backend 为 'sqlite' 时原始记录改为写入档案根目录下共用的 history.db (见 history_db.py)，
+    不按保留期删除，汇总仍保存在 rollups.npz。
+    """
+    def __init__(self, directory, settings):
+        self.directory = directory
+        self.settings = settings
+
+    @property
+    def id(self):
+        return os.path.basename(self.directory)
+
+    @property
+    def name(self):
+        return self.settings['name']
+
+    @property
+    def sessions_dir(self):
+        return os.path.join(self.directory, SESSIONS_DIR)
+
+    @property
+    def events_dir(self):
+        return os.path.join(self.directory, EVENTS_DIR)
+
+    @property
+    def rollup_path(self):
+        return os.path.join(self.directory, ROLLUP_FILE)
+
+    def save(self):
+        write_json_atomic(os.path.join(self.directory, PROFILE_FILE), self.settings)
+
+    def segments(self):
+        """ 当前所有原始记录文件 (按文件名即创建时间排序) """
+        try:
+            names = os.listdir(self.sessions_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(os.path.join(self.sessions_dir, name) for name in names
+                      if name.endswith(SEGMENT_SUFFIX) and name[:1] in (SESSION_PREFIX, MERGED_PREFIX))
+
+    @property
+    def backend(self):
+        return self.settings.get('history_backend', BACKEND_JOURNAL)
+
+    @property
+    def db_path(self):
+        return os.path.join(os.path.dirname(self.directory), DB_FILE)
+
+    @property
+    def retention_ns(self):
+        return self.settings.get('retention_days', DEFAULT_RETENTION_DAYS) * DAY_NS
+
+    def history_snapshot(self):
+        """
+        在打开本次会话的写入端之前调用，标记"以前的会话"：
+        预写日志后端为已有的原始记录文件列表，SQLite 后端为最近一场会话的 id。
+        """
+        if self.backend == BACKEND_SQLITE:
+            return SqliteHistory(self.db_path).last_session(self.id)
+        return self.segments()
+
+    def open_writer(self, on_error=None, **journal_options):
+        """ 为本次会话打开写入端 (新的原始记录文件或新的数据库会话)，journal_options 传给 JournalWriter """
+        if self.backend == BACKEND_SQLITE:
+            return SqliteHistoryWriter(self.db_path, self.id, on_error=on_error)
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        path = os.path.join(self.sessions_dir, f"{SESSION_PREFIX}{time.time_ns():x}{SEGMENT_SUFFIX}")
+        return HistoryWriter(path, on_error=on_error, **journal_options)
+
+    def open_publisher(self, on_error=None):
+        """ 按设置 publish_to 打开发送到汇总端的 StationPublisher，未设置时返回 None，地址无效时抛出 ValueError """
+        address = self.settings.get('publish_to')
+        if not address:
+            return None
+        return StationPublisher(open_transport(address), self.name, on_error=on_error)
+
+    def open_recorder(self, ring, key_filter=None, **journal_options):
+        """ 为本次会话新建原始按键事件录制文件，设置 record_events 关闭时返回 None """
+        if not self.settings.get('record_events', True):
+            return None
+        os.makedirs(self.events_dir, exist_ok=True)
+        path = os.path.join(self.events_dir, f"e{time.time_ns():x}{SEGMENT_SUFFIX}")
+        metadata = {
+            'profile': self.id,
+            'name': self.name,
+            'key_mappings': self.settings['key_mappings'],
+            'filter_threshold': self.settings['filter_threshold'],
+            'perfect_threshold_us': self.settings['perfect_threshold_us'],
+            'cooldown_ms': self.settings['cooldown_ms'],
+            'debounce_ms': self.settings['debounce_ms'],
+            'started_ns': time.time_ns(),
+        }
+        return EventRecorder(path, ring, metadata, key_filter, **journal_options)
+
+    def prune_event_logs(self, now_ns=None):
+        """ 删除最后修改时间超出保留期的录制文件，返回删除的文件数 """
+        cutoff_ns = (time.time_ns() if now_ns is None else now_ns) - self.retention_ns
+        removed = 0
+        try:
+            names = os.listdir(self.events_dir)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            path = os.path.join(self.events_dir, name)
+            if name.endswith(SEGMENT_SUFFIX) and os.stat(path).st_mtime_ns < cutoff_ns:
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def load_history(self, snapshot):
+        """
+        读取 snapshot 标记的以前的会话 (预写日志后端会先恢复文件，截掉崩溃留下的残尾)。
+        返回 ({轴: [(perf_counter_ns 时间, 时间差 us), ...]}, 截掉的字节数)。
+        """
+        if self.backend == BACKEND_SQLITE:
+            return SqliteHistory(self.db_path).load(self.id, time.time_ns() - self.retention_ns, snapshot), 0
+        with history_lock(self.directory):
+            recovered = sum(recover_journal(path)[1] for path in snapshot)
+            history = read_segments(snapshot)
+        return to_perf_time(history), recovered
+
+    def load_rollups(self):
+        return RollupStore.load(self.rollup_path)
+
+    def compact(self, snapshot, now_ns=None):
+        """
+        把 snapshot 标记的以前的会话并入汇总。预写日志后端同时合并文件并丢弃超出保留期的原始记录 (见 compact_history)；
+        SQLite 后端只汇总，原始记录留在数据库中。
+        """
+        with history_lock(self.directory):
+            if self.backend == BACKEND_SQLITE:
+                return fold_sqlite_sessions(SqliteHistory(self.db_path), self.id, snapshot, self.rollup_path,
+                                            self.settings['perfect_threshold_us'])
+            return compact_history(self.sessions_dir, self.rollup_path, snapshot, self.retention_ns,
+                                   self.settings['perfect_threshold_us'], now_ns)
+
+    def worst_stops(self, axis, since_ns, limit=50, max_abs_us=None):
+        """ since_ns (墙上时间) 之后 |时间差| 最大的几次急停，只有 SQLite 后端支持，否则返回 None """
+        if self.backend != BACKEND_SQLITE:
+            return None
+        return SqliteHistory(self.db_path).worst_stops(self.id, axis, since_ns, limit, max_abs_us)
+
+
+class HistoryWriter:
+    """
+    历史记录写入端：每条急停编码为一条定长负载写入预写日志，落盘由 JournalWriter 的后台线程完成。
+    文件只追加不改写，其他进程/线程可以在写入的同时安全读取已写完的记录。
+    """
+    def __init__(self, path, **journal_options):
+        self.path = path
+        self.journal = JournalWriter(path, **journal_options)
+
+    def append(self, axis, time_ns, diff_us):
+        """ time_ns 为 perf_counter_ns 时间戳，落盘时换算为墙上时间以便跨会话比较 """
+        self.journal.append(HISTORY_RECORD.pack(axis.encode('ascii'), time_ns + PERF_TO_WALL_OFFSET_NS, diff_us))
+
+    def stats(self):
+        return self.journal.stats()
+
+    def close(self):
+        self.journal.close()
+
+    def join(self, timeout=None):
+        self.journal.join(timeout)
+
+
+def decode_history(payloads, history=None):
+    """ 把日志负载解码并追加到 {轴: [(墙上时间 ns, 时间差 us), ...]} """
+    history = {} if history is None else history
+    for payload in payloads:
+        if len(payload) != HISTORY_RECORD.size:
+            continue
+        axis, wall_ns, diff_us = HISTORY_RECORD.unpack(payload)
+        history.setdefault(axis.decode('ascii', errors='replace'), []).append((wall_ns, diff_us))
+    return history
+
+
+def read_segments(paths):
+    """
+    读取多个原始记录文件，返回按时间排序、去掉完全重复记录的 {轴: [(墙上时间 ns, 时间差 us), ...]}。
+    (压缩在删除旧文件前崩溃时，合并文件与旧文件会有重复记录)
+    """
+    history = {}
+    for path in paths:
+        decode_history(read_journal(path), history)
+    return {axis: sorted(set(entries)) for axis, entries in history.items()}
+
+
+def to_perf_time(history):
+    return {axis: [(wall_ns - PERF_TO_WALL_OFFSET_NS, diff_us) for wall_ns, diff_us in entries]
+            for axis, entries in history.items()}
+
+
+def read_history(path):
+    """ 读取单个原始记录文件，返回 {轴: [(perf_counter_ns 时间, 时间差 us), ...]}；可在写入的同时读取 """
+    return to_perf_time(read_segments([path]))
+
+
+def write_segment(path, history):
+    """ 把 {轴: [(墙上时间 ns, 时间差 us), ...]} 按时间顺序写成一个新的日志文件 (先写临时文件再替换) """
+    entries = sorted((wall_ns, axis, diff_us) for axis, items in history.items() for wall_ns, diff_us in items)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(FILE_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION))
+        f.write(b''.join(encode_record(HISTORY_RECORD.pack(axis.encode('ascii'), wall_ns, diff_us))
+                         for wall_ns, axis, diff_us in entries))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def compact_history(sessions_dir, rollup_path, segments, retention_ns, perfect_threshold_us, now_ns=None):
+    """
+    压缩已关闭的原始记录文件 (不能包含正在写入的文件)：
+      1. 尚未汇总的会话文件逐个并入 rollups.npz (按分钟与按场次)，并记下已汇总的文件 id
+      2. 保留期内的原始记录合并写入一个新的 m*.wal，更早的原始记录丢弃
+      3. 删除旧文件
+    每一步都可以在崩溃后安全重跑：汇总与已汇总 id 一起原子写入，重复的原始记录在读取时去掉。
+    返回统计字典，没有需要压缩的内容时返回 None。
+    """
+    now_ns = time.time_ns() if now_ns is None else now_ns
+    cutoff_ns = now_ns - retention_ns
+    rollups = RollupStore.load(rollup_path)
+    segment_ids = {path: os.path.basename(path)[:-len(SEGMENT_SUFFIX)] for path in segments}
+    unfolded = [path for path in segments
+                if segment_ids[path].startswith(SESSION_PREFIX) and segment_ids[path] not in rollups.folded]
+    contents = {path: read_segments([path]) for path in segments}
+    retained = {}
+    dropped = 0
+    for history in contents.values():
+        for axis, entries in history.items():
+            kept = [entry for entry in entries if entry[0] >= cutoff_ns]
+            dropped += len(entries) - len(kept)
+            retained.setdefault(axis, set()).update(kept)
+    if len(segments) < 2 and not unfolded and not dropped:
+        return None
+
+    for path in unfolded:
+        rollups.fold(segment_ids[path], contents[path], perfect_threshold_us)
+    existing = set(segment_ids.values())
+    rollups.folded = {sid for sid in rollups.folded if sid in existing}
+    rollups.save()
+
+    if any(retained.values()):
+        merged_path = os.path.join(sessions_dir, f"{MERGED_PREFIX}{time.time_ns():x}{SEGMENT_SUFFIX}")
+        write_segment(merged_path, retained)
+    for path in segments:
+        os.remove(path)
+    return {
+        'sessions': len(unfolded),
+        'files': len(segments),
+        'retained': sum(len(entries) for entries in retained.values()),
+        'dropped': dropped,
+    }
+
+
+def fold_sqlite_sessions(db, profile_id, last_session, rollup_path, perfect_threshold_us):
+    """ 把数据库中尚未汇总、id 不超过 last_session 的会话并入汇总，汇总 id 为 'q<会话 id>'。没有新会话时返回 None """
+    rollups = RollupStore.load(rollup_path)
+    folded = [int(sid[1:]) for sid in rollups.folded if sid.startswith('q')]
+    pending = db.sessions(profile_id, after=max(folded, default=0), until=last_session)
+    if not pending:
+        return None
+    for session_id in pending:
+        rollups.fold(f"q{session_id}", db.session_history(profile_id, session_id), perfect_threshold_us)
+    rollups.folded = {sid for sid in rollups.folded if not sid.startswith('q')} | {f"q{pending[-1]}"}
+    rollups.save()
+    return {'sessions': len(pending)}
+
+
+class ProfileManager:
+    """ 管理 root 目录下的玩家档案；列出档案时只读取 profile.json，历史记录按需读取 """
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def list_profiles(self):
+        profiles = []
+        for entry in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, entry)
+            profile = self.load(directory)
+            if profile is not None:
+                profiles.append(profile)
+        return profiles
+
+    def load(self, directory):
+        try:
+            with open(os.path.join(directory, PROFILE_FILE), 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        settings = default_settings(stored.get('name') or os.path.basename(directory))
+        settings.update(stored)
+        return Profile(directory, settings)
+
+    def create(self, name):
+        directory = os.path.join(self.root, f"p{time.time_ns():x}")
+        os.makedirs(directory)
+        profile = Profile(directory, default_settings(name))
+        profile.save()
+        return profile
+
+    def find(self, name):
+        for profile in self.list_profiles():
+            if profile.name == name:
+                return profile
+        return None
+
+    def active_profile(self):
+        """ 返回上次使用的档案，不存在时返回第一个档案或新建默认档案 """
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE), 'r', encoding='utf-8') as f:
+                profile = self.load(os.path.join(self.root, f.read().strip()))
+            if profile is not None:
+                return profile
+        except OSError:
+            pass
+        profiles = self.list_profiles()
+        return profiles[0] if profiles else self.create(DEFAULT_PROFILE_NAME)
+
+    def set_active(self, profile):
+        with open(os.path.join(self.root, ACTIVE_FILE), 'w', encoding='utf-8') as f:
+            f.write(profile.id)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 原始按键事件录制与回放
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import json
+import struct
+import threading
+import time
+
+from detector import PERF_TO_WALL_OFFSET_NS
+from journal import JournalWriter, read_journal
+
+EVENT_RECORD = struct.Struct('<bq') # 事件类型, 墙上时间 ns；其后为按键字符 (UTF-8)
+SPEED_MAX = 0 # 不按时间表，尽快回放
+
+
+class EventRecorder:
+    """
+    把监听线程写入输入环形缓冲区的原始按键事件录制到预写日志。
+    使用环形缓冲区的独立读者，由后台线程每隔 poll_interval_ms 读取一次，不占用监听线程与 GUI 线程。
+    日志的第一条记录为 JSON 元数据 (档案、按键映射与阈值)，之后每条为一个事件。
+    key_filter 用于只录制映射过的按键 (不录制打字等无关输入)。
+    """
+    def __init__(self, path, ring, metadata, key_filter=None, poll_interval_ms=100, **journal_options):
+        self.path = path
+        self.reader = ring.reader('recorder')
+        self.key_filter = key_filter or (lambda key: True)
+        self.poll_interval = poll_interval_ms / 1000
+        self.journal = JournalWriter(path, **journal_options)
+        self.journal.append(json.dumps(metadata, ensure_ascii=False).encode('utf-8'))
+        self.recorded = 0
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="EventRecorder", daemon=True)
+        self.thread.start()
+
+    def _record_pending(self):
+        for kind, key, timestamp in self.reader.drain():
+            if key is None or not self.key_filter(key):
+                continue
+            self.journal.append(EVENT_RECORD.pack(kind, timestamp + PERF_TO_WALL_OFFSET_NS) + key.encode('utf-8'))
+            self.recorded += 1
+
+    def _run(self):
+        while not self.stopping.wait(self.poll_interval):
+            self._record_pending()
+        self._record_pending()
+        self.journal.close()
+
+    def stats(self):
+        return {'recorded': self.recorded, 'dropped': self.reader.dropped}
+
+    def close(self):
+        """ 通知后台线程录完剩余事件后关闭日志，不等待；需要确认文件已写完时再调用 join() """
+        self.stopping.set()
+
+    def join(self, timeout=None):
+        """ 等待录制线程与日志写入线程结束，timeout 为总等待时间 """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.thread.join(timeout)
+        self.journal.join(None if deadline is None else max(0, deadline - time.monotonic()))
+
+
+def read_event_log(path):
+    """ 读取录制文件，返回 (元数据字典, [(事件类型, 按键字符, perf_counter_ns 时间), ...] 按时间排序) """
+    payloads = read_journal(path)
+    if not payloads:
+        return {}, []
+    try:
+        metadata = json.loads(payloads[0].decode('utf-8'))
+    except ValueError:
+        metadata = {}
+    events = []
+    for payload in payloads[1:]:
+        if len(payload) <= EVENT_RECORD.size:
+            continue
+        kind, wall_ns = EVENT_RECORD.unpack_from(payload)
+        events.append((kind, payload[EVENT_RECORD.size:].decode('utf-8', errors='replace'), wall_ns - PERF_TO_WALL_OFFSET_NS))
+    events.sort(key=lambda event: event[2])
+    return metadata, events
+
+
+class SessionReplayer:
+    """
+    回放时钟与事件游标 (不依赖 Qt)。位置均为相对第一个事件的纳秒数。
+    speed 为 1、10 等倍速时，按墙上时间 × speed 推进；为 SPEED_MAX 时每次 tick 在给定的处理时间预算内尽可能多地推进。
+    """
+    def __init__(self, events):
+        self.events = events
+        self.start_ns = events[0][2] if events else 0
+        self.duration_ns = events[-1][2] - self.start_ns if events else 0
+        self.index = 0 # 下一个要回放的事件
+        self.position_ns = 0
+        self.speed = 1
+        self.playing = False
+        self.anchor_wall_ns = 0
+        self.anchor_position_ns = 0
+
+    def at_end(self):
+        return self.index >= len(self.events)
+
+    def set_speed(self, speed, now_ns=None):
+        self._reanchor(now_ns)
+        self.speed = speed
+
+    def play(self, now_ns=None):
+        if self.at_end():
+            return
+        self.playing = True
+        self._reanchor(now_ns)
+
+    def pause(self):
+        self.playing = False
+
+    def _reanchor(self, now_ns=None):
+        self.anchor_wall_ns = time.perf_counter_ns() if now_ns is None else now_ns
+        self.anchor_position_ns = self.position_ns
+
+    def rewind(self):
+        self.index = 0
+        self.position_ns = 0
+        self._reanchor()
+
+    def seek(self, position_ns, handler, on_rewind=None):
+        """ 定位到 position_ns：向后定位时先调用 on_rewind() 清空状态并从头回放，之后按当前速度继续 """
+        position_ns = max(0, min(position_ns, self.duration_ns))
+        if position_ns < self.position_ns:
+            if on_rewind:
+                on_rewind()
+            self.rewind()
+        self.feed_until(position_ns, handler)
+        self._reanchor()
+
+    def feed_until(self, position_ns, handler, deadline_ns=None):
+        """
+        把相对时间不晚于 position_ns 的事件依次交给 handler(kind, key, timestamp)，返回回放的事件数。
+        给出 deadline_ns (perf_counter_ns) 时，超时后停在最后回放的事件处。
+        """
+        events = self.events
+        end_time = self.start_ns + position_ns
+        fed = 0
+        while self.index < len(events) and events[self.index][2] <= end_time:
+            kind, key, timestamp = events[self.index]
+            handler(kind, key, timestamp)
+            self.index += 1
+            fed += 1
+            if deadline_ns is not None and not fed & 63 and time.perf_counter_ns() >= deadline_ns:
+                position_ns = timestamp - self.start_ns
+                break
+        self.position_ns = min(max(self.position_ns, position_ns), self.duration_ns)
+        if self.at_end():
+            self.playing = False
+        return fed
+
+    def tick(self, handler, budget_ns, now_ns=None):
+        """ 播放中每帧调用一次：推进到当前应到达的位置，最多占用 budget_ns 的处理时间 """
+        if not self.playing:
+            return 0
+        now_ns = time.perf_counter_ns() if now_ns is None else now_ns
+        deadline = now_ns + budget_ns
+        if self.speed == SPEED_MAX:
+            return self.feed_until(self.duration_ns, handler, deadline)
+        target = self.anchor_position_ns + (now_ns - self.anchor_wall_ns) * self.speed
+        fed = self.feed_until(target, handler, deadline)
+        if self.position_ns < min(target, self.duration_ns):
+            self._reanchor() # 处理不过来时从当前位置继续，而不是越积越多
+        return fed
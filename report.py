@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 离线练习报告 (HTML + PNG)
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import argparse
+import hashlib
+import html
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from charts import FONT_FAMILIES, LIGHT_THEME, ChartTemplate
+from detector import AXIS_KEYS, DEFAULT_FILTER_THRESHOLD, PERF_TO_WALL_OFFSET_NS, PERFECT_THRESHOLD_US, QuickStopDetector
+from profiles import EVENTS_DIR, SEGMENT_SUFFIX, DAY_NS, ProfileManager, rate_limits_ns
+from replay import read_event_log
+from ringbuffer import EVENT_PRESS
+from stats import box_stats, diff_colors, summarize_diffs
+
+rcParams['font.sans-serif'] = FONT_FAMILIES # 报告也可能在其他系统上生成
+rcParams['axes.unicode_minus'] = False
+
+REPORT_CACHE_VERSION = 2 # 修改绘图代码后递增，使旧的缓存图片失效
+IMAGES_DIR = 'images'
+CHART_DPI = 100
+AXIS_COLORS = {'AD': ('#1b9e77', '#7570b3'), 'WS': ('#FF7F0E', '#D95F02')} # 填充色, 边框色
+
+
+def default_profiles_root():
+    """ 与主程序相同的档案目录 """
+    return os.path.join(os.environ.get('APPDATA') or os.path.expanduser('~'), 'CS2StopReflex', 'profiles')
+
+
+def find_event_logs(roots, names=None, since_ns=None):
+    """ 列出各档案目录下的录制文件 (文件名 e<开始时间 ns 十六进制>.wal)，可按玩家名与开始时间筛选 """
+    paths = []
+    for root in roots:
+        if not os.path.isdir(root):
+            continue
+        for profile in ProfileManager(root).list_profiles():
+            if names and profile.name not in names and profile.id not in names:
+                continue
+            events_dir = os.path.join(profile.directory, EVENTS_DIR)
+            try:
+                entries = os.listdir(events_dir)
+            except FileNotFoundError:
+                continue
+            for name in entries:
+                if not name.endswith(SEGMENT_SUFFIX):
+                    continue
+                try:
+                    started_ns = int(name[1:-len(SEGMENT_SUFFIX)], 16)
+                except ValueError:
+                    continue
+                if since_ns is None or started_ns >= since_ns:
+                    paths.append(os.path.join(events_dir, name))
+    return sorted(paths)
+
+
+def analyze_session(path):
+    """
+    在工作进程中分析一场录制：按录制时的按键映射、阈值与冷却/去抖设置重跑检测器，
+    同时统计每个逻辑按键的按住时长。返回只含基本类型的字典，时间为墙上时间 ns。
+    """
+    metadata, events = read_event_log(path)
+    stops = {}
+
+    def on_record(record):
+        stops.setdefault(record['key_type'], []).append((record['event_time'] + PERF_TO_WALL_OFFSET_NS, record['time_diff_us']))
+
+    detector = QuickStopDetector(key_mappings=metadata.get('key_mappings'),
+                                 filter_threshold=metadata.get('filter_threshold', DEFAULT_FILTER_THRESHOLD),
+                                 perfect_threshold_us=metadata.get('perfect_threshold_us', PERFECT_THRESHOLD_US),
+                                 on_record=on_record)
+    detector.set_rate_limits(rate_limits_ns(metadata.get('cooldown_ms')), rate_limits_ns(metadata.get('debounce_ms')))
+    pressed_at = {}
+    dwell = {key: [] for key in detector.keys}
+    for kind, original_key_char, timestamp in events:
+        detector.expire_overdue(timestamp)
+        key_char = detector.reverse_key_mappings.get(original_key_char)
+        if key_char is None:
+            continue
+        if kind == EVENT_PRESS:
+            pressed_at.setdefault(key_char, timestamp)
+            detector.press(original_key_char, timestamp)
+        else:
+            press_time = pressed_at.pop(key_char, None)
+            if press_time is not None:
+                dwell[key_char].append((timestamp - press_time) // 1000)
+            detector.release(original_key_char, timestamp)
+    return {
+        'path': path,
+        'profile': metadata.get('profile') or os.path.basename(os.path.dirname(os.path.dirname(path))),
+        'name': metadata.get('name') or metadata.get('profile') or '未知玩家',
+        'started_ns': metadata.get('started_ns') or (events[0][2] + PERF_TO_WALL_OFFSET_NS if events else 0),
+        'filter_threshold': detector.filter_threshold,
+        'perfect_threshold_us': detector.perfect_threshold_us,
+        'events': len(events),
+        'stops': stops,
+        'dwell': dwell,
+    }
+
+
+def session_label(started_ns):
+    return time.strftime("%m-%d %H:%M", time.localtime(started_ns // 1_000_000_000))
+
+
+def chart_tasks(sessions):
+    """
+    为一个玩家的全部会话 (按开始时间排序) 生成图表任务 [(类型, 数据)]。
+    数据只含基本类型，既传给工作进程绘图，也用于计算缓存键。
+    """
+    filter_threshold = max(s['filter_threshold'] for s in sessions)
+    perfect_threshold_us = sessions[-1]['perfect_threshold_us']
+    labels = [session_label(s['started_ns']) for s in sessions]
+    axes = {}
+    for axis in AXIS_KEYS:
+        per_session = [[diff for _, diff in s['stops'].get(axis, ())] for s in sessions]
+        if any(per_session):
+            axes[axis] = per_session
+    common = {'filter_threshold': filter_threshold, 'perfect_threshold_us': perfect_threshold_us}
+    tasks = [
+        ('line', dict(common, axes=axes)),
+        ('box', dict(common, axes=axes, labels=labels)),
+        ('histogram', dict(common, axes=axes)),
+        ('trend', dict(common, axes=axes, labels=labels)),
+        ('dwell', {'keys': {key: sorted(d for s in sessions for d in s['dwell'].get(key, ())) for key in
+                            (k for keys in AXIS_KEYS.values() for k in keys)}}),
+    ]
+    return tasks
+
+
+def chart_key(kind, data):
+    """ 图表缓存键：绘图代码版本 + 图表类型 + 输入数据的哈希 """
+    return hashlib.sha256(pickle.dumps((REPORT_CACHE_VERSION, kind, data), protocol=4)).hexdigest()[:32]
+
+
+def _draw_line(charts, data):
+    for chart, (axis, per_session) in zip(charts, data['axes'].items()):
+        ax = chart.begin()
+        diffs_us = np.fromiter((d for session in per_session for d in session), dtype=np.int64)
+        chart.set_title(f'{axis} 急停时间差 (共 {diffs_us.size} 次，竖线分隔各场)')
+        stats = summarize_diffs(diffs_us, data['filter_threshold'], data['perfect_threshold_us'])
+        indices = np.arange(1, diffs_us.size + 1)
+        ax.scatter(indices, stats['values_ms'], s=12,
+                   c=diff_colors(diffs_us, data['filter_threshold'] * 1000, data['perfect_threshold_us']))
+        ax.axhline(stats['mean'], color='tab:blue', linestyle='--', linewidth=1.2, label=f"平均值: {stats['mean']:.1f}ms")
+        ax.axhline(0, color='black', linewidth=0.8)
+        for boundary in np.cumsum([len(session) for session in per_session])[:-1]:
+            ax.axvline(boundary + 0.5, color='gray', linewidth=0.6, alpha=0.5)
+        chart.legend()
+
+
+def _draw_box(charts, data):
+    for chart, (axis, per_session) in zip(charts, data['axes'].items()):
+        ax = chart.begin()
+        chart.set_title(f'{axis} 每场时间差分布')
+        boxes, positions = [], []
+        for i, session in enumerate(per_session):
+            values_ms = np.asarray(session, dtype=np.int64) / 1000
+            if values_ms.size >= 5:
+                boxes.append(box_stats(values_ms))
+                positions.append(i + 1)
+        if not boxes:
+            chart.show_empty(f'{axis} 数据不足')
+            continue
+        fill, edge = AXIS_COLORS[axis]
+        bp = ax.bxp(boxes, positions=positions, patch_artist=True, showfliers=False, widths=0.6, manage_ticks=False)
+        for box in bp['boxes']: box.set(color=edge, linewidth=1.2, facecolor=fill, alpha=0.7)
+        for whisker in bp['whiskers']: whisker.set(color=edge, linewidth=1.2, linestyle='--')
+        ax.axhline(0, color='black', linewidth=0.8)
+        ax.set_xlim(0.5, len(per_session) + 0.5)
+        ax.set_xticks(range(1, len(per_session) + 1))
+        ax.set_xticklabels(data['labels'], rotation=45, ha='right', fontsize=8)
+
+
+def _draw_histogram(charts, data):
+    chart, = charts
+    ax = chart.begin()
+    limit_ms = data['filter_threshold']
+    edges = np.arange(-limit_ms, limit_ms + 2, 2)
+    for axis, per_session in data['axes'].items():
+        values_ms = np.fromiter((d for session in per_session for d in session), dtype=np.int64) / 1000
+        ax.hist(values_ms, bins=edges, alpha=0.6, color=AXIS_COLORS[axis][0], label=f'{axis} ({values_ms.size} 次)')
+    perfect_ms = data['perfect_threshold_us'] / 1000
+    ax.axvspan(-perfect_ms, perfect_ms, color='lightgreen', alpha=0.3, label='完美范围')
+    chart.legend()
+
+
+def _draw_trend(charts, data):
+    mean_chart, rate_chart = charts
+    ax, rate_ax = mean_chart.begin(), rate_chart.begin()
+    x = np.arange(1, len(data['labels']) + 1)
+    for axis, per_session in data['axes'].items():
+        fill, edge = AXIS_COLORS[axis]
+        means, stds, rates = [], [], []
+        for session in per_session:
+            stats = summarize_diffs(session, data['filter_threshold'], data['perfect_threshold_us'])
+            means.append(stats['mean'] if stats['count'] else np.nan)
+            stds.append(stats['stdev'] if stats['count'] else np.nan)
+            rates.append(100 * stats['perfect'] / stats['count'] if stats['count'] else np.nan)
+        means, stds = np.array(means), np.array(stds)
+        ax.plot(x, means, marker='o', color=edge, label=f'{axis} 平均值')
+        ax.fill_between(x, means - stds, means + stds, color=fill, alpha=0.2, label=f'{axis} ±1 标准差')
+        rate_ax.plot(x, rates, marker='o', color=edge, label=f'{axis} 完美率')
+    ax.axhline(0, color='black', linewidth=0.8)
+    mean_chart.legend(size=8)
+    rate_chart.legend(size=8)
+    rate_ax.set_xticks(x)
+    rate_ax.set_xticklabels(data['labels'], rotation=45, ha='right', fontsize=8)
+
+
+def _draw_dwell(charts, data):
+    chart, = charts
+    ax = chart.begin()
+    keys = [key for key, values in data['keys'].items() if len(values) >= 5]
+    if not keys:
+        chart.show_empty('按键数据不足')
+        return
+    boxes = [box_stats(np.asarray(data['keys'][key], dtype=np.int64) / 1000) for key in keys]
+    bp = ax.bxp(boxes, patch_artist=True, showfliers=False, widths=0.6, manage_ticks=False)
+    for key, box in zip(keys, bp['boxes']):
+        fill, edge = AXIS_COLORS['AD' if key in AXIS_KEYS['AD'] else 'WS']
+        box.set(color=edge, linewidth=1.2, facecolor=fill, alpha=0.7)
+    ax.set_xlim(0.5, len(keys) + 0.5)
+    ax.set_xticks(range(1, len(keys) + 1))
+    ax.set_xticklabels([f"{key} ({len(data['keys'][key])} 次)" for key in keys])
+
+
+def _line_layout(fig, rows):
+    return [ChartTemplate(fig.add_subplot(rows, 1, row + 1), LIGHT_THEME, xlabel='操作次数', ylabel='时间差 (ms)')
+            for row in range(rows)]
+
+
+def _box_layout(fig, rows):
+    return [ChartTemplate(fig.add_subplot(rows, 1, row + 1), LIGHT_THEME, ylabel='时间差 (ms)') for row in range(rows)]
+
+
+def _histogram_layout(fig, rows):
+    return [ChartTemplate(fig.add_subplot(111), LIGHT_THEME, title='时间差直方图 (2ms 分箱)', xlabel='时间差 (ms)', ylabel='次数')]
+
+
+def _trend_layout(fig, rows):
+    mean_ax = fig.add_subplot(211)
+    mean_ax.tick_params(labelbottom=False)
+    return [ChartTemplate(mean_ax, LIGHT_THEME, title='每场平均值与波动趋势', ylabel='时间差 (ms)'),
+            ChartTemplate(fig.add_subplot(212, sharex=mean_ax), LIGHT_THEME, title='每场完美急停比例', ylabel='完美率 (%)')]
+
+
+def _dwell_layout(fig, rows):
+    return [ChartTemplate(fig.add_subplot(111), LIGHT_THEME, title='各按键按住时长', ylabel='按住时长 (ms)')]
+
+
+# 图表类型: (子图布局, 绘制函数, 图片尺寸)；line/box 每个有数据的轴一行子图
+CHARTS = {
+    'line': (_line_layout, _draw_line, (10, 6)),
+    'box': (_box_layout, _draw_box, (10, 6)),
+    'histogram': (_histogram_layout, _draw_histogram, (10, 4)),
+    'trend': (_trend_layout, _draw_trend, (10, 6)),
+    'dwell': (_dwell_layout, _draw_dwell, (8, 4)),
+}
+
+_figures = {} # 工作进程内按 (图表类型, 子图行数) 复用的 Figure 与模板，样式只设置一次
+
+
+def _chart_figure(kind, rows):
+    key = (kind, rows)
+    if key not in _figures:
+        layout, _, size = CHARTS[kind]
+        fig = Figure(figsize=size, dpi=CHART_DPI)
+        FigureCanvasAgg(fig)
+        _figures[key] = (fig, layout(fig, rows))
+    return _figures[key]
+
+
+def render_chart(kind, data, path):
+    """ 在工作进程中用 Agg 绘制一张图表并写入 path (先写临时文件再替换，中断时不会留下半张图) """
+    if kind in ('line', 'box') and not data['axes']:
+        fig, charts = _chart_figure(kind, 1)
+        charts[0].begin()
+        charts[0].set_title('无数据')
+        charts[0].show_empty('没有急停记录')
+    else:
+        fig, charts = _chart_figure(kind, len(data['axes']) if kind in ('line', 'box') else 1)
+        CHARTS[kind][1](charts, data)
+    fig.tight_layout()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fig.savefig(tmp_path, format='png')
+    os.replace(tmp_path, path)
+    return path
+
+
+def summary_rows(sessions):
+    """ 每场与合计的统计，用于报告中的表格 """
+    rows = []
+    for label, group in [(session_label(s['started_ns']), [s]) for s in sessions] + [('合计', sessions)]:
+        cells = [label, str(sum(s['events'] for s in group))]
+        for axis in AXIS_KEYS:
+            diffs = [diff for s in group for _, diff in s['stops'].get(axis, ())]
+            stats = summarize_diffs(diffs, group[-1]['filter_threshold'], group[-1]['perfect_threshold_us'])
+            cells.append(f"{stats['count']} 次 / {stats['mean']:.1f} ± {stats['stdev']:.1f}ms / "
+                         f"完美 {100 * stats['perfect'] / stats['count'] if stats['count'] else 0:.0f}%")
+        rows.append(cells)
+    return rows
+
+
+def write_player_report(path, name, sessions, images):
+    titles = {'line': '时间差折线图', 'box': '每场箱线图', 'histogram': '时间差直方图', 'trend': '趋势', 'dwell': '按键按住时长'}
+    header = ['会话', '按键事件'] + [f'{axis} 次数 / 平均值 ± 标准差 / 完美率' for axis in AXIS_KEYS]
+    table = "\n".join("<tr>" + "".join(f"<td>{html.escape(cell)}</td>" for cell in row) + "</tr>" for row in summary_rows(sessions))
+    figures = "\n".join(f"<h2>{titles[kind]}</h2>\n<img src=\"{IMAGES_DIR}/{key}.png\" alt=\"{titles[kind]}\">"
+                        for kind, key in images)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"""<!DOCTYPE html>
+<html lang="zh-CN"><head><meta charset="utf-8"><title>{html.escape(name)} - 急停练习报告</title>
+<style>body{{font-family:"Microsoft YaHei",sans-serif;margin:2em}}table{{border-collapse:collapse}}td,th{{border:1px solid #ccc;padding:4px 8px}}img{{max-width:100%}}</style>
+</head><body>
+<h1>{html.escape(name)} - 急停练习报告</h1>
+<p>{len(sessions)} 场练习，生成于 {time.strftime("%Y-%m-%d %H:%M")}</p>
+<table><tr>{"".join(f"<th>{html.escape(cell)}</th>" for cell in header)}</tr>
+{table}
+</table>
+{figures}
+</body></html>
+""")
+
+
+def write_index(path, players):
+    items = "\n".join(f"<li><a href=\"{html.escape(file_name)}\">{html.escape(name)}</a> ({count} 场)</li>"
+                      for file_name, name, count in players)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"""<!DOCTYPE html>
+<html lang="zh-CN"><head><meta charset="utf-8"><title>急停练习报告</title></head><body>
+<h1>急停练习报告</h1>
+<ul>
+{items}
+</ul>
+</body></html>
+""")
+
+
+def generate_reports(paths, out_dir, workers=None):
+    """
+    分析 paths 中的全部录制并为每个玩家生成 <档案 id>.html，图表写入 out_dir/images/<输入哈希>.png。
+    会话分析与图表绘制都在进程池中并行；输入未变的图表直接复用已有图片。返回统计字典。
+    """
+    images_dir = os.path.join(out_dir, IMAGES_DIR)
+    os.makedirs(images_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        sessions = list(pool.map(analyze_session, paths, chunksize=max(1, len(paths) // (4 * workers))))
+        players = {}
+        for session in sessions:
+            players.setdefault(session['profile'], []).append(session)
+
+        pending = []
+        reports = []
+        for profile_id, player_sessions in sorted(players.items()):
+            player_sessions.sort(key=lambda s: s['started_ns'])
+            images = []
+            for kind, data in chart_tasks(player_sessions):
+                key = chart_key(kind, data)
+                image_path = os.path.join(images_dir, f"{key}.png")
+                if not os.path.exists(image_path):
+                    pending.append(pool.submit(render_chart, kind, data, image_path))
+                images.append((kind, key))
+            reports.append((profile_id, player_sessions, images))
+        for future in pending:
+            future.result()
+
+    index = []
+    for profile_id, player_sessions, images in reports:
+        name = player_sessions[-1]['name']
+        file_name = f"{profile_id}.html"
+        write_player_report(os.path.join(out_dir, file_name), name, player_sessions, images)
+        index.append((file_name, name, len(player_sessions)))
+    write_index(os.path.join(out_dir, 'index.html'), index)
+    return {
+        'sessions': len(sessions),
+        'players': len(reports),
+        'charts': sum(len(images) for _, _, images in reports),
+        'rendered': len(pending),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CS2 急停评估工具 - 生成离线练习报告")
+    parser.add_argument('sessions', nargs='*', help="录制文件 (events/e*.wal)；不指定时读取档案目录下的全部录制")
+    parser.add_argument('--root', action='append', help="档案目录，可重复指定以合并多台电脑的数据 (默认为本机档案目录)")
+    parser.add_argument('--player', action='append', help="只包含这些玩家 (名称或档案 id)，可重复指定")
+    parser.add_argument('--days', type=float, default=7, help="只包含最近几天的录制 (指定录制文件时忽略)")
+    parser.add_argument('--out', default='report', help="输出目录")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数 (默认为 CPU 核数)")
+    args = parser.parse_args()
+
+    paths = args.sessions or find_event_logs(args.root or [default_profiles_root()], args.player,
+                                             time.time_ns() - int(args.days * DAY_NS))
+    if not paths:
+        print("没有找到录制文件。")
+        return
+    start = time.perf_counter()
+    result = generate_reports(paths, args.out, args.workers)
+    print(f"{result['players']} 名玩家，{result['sessions']} 场练习，{result['charts']} 张图表 "
+          f"(新绘制 {result['rendered']} 张，其余来自缓存)，耗时 {time.perf_counter() - start:.1f}s")
+    print(f"报告: {os.path.abspath(os.path.join(args.out, 'index.html'))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 监听线程与消费者之间的无锁环形缓冲区
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+from array import array
+
+EVENT_RELEASE = 0
+EVENT_PRESS = 1
+
+
+class SpscRingBuffer:
+    """
+    预分配的单生产者环形缓冲区，按键事件按列存储在定长数组中。
+
+    生产者 (键盘监听线程) 只写入槽位并递增单调序号 write_seq，从不等待；
+    每个消费者通过各自的 RingReader 以自己的节奏读取，被覆盖的事件记为丢弃数。
+    CPython 的 GIL 保证槽位写入先于 write_seq 递增对读者可见。
+    """
+    def __init__(self, capacity=4096):
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError("容量必须是 2 的幂")
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.kinds = array('b', [0]) * capacity
+        self.times = array('q', [0]) * capacity  # perf_counter_ns 整数纳秒
+        self.keys = [None] * capacity
+        self.write_seq = 0
+
+    def push(self, kind, key, timestamp):
+        """ 生产者写入一个事件，常数时间且不分配内存 (key 为已存在的字符串对象) """
+        index = self.write_seq & self.mask
+        self.kinds[index] = kind
+        self.keys[index] = key
+        self.times[index] = timestamp
+        self.write_seq += 1
+
+    def reader(self, name):
+        """ 创建一个从当前位置开始读取的消费者 """
+        return RingReader(self, name)
+
+
+class RingReader:
+    """ 环形缓冲区的独立消费者游标，记录已读序号与被覆盖 (丢弃) 的事件数 """
+    def __init__(self, ring, name):
+        self.ring = ring
+        self.name = name
+        self.read_seq = ring.write_seq
+        self.dropped = 0
+
+    def pending(self):
+        return min(self.ring.write_seq - self.read_seq, self.ring.capacity)
+
+    def drain(self, max_items=None):
+        """ 读取当前可用的事件，返回 [(kind, key, timestamp), ...] """
+        ring = self.ring
+        write_seq = ring.write_seq
+        if write_seq - self.read_seq > ring.capacity:
+            # 生产者已套圈，最旧的事件已被覆盖
+            self.dropped += write_seq - self.read_seq - ring.capacity
+            self.read_seq = write_seq - ring.capacity
+        end = write_seq if max_items is None else min(write_seq, self.read_seq + max_items)
+
+        events = []
+        mask = ring.mask
+        for seq in range(self.read_seq, end):
+            index = seq & mask
+            events.append((ring.kinds[index], ring.keys[index], ring.times[index]))
+
+        # 读取期间若被套圈，开头的若干条可能已被新数据覆盖，丢弃这部分
+        overwritten = ring.write_seq - ring.capacity - self.read_seq
+        if overwritten > 0:
+            overwritten = min(overwritten, len(events))
+            self.dropped += overwritten
+            del events[:overwritten]
+        self.read_seq = end
+        return events
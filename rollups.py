@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 长期历史的按分钟/按场次汇总
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import math
+import os
+
+import numpy as np
+
+from detector import PERFECT_THRESHOLD_US
+
+ROLLUP_VERSION = 1
+MINUTE_NS = 60_000_000_000
+SKETCH_BIN_US = 1000 # 分位数草图的箱宽，分位数误差不超过半个箱宽
+
+
+class Rollup:
+    """
+    一组急停时间差的可合并汇总：次数、均值与 M2 (Welford)、完美/偏早/偏晚次数，
+    以及按 1ms 分箱的稀疏计数 (用于分位数与按阈值过滤)。
+    """
+    __slots__ = ('count', 'mean', 'm2', 'perfect', 'early', 'late', 'sketch', 'start_ns', 'end_ns')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.perfect = 0
+        self.early = 0
+        self.late = 0
+        self.sketch = {}
+        self.start_ns = None
+        self.end_ns = None
+
+    def add(self, wall_ns, diff_us, perfect_threshold_us=PERFECT_THRESHOLD_US):
+        self.count += 1
+        delta = diff_us - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (diff_us - self.mean)
+        if abs(diff_us) <= perfect_threshold_us:
+            self.perfect += 1
+        elif diff_us < 0:
+            self.early += 1
+        else:
+            self.late += 1
+        bin_index = diff_us // SKETCH_BIN_US
+        self.sketch[bin_index] = self.sketch.get(bin_index, 0) + 1
+        self.start_ns = wall_ns if self.start_ns is None else min(self.start_ns, wall_ns)
+        self.end_ns = wall_ns if self.end_ns is None else max(self.end_ns, wall_ns)
+
+    def merge(self, other):
+        """ 并入另一个汇总 (Chan 等人的并行方差合并公式) """
+        if not other.count:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.perfect += other.perfect
+        self.early += other.early
+        self.late += other.late
+        for bin_index, n in other.sketch.items():
+            self.sketch[bin_index] = self.sketch.get(bin_index, 0) + n
+        self.start_ns = other.start_ns if self.start_ns is None else min(self.start_ns, other.start_ns)
+        self.end_ns = other.end_ns if self.end_ns is None else max(self.end_ns, other.end_ns)
+        return self
+
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def quantile(self, q):
+        """ 近似分位数 (us)，取所在箱的中点 """
+        if not self.count:
+            return 0.0
+        target = q * (self.count - 1)
+        seen = 0
+        for bin_index in sorted(self.sketch):
+            seen += self.sketch[bin_index]
+            if seen > target:
+                return (bin_index + 0.5) * SKETCH_BIN_US
+        return (max(self.sketch) + 0.5) * SKETCH_BIN_US
+
+    def within(self, limit_us, perfect_threshold_us=PERFECT_THRESHOLD_US):
+        """
+        只保留 |时间差| 不超过 limit_us 的部分 (按草图分箱近似，每个箱按中点计)。
+        limit_us 覆盖全部数据时直接返回自身，结果是精确的。
+        """
+        if not self.sketch or (max(self.sketch) + 1) * SKETCH_BIN_US <= limit_us and min(self.sketch) * SKETCH_BIN_US >= -limit_us:
+            return self
+        result = Rollup()
+        result.start_ns, result.end_ns = self.start_ns, self.end_ns
+        for bin_index, n in self.sketch.items():
+            center = (bin_index + 0.5) * SKETCH_BIN_US
+            if abs(center) > limit_us:
+                continue
+            part = Rollup()
+            part.count, part.mean = n, center
+            if abs(center) <= perfect_threshold_us:
+                part.perfect = n
+            elif center < 0:
+                part.early = n
+            else:
+                part.late = n
+            part.sketch = {bin_index: n}
+            part.start_ns, part.end_ns = self.start_ns, self.end_ns
+            result.merge(part)
+        return result
+
+
+class RollupTable:
+    """
+    按 key 排序的一列 Rollup，以 NumPy 列存储 (草图为 CSR 形式的 bins/counts + offsets)，
+    区间合并是向量化的，载入与查询的代价与 Python 对象个数无关。
+    key 允许重复 (例如同一分钟内切换过档案的两场会话)。
+    """
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.labels = np.empty(0, dtype='U1') # 拼接时自动扩展为最长标签的长度
+        self.stats = np.empty((0, 6), dtype=np.float64) # count, mean, m2, perfect, early, late
+        self.bounds = np.empty((0, 2), dtype=np.int64) # start_ns, end_ns
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.bins = np.empty(0, dtype=np.int32)
+        self.counts = np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def extend(self, keys, rollups, labels=None):
+        if not rollups:
+            return
+        sketch_sizes = [len(r.sketch) for r in rollups]
+        self.keys = np.concatenate([self.keys, np.asarray(keys, dtype=np.int64)])
+        self.labels = np.concatenate([self.labels, np.asarray(labels if labels is not None else [''] * len(rollups), dtype=str)])
+        self.stats = np.vstack([self.stats, [(r.count, r.mean, r.m2, r.perfect, r.early, r.late) for r in rollups]])
+        self.bounds = np.vstack([self.bounds, [(r.start_ns, r.end_ns) for r in rollups]]).astype(np.int64)
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(sketch_sizes)])
+        self.bins = np.concatenate([self.bins, np.fromiter((k for r in rollups for k in r.sketch), dtype=np.int32)])
+        self.counts = np.concatenate([self.counts, np.fromiter((v for r in rollups for v in r.sketch.values()), dtype=np.int32)])
+        if len(self.keys) > 1 and np.any(np.diff(self.keys) < 0):
+            self._sort()
+
+    def _sort(self):
+        order = np.argsort(self.keys, kind='stable')
+        sketch_index = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in order])
+        sizes = np.diff(self.offsets)[order]
+        self.keys, self.labels = self.keys[order], self.labels[order]
+        self.stats, self.bounds = self.stats[order], self.bounds[order]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.bins, self.counts = self.bins[sketch_index], self.counts[sketch_index]
+
+    def range(self, lo_key=None, hi_key=None):
+        """ 返回 key 在 [lo_key, hi_key) 内的行号范围 """
+        lo = 0 if lo_key is None else int(np.searchsorted(self.keys, lo_key, side='left'))
+        hi = len(self.keys) if hi_key is None else int(np.searchsorted(self.keys, hi_key, side='left'))
+        return lo, max(lo, hi)
+
+    def merged(self, lo=0, hi=None):
+        """ 把 [lo, hi) 行合并为一个 Rollup """
+        hi = len(self.keys) if hi is None else hi
+        result = Rollup()
+        stats = self.stats[lo:hi]
+        counts = stats[:, 0]
+        total = counts.sum()
+        if not total:
+            return result
+        mean = float((counts * stats[:, 1]).sum() / total)
+        result.count = int(total)
+        result.mean = mean
+        result.m2 = float(stats[:, 2].sum() + (counts * (stats[:, 1] - mean) ** 2).sum())
+        result.perfect, result.early, result.late = (int(v) for v in stats[:, 3:6].sum(axis=0))
+        result.start_ns = int(self.bounds[lo:hi, 0].min())
+        result.end_ns = int(self.bounds[lo:hi, 1].max())
+        bins = self.bins[self.offsets[lo]:self.offsets[hi]]
+        unique_bins, inverse = np.unique(bins, return_inverse=True)
+        sums = np.bincount(inverse, weights=self.counts[self.offsets[lo]:self.offsets[hi]])
+        result.sketch = {int(b): int(n) for b, n in zip(unique_bins, sums)}
+        return result
+
+    def row(self, index):
+        return self.merged(index, index + 1)
+
+    def to_arrays(self, prefix):
+        return {f"{prefix}_{name}": getattr(self, name)
+                for name in ('keys', 'labels', 'stats', 'bounds', 'offsets', 'bins', 'counts')}
+
+    @classmethod
+    def from_arrays(cls, data, prefix):
+        table = cls()
+        for name in ('keys', 'labels', 'stats', 'bounds', 'offsets', 'bins', 'counts'):
+            key = f"{prefix}_{name}"
+            if key in data:
+                setattr(table, name, data[key])
+        return table
+
+
+class RollupStore:
+    """
+    某个玩家的长期汇总，保存为一个 .npz 文件：
+      minutes:  {轴: 按分钟的 RollupTable}，用于任意时间范围的查询 (二分定位 + 向量化合并)
+      sessions: {轴: 按开始时间的 RollupTable}，每个原始会话文件对应一场，label 为会话文件 id
+      folded:   已并入汇总的会话文件 id，压缩中途崩溃后重跑时据此避免重复计入
+    时间均为墙上时间 ns。
+    """
+    def __init__(self, path, axes=('AD', 'WS')):
+        self.path = path
+        self.axes = tuple(axes)
+        self.minutes = {axis: RollupTable() for axis in self.axes}
+        self.sessions = {axis: RollupTable() for axis in self.axes}
+        self.folded = set()
+
+    @classmethod
+    def load(cls, path, axes=('AD', 'WS')):
+        store = cls(path, axes)
+        try:
+            with np.load(path) as data:
+                if int(data['version']) != ROLLUP_VERSION:
+                    return store
+                arrays = {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return store
+        for axis in store.axes:
+            store.minutes[axis] = RollupTable.from_arrays(arrays, f"{axis}_minutes")
+            store.sessions[axis] = RollupTable.from_arrays(arrays, f"{axis}_sessions")
+        store.folded = set(arrays['folded'].tolist())
+        return store
+
+    def save(self):
+        arrays = {'version': np.array(ROLLUP_VERSION), 'folded': np.array(sorted(self.folded), dtype=str)}
+        for axis in self.axes:
+            arrays.update(self.minutes[axis].to_arrays(f"{axis}_minutes"))
+            arrays.update(self.sessions[axis].to_arrays(f"{axis}_sessions"))
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def fold(self, session_id, history, perfect_threshold_us=PERFECT_THRESHOLD_US):
+        """ 把一场会话的原始记录 {轴: [(墙上时间 ns, 时间差 us), ...]} 并入按分钟与按场次的汇总 """
+        for axis, entries in history.items():
+            if axis not in self.minutes or not entries:
+                continue
+            session = Rollup()
+            minutes = {}
+            for wall_ns, diff_us in entries:
+                session.add(wall_ns, diff_us, perfect_threshold_us)
+                minute = wall_ns // MINUTE_NS
+                if minute not in minutes:
+                    minutes[minute] = Rollup()
+                minutes[minute].add(wall_ns, diff_us, perfect_threshold_us)
+            keys = sorted(minutes)
+            self.minutes[axis].extend(keys, [minutes[key] for key in keys])
+            self.sessions[axis].extend([session.start_ns], [session], [session_id])
+        self.folded.add(session_id)
+
+    def summary(self, axis, since_ns=None, until_ns=None):
+        """ 合并 [since_ns, until_ns) 范围内的分钟汇总 """
+        table = self.minutes[axis]
+        lo, hi = table.range(None if since_ns is None else since_ns // MINUTE_NS,
+                             None if until_ns is None else -(-until_ns // MINUTE_NS))
+        return table.merged(lo, hi)
+
+    def session_count(self, axis):
+        return len(self.sessions[axis])
+
+    def recent_sessions(self, axis, n):
+        table = self.sessions[axis]
+        return [table.row(i) for i in range(max(0, len(table) - n), len(table))]
@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 多台练习机的急停数据汇总 (发送端与汇总端)
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import asyncio
+import heapq
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+from detector import PERF_TO_WALL_OFFSET_NS, PERFECT_THRESHOLD_US
+
+DEFAULT_GROUP = '239.255.42.99' # 组播地址 (仅本地网络)
+DEFAULT_PORT = 8766
+AXES = ('AD', 'WS')
+AXIS_CODES = {axis: code for code, axis in enumerate(AXES)}
+
+# 一帧 = 帧头 + 练习机名称 (UTF-8) + count 条急停；急停时间以帧头的基准时间为起点按微秒偏移存储
+FRAME_MAGIC = b'QS'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('<2sBBIIqH') # 魔数, 版本, 名称长度, 练习机 id, 帧序号, 基准墙上时间 ns, 条数
+STOP_RECORD = struct.Struct('<IiB') # 相对基准的偏移 us, 时间差 us, 轴
+STREAM_PREFIX = struct.Struct('<I') # TCP 流中每帧前的长度
+MAX_NAME_BYTES = 64
+MAX_BATCH = 128 # 一帧最多的急停数，保证 UDP 数据报不超过常见的 MTU
+MAX_FRAME_SIZE = FRAME_HEADER.size + MAX_NAME_BYTES + MAX_BATCH * STOP_RECORD.size
+
+
+def encode_frame(station_id, seq, name, stops):
+    """ stops: [(轴, 墙上时间 ns, 时间差 us), ...] 按时间排序；返回一帧 bytes """
+    name_bytes = name.encode('utf-8')[:MAX_NAME_BYTES]
+    base_ns = stops[0][1] if stops else 0
+    parts = [FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, len(name_bytes), station_id, seq, base_ns, len(stops)), name_bytes]
+    pack = STOP_RECORD.pack
+    for axis, wall_ns, diff_us in stops:
+        parts.append(pack((wall_ns - base_ns) // 1000, diff_us, AXIS_CODES[axis]))
+    return b''.join(parts)
+
+
+def decode_frame(data):
+    """ 返回 (练习机 id, 帧序号, 名称, [(墙上时间 ns, 轴, 时间差 us), ...])，格式错误时抛出 ValueError """
+    if len(data) < FRAME_HEADER.size:
+        raise ValueError("帧长度不足")
+    magic, version, name_len, station_id, seq, base_ns, count = FRAME_HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION:
+        raise ValueError("不是急停数据帧或版本不兼容")
+    offset = FRAME_HEADER.size + name_len
+    if len(data) != offset + count * STOP_RECORD.size:
+        raise ValueError("帧长度与条数不符")
+    name = data[FRAME_HEADER.size:offset].decode('utf-8', errors='replace')
+    stops = [(base_ns + offset_us * 1000, AXES[axis], diff_us)
+             for offset_us, diff_us, axis in STOP_RECORD.iter_unpack(data[offset:])]
+    return station_id, seq, name, stops
+
+
+def parse_address(address):
+    """ 'udp://组播或主机:端口' / 'tcp://主机:端口' / 'udp' / 'tcp' -> (协议, 主机, 端口) """
+    scheme, _, rest = address.partition('://')
+    scheme = scheme.lower()
+    if scheme not in ('udp', 'tcp'):
+        raise ValueError(f"不支持的地址 '{address}' (应为 udp://组播地址:端口 或 tcp://主机:端口)")
+    host, _, port = rest.rpartition(':') if ':' in rest else (rest, '', '')
+    host = host or (DEFAULT_GROUP if scheme == 'udp' else '127.0.0.1')
+    return scheme, host, int(port) if port else DEFAULT_PORT
+
+
+class UdpTransport:
+    """ 每帧一个数据报，发往组播组 (TTL 1，不出本地网络) 或单播地址；丢失的帧由汇总端按序号计数 """
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+
+    def send(self, frame):
+        self.sock.sendto(frame, self.address)
+
+    def close(self):
+        self.sock.close()
+
+
+class TcpTransport:
+    """ 长度前缀的 TCP 帧流；连接断开后丢弃当前帧，下次发送时重连 """
+    def __init__(self, host, port, timeout=2.0):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.sock = None
+
+    def send(self, frame):
+        if self.sock is None:
+            self.sock = socket.create_connection(self.address, self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            self.sock.sendall(STREAM_PREFIX.pack(len(frame)) + frame)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class LoopbackTransport:
+    """ 进程内的替身：把帧直接交给汇总端 (QuickStopHub.ingest)，走与网络相同的编码与解码 """
+    def __init__(self, hub):
+        self.hub = hub
+
+    def send(self, frame):
+        self.hub.ingest(frame)
+
+    def close(self):
+        pass
+
+
+def open_transport(address):
+    scheme, host, port = parse_address(address)
+    return UdpTransport(host, port) if scheme == 'udp' else TcpTransport(host, port)
+
+
+class StationPublisher:
+    """
+    练习机端：把本机的急停发送给汇总端。
+    publish() 只把一条记录放入内存队列；后台线程每攒够 MAX_BATCH 条或每隔 flush_interval_ms
+    编码为一帧发送，检测/GUI 线程不会等待网络。发送失败只计数，稍后重试连接。
+    """
+    def __init__(self, transport, name, flush_interval_ms=50, on_error=None):
+        self.transport = transport
+        self.name = name
+        self.station_id = int.from_bytes(os.urandom(4), 'little') # 每次启动不同，汇总端据此区分帧序号
+        self.flush_interval = flush_interval_ms / 1000
+        self.on_error = on_error
+        self.pending = []
+        self.condition = threading.Condition()
+        self.closing = False
+        self.seq = 0
+        self.sent = 0
+        self.frames = 0
+        self.failed = 0
+        self.last_error = None
+        self.thread = threading.Thread(target=self._run, name="StationPublisher", daemon=True)
+        self.thread.start()
+
+    def publish(self, axis, time_ns, diff_us):
+        """ time_ns 为 perf_counter_ns 时间戳，发送时换算为墙上时间 (各练习机按墙上时间合并) """
+        with self.condition:
+            if self.closing:
+                return
+            self.pending.append((axis, time_ns + PERF_TO_WALL_OFFSET_NS, diff_us))
+            if len(self.pending) >= MAX_BATCH:
+                self.condition.notify()
+
+    def publish_wall(self, axis, wall_ns, diff_us):
+        """ 直接使用墙上时间 (模拟数据与测试用) """
+        self.publish(axis, wall_ns - PERF_TO_WALL_OFFSET_NS, diff_us)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.closing and len(self.pending) < MAX_BATCH:
+                    self.condition.wait(self.flush_interval)
+                batch, self.pending = self.pending, []
+                closing_now = self.closing
+            for start in range(0, len(batch), MAX_BATCH):
+                self._send(batch[start:start + MAX_BATCH])
+            if closing_now:
+                self.transport.close()
+                return
+
+    def _send(self, stops):
+        stops.sort(key=lambda stop: stop[1])
+        frame = encode_frame(self.station_id, self.seq, self.name, stops)
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        try:
+            self.transport.send(frame)
+        except OSError as e:
+            self.failed += len(stops)
+            if self.on_error and not self.closing and str(e) != self.last_error:
+                self.on_error(e) # 同样的错误只报告一次，关闭后不再报告
+            self.last_error = str(e)
+            return
+        self.last_error = None
+        self.sent += len(stops)
+        self.frames += 1
+
+    def stats(self):
+        return {'sent': self.sent, 'frames': self.frames, 'failed': self.failed}
+
+    def close(self):
+        """
+        通知后台线程发完队列中剩余的记录后关闭，不等待 (在 GUI 线程调用，汇总端不可达时连接超时也不会卡住界面)。
+        需要确认发送完毕时再调用 join()。
+        """
+        with self.condition:
+            if self.closing:
+                return
+            self.closing = True
+            self.condition.notify()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+
+class PlayerStats:
+    """ 一台练习机 (一名玩家) 最近 window 次急停的滑动统计，添加与移出都是 O(1) """
+    def __init__(self, station_id, name, window=200, perfect_threshold_us=PERFECT_THRESHOLD_US):
+        self.station_id = station_id
+        self.name = name
+        self.perfect_threshold_us = perfect_threshold_us
+        self.recent = deque(maxlen=window)
+        self.total = 0
+        self.sum = 0
+        self.sum_sq = 0
+        self.sum_abs = 0
+        self.perfect = 0
+        self.per_axis = dict.fromkeys(AXES, 0)
+        self.last_wall_ns = 0
+        self.last_diff_us = 0
+        self.frames = 0
+        self.lost_frames = 0
+        self.late_frames = 0 # 迟到或重复的 UDP 数据报
+        self.expected_seq = None # 下一个期望的帧序号
+
+    def _update(self, diff_us, sign):
+        self.sum += sign * diff_us
+        self.sum_sq += sign * diff_us * diff_us
+        self.sum_abs += sign * abs(diff_us)
+        self.perfect += sign * (abs(diff_us) <= self.perfect_threshold_us)
+
+    def add(self, wall_ns, axis, diff_us):
+        if len(self.recent) == self.recent.maxlen:
+            self._update(self.recent[0], -1)
+        self.recent.append(diff_us)
+        self._update(diff_us, 1)
+        self.total += 1
+        self.per_axis[axis] += 1
+        if wall_ns >= self.last_wall_ns:
+            self.last_wall_ns = wall_ns
+            self.last_diff_us = diff_us
+
+    def note_frame(self, seq):
+        """ 按 32 位有符号序号差计数：向前跳过的记为丢失，迟到或重复的另计，期望序号不回退 """
+        self.frames += 1
+        if self.expected_seq is not None:
+            gap = (seq - self.expected_seq) & 0xFFFFFFFF
+            if gap >= 0x80000000: # 负差：早于期望序号
+                self.late_frames += 1
+                return
+            self.lost_frames += gap
+        self.expected_seq = (seq + 1) & 0xFFFFFFFF
+
+    def summary(self):
+        n = len(self.recent)
+        mean = self.sum / n if n else 0.0
+        variance = (self.sum_sq - n * mean * mean) / (n - 1) if n > 1 else 0.0
+        return {
+            'station_id': self.station_id,
+            'name': self.name,
+            'count': self.total,
+            'window': n,
+            'mean_ms': mean / 1000,
+            'stdev_ms': max(variance, 0.0) ** 0.5 / 1000,
+            'mean_abs_ms': self.sum_abs / n / 1000 if n else 0.0,
+            'perfect_rate': self.perfect / n if n else 0.0,
+            'AD': self.per_axis['AD'],
+            'WS': self.per_axis['WS'],
+            'last_wall_ns': self.last_wall_ns,
+            'last_diff_ms': self.last_diff_us / 1000,
+            'lost_frames': self.lost_frames,
+            'late_frames': self.late_frames,
+        }
+
+
+class HubAggregator:
+    """
+    汇总端的数据模型 (不依赖 asyncio/Qt)。
+    各练习机的帧到达顺序与网络延迟有关：急停先按墙上时间放入最小堆，
+    超过 reorder_window_ms 后才按时间顺序进入合并时间线；更晚到达的只计入玩家统计并记为迟到。
+    排行榜按最近 window 次急停的平均 |时间差| 排序 (至少 min_stops 次)。
+    玩家按练习机 id 区分 (多台练习机可能都在用默认档案)，同名时显示名称后附加练习机 id。
+    """
+    def __init__(self, window=200, reorder_window_ms=250, timeline_size=500, min_stops=10,
+                 perfect_threshold_us=PERFECT_THRESHOLD_US):
+        self.window = window
+        self.reorder_window_ns = reorder_window_ms * 1_000_000
+        self.min_stops = min_stops
+        self.perfect_threshold_us = perfect_threshold_us
+        self.players = {} # 练习机 id -> PlayerStats
+        self.timeline = deque(maxlen=timeline_size) # (墙上时间 ns, 练习机 id, 轴, 时间差 us)
+        self.heap = []
+        self.released_until = 0
+        self.stops = 0
+        self.frames = 0
+        self.bad_frames = 0
+        self.late = 0
+        self._tiebreak = 0
+
+    def add_frame(self, data):
+        try:
+            station_id, seq, name, stops = decode_frame(data)
+        except ValueError:
+            self.bad_frames += 1
+            return 0
+        player = self.players.get(station_id)
+        if player is None:
+            player = self.players[station_id] = PlayerStats(station_id, name, self.window, self.perfect_threshold_us)
+        player.note_frame(seq)
+        push = heapq.heappush
+        heap = self.heap
+        for wall_ns, axis, diff_us in stops:
+            player.add(wall_ns, axis, diff_us)
+            if wall_ns < self.released_until:
+                self.late += 1
+                continue
+            self._tiebreak += 1
+            push(heap, (wall_ns, self._tiebreak, station_id, axis, diff_us))
+        self.frames += 1
+        self.stops += len(stops)
+        return len(stops)
+
+    def release(self, now_wall_ns=None):
+        """ 把早于 now - reorder_window 的急停按时间顺序移入时间线，返回移入的条数 """
+        now_wall_ns = time.time_ns() if now_wall_ns is None else now_wall_ns
+        until = now_wall_ns - self.reorder_window_ns
+        heap = self.heap
+        released = 0
+        while heap and heap[0][0] <= until:
+            wall_ns, _, station_id, axis, diff_us = heapq.heappop(heap)
+            self.timeline.append((wall_ns, station_id, axis, diff_us))
+            released += 1
+        self.released_until = max(self.released_until, until)
+        return released
+
+    def labels(self):
+        """ 练习机 id -> 显示名称，多台练习机同名时附加 id 的后 4 位十六进制 """
+        counts = {}
+        for player in self.players.values():
+            counts[player.name] = counts.get(player.name, 0) + 1
+        return {station_id: player.name if counts[player.name] == 1 else f"{player.name} #{station_id & 0xFFFF:04x}"
+                for station_id, player in self.players.items()}
+
+    def recent(self, count):
+        """ 最近 count 条合并后的急停 (新的在前)：[(墙上时间 ns, 显示名称, 轴, 时间差 us), ...] """
+        labels = self.labels()
+        return [(wall_ns, labels[station_id], axis, diff_us)
+                for wall_ns, station_id, axis, diff_us in list(self.timeline)[-count:][::-1]]
+
+    def leaderboard(self):
+        """ 所有玩家的统计，已达到 min_stops 的按平均 |时间差| 升序排在前面 """
+        labels = self.labels()
+        summaries = [{**player.summary(), 'name': labels[station_id]} for station_id, player in self.players.items()]
+        ranked = sorted((s for s in summaries if s['window'] >= self.min_stops), key=lambda s: (s['mean_abs_ms'], s['stdev_ms']))
+        unranked = sorted((s for s in summaries if s['window'] < self.min_stops), key=lambda s: s['name'])
+        for rank, s in enumerate(ranked, 1):
+            s['rank'] = rank
+        for s in unranked:
+            s['rank'] = None
+        return ranked + unranked
+
+    def stats(self):
+        return {'stops': self.stops, 'frames': self.frames, 'bad_frames': self.bad_frames, 'late': self.late,
+                'players': len(self.players), 'buffered': len(self.heap)}
+
+
+class _HubDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, hub):
+        self.hub = hub
+
+    def datagram_received(self, data, addr):
+        self.hub._on_frame(data)
+
+
+class QuickStopHub:
+    """
+    汇总端：在后台线程中运行 asyncio，接收各练习机的 UDP 数据报 (可加入组播组) 与 TCP 帧流，
+    解码后交给 HubAggregator。GUI 或命令行通过 snapshot() 读取 (线程安全)。
+    ingest() 供进程内替身发送端 (LoopbackTransport) 使用。
+    """
+    def __init__(self, udp=None, tcp=None, **aggregator_options):
+        self.udp = udp # (组播或绑定地址, 端口) 或 None
+        self.tcp = tcp # (绑定地址, 端口) 或 None
+        self.aggregator = HubAggregator(**aggregator_options)
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        self.tcp_server = None
+        self.udp_transport = None
+        self.connections = 0
+
+    def start(self):
+        """ 启动汇总线程，端口绑定失败时在调用线程抛出 OSError """
+        started = threading.Event()
+        errors = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.loop.run_until_complete(self._open())
+            except OSError as e:
+                errors.append(e)
+                started.set()
+                self.loop.run_until_complete(self._close())
+                self.loop.close()
+                return
+            started.set()
+            try:
+                self.loop.run_forever()
+            finally:
+                self.loop.run_until_complete(self._close())
+                pending = asyncio.all_tasks(self.loop)
+                for task in pending:
+                    task.cancel()
+                self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+                self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="QuickStopHub", daemon=True)
+        self.thread.start()
+        started.wait()
+        if errors:
+            self.thread = None
+            raise errors[0]
+
+    async def _open(self):
+        if self.tcp is not None:
+            self.tcp_server = await asyncio.start_server(self._handle_station, *self.tcp)
+            self.tcp = (self.tcp[0], self.tcp_server.sockets[0].getsockname()[1]) # 端口为 0 时取实际端口
+        if self.udp is not None:
+            sock = self._udp_socket(*self.udp)
+            self.udp_transport, _ = await self.loop.create_datagram_endpoint(lambda: _HubDatagramProtocol(self), sock=sock)
+            self.udp = (self.udp[0], sock.getsockname()[1])
+
+    @staticmethod
+    def _udp_socket(host, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            if socket.inet_aton(host)[0] & 0xF0 == 0xE0: # 组播地址：监听所有接口并加入组
+                sock.bind(('', port))
+                membership = struct.pack('4s4s', socket.inet_aton(host), socket.inet_aton('0.0.0.0'))
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            else:
+                sock.bind((host, port))
+        except OSError:
+            sock.close()
+            raise
+        sock.setblocking(False)
+        return sock
+
+    async def _close(self):
+        if self.tcp_server is not None:
+            self.tcp_server.close()
+            self.tcp_server = None
+        if self.udp_transport is not None:
+            self.udp_transport.close()
+            self.udp_transport = None
+
+    def stop(self, timeout=1.0):
+        if self.thread and self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout)
+        self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def ingest(self, frame):
+        """ 线程安全地投递一帧 (进程内替身发送端使用) """
+        if self.loop is not None and self.is_running():
+            self.loop.call_soon_threadsafe(self._on_frame, frame)
+
+    def _on_frame(self, data):
+        with self.lock:
+            self.aggregator.add_frame(data)
+
+    async def _handle_station(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                (length,) = STREAM_PREFIX.unpack(await reader.readexactly(STREAM_PREFIX.size))
+                if length > MAX_FRAME_SIZE: # 不是练习机或数据流已损坏，断开而不是等待并缓存超长数据
+                    with self.lock:
+                        self.aggregator.bad_frames += 1
+                    return
+                self._on_frame(await reader.readexactly(length))
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            pass # 练习机断开或汇总端关闭
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def snapshot(self, timeline=50):
+        """ 推进合并时间线并返回 (排行榜, 最近 timeline 条合并后的急停 (新的在前), 统计) """
+        with self.lock:
+            aggregator = self.aggregator
+            aggregator.release()
+            return aggregator.leaderboard(), aggregator.recent(timeline), {**aggregator.stats(), 'connections': self.connections}
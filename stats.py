@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 时间差统计与图表数据的向量化计算
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import numpy as np
+
+from detector import MAX_FILTER_THRESHOLD, PERFECT_THRESHOLD_US
+
+# 颜色 (0-255 RGB)：完美为绿色，偏早从浅蓝渐变到深蓝，偏晚从浅红渐变到深红
+PERFECT_RGB = (144, 238, 144)
+EARLY_RGB = ((173, 216, 230), (0, 0, 139))
+LATE_RGB = ((255, 182, 193), (139, 0, 0))
+
+_PERFECT = np.array(PERFECT_RGB, dtype=float) / 255
+_EARLY_START, _EARLY_END = (np.array(c, dtype=float) / 255 for c in EARLY_RGB)
+_LATE_START, _LATE_END = (np.array(c, dtype=float) / 255 for c in LATE_RGB)
+
+
+def diff_array(records):
+    """ 把 RecordStore 的记录序列转换为 int64 微秒数组 """
+    return np.fromiter((d['diff_us'] for d in records), dtype=np.int64)
+
+
+def diff_colors(diffs_us, color_range_us, perfect_threshold_us=PERFECT_THRESHOLD_US):
+    """ 按时间差计算每个点的 RGB 颜色 (N×3，0-1)，与 MainWindow.get_color 的渐变一致 """
+    diffs_us = np.asarray(diffs_us)
+    t = (np.minimum(np.abs(diffs_us), color_range_us) / max(color_range_us, 1))[:, None]
+    early = _EARLY_START + (_EARLY_END - _EARLY_START) * t
+    late = _LATE_START + (_LATE_END - _LATE_START) * t
+    colors = np.where((diffs_us < 0)[:, None], early, late)
+    colors[np.abs(diffs_us) <= perfect_threshold_us] = _PERFECT
+    return np.clip(colors, 0.0, 1.0)
+
+
+def box_stats(values_ms, whis=1.5):
+    """ 与 matplotlib boxplot 相同规则的箱线图统计，可直接传给 Axes.bxp """
+    q1, med, q3 = np.percentile(values_ms, (25, 50, 75))
+    iqr = q3 - q1
+    inside_low = values_ms[values_ms >= q1 - whis * iqr]
+    inside_high = values_ms[values_ms <= q3 + whis * iqr]
+    return {
+        'med': med, 'q1': q1, 'q3': q3,
+        'whislo': inside_low.min() if inside_low.size else q1,
+        'whishi': inside_high.max() if inside_high.size else q3,
+        'mean': values_ms.mean(),
+        'fliers': np.empty(0),
+    }
+
+
+def summarize_diffs(diffs_us, filter_threshold_ms, perfect_threshold_us=PERFECT_THRESHOLD_US):
+    """
+    一次向量化计算某轴的全部派生数据：
+    ms 序列、按 filter_threshold 过滤后的均值/标准差、偏早/偏晚/完美计数与箱线图统计。
+    """
+    diffs_us = np.asarray(diffs_us, dtype=np.int64)
+    values_ms = diffs_us / 1000
+    kept = np.abs(diffs_us) <= filter_threshold_ms * 1000
+    filtered_us = diffs_us[kept]
+    filtered_ms = values_ms[kept]
+    count = int(filtered_ms.size)
+    perfect = np.abs(filtered_us) <= perfect_threshold_us
+    return {
+        'values_ms': values_ms,
+        'filtered_ms': filtered_ms,
+        'count': count,
+        'mean': float(filtered_ms.mean()) if count else 0.0,
+        'stdev': float(filtered_ms.std(ddof=1)) if count > 1 else 0.0,
+        'perfect': int(perfect.sum()),
+        'early': int(((filtered_us < 0) & ~perfect).sum()),
+        'late': int(((filtered_us > 0) & ~perfect).sum()),
+        'box': box_stats(filtered_ms) if count else None,
+    }
+
+
+class DiffBinAggregate:
+    """
+    按轴的定长分箱聚合：时间差直方图 (diff 箱) 与 会话时间 × 时间差 热力图 (time 箱 × diff 箱)。
+    每条记录的更新为 O(1)，绘图代价只取决于分箱数，与记录条数无关。
+    会话时长超出时间箱范围时，相邻时间列两两合并、箱宽加倍，数组大小保持不变。
+    """
+    def __init__(self, axes=('AD', 'WS'), range_ms=MAX_FILTER_THRESHOLD, diff_bin_us=2000,
+                 time_bins=120, time_bin_ns=30_000_000_000):
+        self.axes = tuple(axes)
+        self.range_us = range_ms * 1000
+        self.diff_bin_us = diff_bin_us
+        self.diff_bins = 2 * self.range_us // diff_bin_us
+        self.diff_edges_ms = (np.arange(self.diff_bins + 1) * diff_bin_us - self.range_us) / 1000
+        self.time_bins = time_bins + time_bins % 2
+        self.initial_time_bin_ns = time_bin_ns
+        self.histograms = {axis: np.zeros(self.diff_bins, dtype=np.int64) for axis in self.axes}
+        self.heatmaps = {axis: np.zeros((self.time_bins, self.diff_bins), dtype=np.int64) for axis in self.axes}
+        self.version = 0 # 每次更新 (包括清空) 递增且从不回退，供界面判断是否需要重绘
+        self.clear()
+
+    def clear(self):
+        for axis in self.axes:
+            self.histograms[axis].fill(0)
+            self.heatmaps[axis].fill(0)
+        self.session_start = None
+        self.time_bin_ns = self.initial_time_bin_ns
+        self.last_time_bin = 0
+        self.version += 1
+
+    def _coarsen(self):
+        half = self.time_bins // 2
+        for heat in self.heatmaps.values():
+            heat[:half] = heat[0::2] + heat[1::2]
+            heat[half:] = 0
+        self.time_bin_ns *= 2
+        self.last_time_bin //= 2
+
+    def _time_bin(self, time_ns):
+        if self.session_start is None:
+            self.session_start = time_ns
+        return max(0, (time_ns - self.session_start) // self.time_bin_ns)
+
+    def add(self, axis, time_ns, diff_us):
+        diff_bin = min(max((diff_us + self.range_us) // self.diff_bin_us, 0), self.diff_bins - 1)
+        time_bin = self._time_bin(time_ns)
+        while time_bin >= self.time_bins:
+            self._coarsen()
+            time_bin = self._time_bin(time_ns)
+        self.histograms[axis][diff_bin] += 1
+        self.heatmaps[axis][time_bin, diff_bin] += 1
+        self.last_time_bin = max(self.last_time_bin, time_bin)
+        self.version += 1
+
+    def add_many(self, axis, times_ns, diffs_us):
+        """ 批量加入 (例如从磁盘载入的整场记录)，times_ns 需按时间排序 """
+        times_ns = np.asarray(times_ns, dtype=np.int64)
+        diffs_us = np.asarray(diffs_us, dtype=np.int64)
+        if not times_ns.size:
+            return
+        self._time_bin(int(times_ns[0]))
+        while (int(times_ns[-1]) - self.session_start) // self.time_bin_ns >= self.time_bins:
+            self._coarsen()
+        diff_bins = np.clip((diffs_us + self.range_us) // self.diff_bin_us, 0, self.diff_bins - 1)
+        time_bins = np.maximum(0, (times_ns - self.session_start) // self.time_bin_ns)
+        np.add.at(self.histograms[axis], diff_bins, 1)
+        np.add.at(self.heatmaps[axis], (time_bins, diff_bins), 1)
+        self.last_time_bin = max(self.last_time_bin, int(time_bins.max()))
+        self.version += 1
+
+    def rebuild(self, series):
+        """ 用 {轴: (按时间排序的时间 ns, 时间差 us)} 重建全部聚合，会话起点取各轴最早的时间 """
+        self.clear()
+        starts = [times[0] for times, _ in series.values() if len(times)]
+        if not starts:
+            return
+        self.session_start = min(starts)
+        for axis, (times, diffs) in series.items():
+            self.add_many(axis, times, diffs)
+
+    def _diff_slice(self, filter_threshold_ms):
+        limit_us = min(filter_threshold_ms * 1000, self.range_us)
+        lo = (self.range_us - limit_us) // self.diff_bin_us
+        hi = self.diff_bins - lo
+        return slice(lo, hi)
+
+    def histogram(self, axis, filter_threshold_ms):
+        """ 返回阈值范围内的 (箱边界 ms, 计数) """
+        cut = self._diff_slice(filter_threshold_ms)
+        return self.diff_edges_ms[cut.start:cut.stop + 1], self.histograms[axis][cut]
+
+    def heatmap(self, axis, filter_threshold_ms):
+        """ 返回 (计数矩阵 [时间箱, diff 箱], 会话时长 (分钟), diff 箱边界 ms)，只包含已用到的时间箱 """
+        cut = self._diff_slice(filter_threshold_ms)
+        rows = self.last_time_bin + 1
+        minutes = rows * self.time_bin_ns / 60e9
+        return self.heatmaps[axis][:rows, cut], minutes, self.diff_edges_ms[cut.start:cut.stop + 1]
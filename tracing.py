@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#
+# CS2 急停评估工具 - 按键到画面的分阶段延迟追踪
+#https://space.bilibili.com/13723713
+# Copyright (c) 2025 PuddingTower.
+#
+# This software is licensed under the MIT License.
+# See the LICENSE file for more details.
+#
+
+import json
+import time
+from collections import deque
+
+# 事件从被捕获到画面更新依次经过的阶段
+STAGES = ('capture', 'dequeue', 'detect', 'emit', 'model', 'paint')
+STAGE_NAMES = {
+    'capture': '监听线程捕获',
+    'dequeue': 'GUI 线程取出',
+    'detect': '急停检测完成',
+    'emit': '记录发出',
+    'model': '历史/数据更新',
+    'paint': '图表绘制完成',
+}
+
+
+class HdrHistogram:
+    """
+    HDR 风格的对数-线性直方图 (整数微秒)。
+    每个 2 的幂区间再细分 2**sub_bucket_bits 个桶，记录为 O(1)，相对误差约 1/2**sub_bucket_bits。
+    """
+    def __init__(self, sub_bucket_bits=5, max_value_us=60_000_000):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.max_value_us = max_value_us
+        self.counts = [0] * (self._index(max_value_us) + 1)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.total_count = 0
+        self.total_sum = 0
+        self.min_value = None
+        self.max_value = None
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.reset_stats()
+
+    def _index(self, value):
+        shift = value.bit_length() - self.sub_bucket_bits - 1
+        if shift <= 0:
+            return value
+        return shift * self.sub_bucket_count + (value >> shift)
+
+    def _bucket_value(self, index):
+        """ 返回桶的中点值 (微秒) """
+        shift = index // self.sub_bucket_count - 1
+        if shift <= 0:
+            return index
+        low = (index - shift * self.sub_bucket_count) << shift
+        return low + (1 << shift) // 2
+
+    def record(self, value_us):
+        value_us = min(max(int(value_us), 0), self.max_value_us)
+        self.counts[self._index(value_us)] += 1
+        self.total_count += 1
+        self.total_sum += value_us
+        if self.min_value is None or value_us < self.min_value: self.min_value = value_us
+        if self.max_value is None or value_us > self.max_value: self.max_value = value_us
+
+    def mean(self):
+        return self.total_sum / self.total_count if self.total_count else 0.0
+
+    def percentile(self, percent):
+        if not self.total_count:
+            return 0
+        target = max(1, int(round(self.total_count * percent / 100.0)))
+        running = 0
+        for index, count in enumerate(self.counts):
+            running += count
+            if running >= target:
+                return max(min(self._bucket_value(index), self.max_value), self.min_value)
+        return self.max_value
+
+    def summary(self):
+        return {
+            'count': self.total_count,
+            'mean': self.mean(),
+            'min': self.min_value or 0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+            'max': self.max_value or 0,
+        }
+
+
+class LatencyTracer:
+    """
+    为每个按键事件记录各阶段时间戳，聚合到 HDR 直方图，并可导出 Chrome trace-event JSON。
+
+    事件以捕获时的 perf_counter_ns 整数时间戳作为 ID (该值本身就是 capture 阶段的时间戳)，
+    因此监听线程无需做任何额外工作；其余阶段都在 GUI 线程打点。
+    """
+    def __init__(self, keep_traces=2000, enabled=True):
+        self.enabled = enabled
+        self.active = {}
+        self.completed = deque(maxlen=keep_traces)
+        self.histograms = {}
+        for a, b in zip(STAGES, STAGES[1:]):
+            self.histograms[f"{a}→{b}"] = HdrHistogram()
+        self.histograms['capture→detect'] = HdrHistogram()
+        self.histograms['capture→paint'] = HdrHistogram()
+
+    def begin(self, event_id, key=None):
+        """ GUI 线程取出事件时调用，同时记录 capture 与 dequeue 阶段 """
+        if not self.enabled:
+            return
+        self.active[event_id] = {'key': key, 'capture': event_id, 'dequeue': time.perf_counter_ns()}
+
+    def stamp(self, event_id, stage):
+        trace = self.active.get(event_id)
+        if trace is not None and stage not in trace:
+            trace[stage] = time.perf_counter_ns()
+
+    def finish(self, event_id):
+        """ 事件处理完毕：补齐 detect 阶段，聚合各段延迟 """
+        trace = self.active.pop(event_id, None)
+        if trace is None:
+            return
+        trace.setdefault('detect', time.perf_counter_ns())
+        stamped = [s for s in STAGES if s in trace]
+        for a, b in zip(stamped, stamped[1:]):
+            name = f"{a}→{b}"
+            if name in self.histograms:
+                self.histograms[name].record((trace[b] - trace[a]) // 1000)
+        self.histograms['capture→detect'].record((trace['detect'] - trace['capture']) // 1000)
+        if 'paint' in trace:
+            self.histograms['capture→paint'].record((trace['paint'] - trace['capture']) // 1000)
+        self.completed.append(trace)
+
+    def reset(self):
+        self.active.clear()
+        self.completed.clear()
+        for hist in self.histograms.values():
+            hist.reset()
+
+    def summaries(self):
+        return {name: hist.summary() for name, hist in self.histograms.items()}
+
+    def to_chrome_trace(self):
+        """ 生成 chrome://tracing / Perfetto 可读取的 trace-event 字典 """
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1, 'args': {'name': '监听线程 → GUI 队列'}},
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 2, 'args': {'name': 'GUI 线程'}},
+        ]
+        for trace in self.completed:
+            stamped = [s for s in STAGES if s in trace]
+            for a, b in zip(stamped, stamped[1:]):
+                events.append({
+                    'name': STAGE_NAMES[b], 'cat': 'latency', 'ph': 'X',
+                    'ts': trace[a] / 1000, 'dur': max(0, trace[b] - trace[a]) / 1000,
+                    'pid': 1, 'tid': 1 if a == 'capture' else 2,
+                    'args': {'key': trace.get('key'), 'event_time': trace['capture']},
+                })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump_chrome_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f, ensure_ascii=False)